@@ -7,34 +7,56 @@
 
 import os
 import re
-import subprocess
 
+import numpy as np
+import pandas as pd
 import xlsxwriter
 from collections import namedtuple
 
 from ..utils import dir_check
 from ..xlsx_formater import Formater
+from ..bedfile import BedReader
 
 class MdrOperate:
     """Gene-gene interaction analysis with Multi Dimensional Reduction method."""
     def __init__(self, asso_inst):
         self.config = asso_inst.config
-        self.mdrfile = self.config.get('MDR', None)
+        self.manifest = asso_inst.manifest
+        self.runner = asso_inst.runner
+        self.mdr_analysis = self.config.get('MDR', None)
         self.path = self.config.get('ROUTINE', None)
-        self.tmpdir = self.config.get('TMPDIR', None)
+        self.tmpdir = self.config.get('TMPDIR', None) or \
+                os.path.join(self.path, 'tmp')
+        self.bedfile = self.config.get('BED', None) or \
+                os.path.join(self.tmpdir, 'bsample')
+        self.mdrfile = os.path.join(self.tmpdir, 'mdrdata.txt')
         self.reportdir = os.path.join(self.path, 'report')
         self.resultdir = os.path.join(self.path, 'result/mdr')
         dir_check(self.reportdir)
         dir_check(self.resultdir)
 
     def go(self):
-        if self.mdrfile:
+        if self.mdr_analysis:
+            self.to_mdr()
             result = self.run_mdr()
             models = self.read_mdr_result(result)
             self.to_excel(models)
         else:
             pass
 
+    def to_mdr(self):
+        """Decode genotypes from the bed into mdr data, with case/control
+        status in the last column. Skipped if neither bed nor fam changed."""
+        inputs = [self.manifest.get(self.bedfile + ext) for ext in ('.bed', '.bim', '.fam')]
+        fingerprint = self.manifest.fingerprint('mdr', *inputs)
+        if None not in inputs and self.manifest.fresh(self.mdrfile, fingerprint):
+            return
+        bed = BedReader(self.bedfile)
+        table = pd.DataFrame(bed.calls(np.arange(bed.shape[1])), columns=bed.snps)
+        table['Class'] = bed.pheno().astype(int)
+        table.to_csv(self.mdrfile, header=True, index=False, sep='\t')
+        self.manifest.record(self.mdrfile, fingerprint)
+
     def run_mdr(self):
         fmdr = self.mdrfile
         head = open(fmdr).readline()
@@ -43,12 +65,14 @@ class MdrOperate:
         mdr_jar = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mdr.jar')
         output = os.path.join(self.resultdir, "mdroutput.txt")
 
-        mdr_command = 'java -jar {0} -min=1 -max={1} -cv=10 -table_data=true -minimal_output=true\
+        # exec, so a timeout kills java rather than the shell.
+        mdr_command = 'exec java -jar {0} -min=1 -max={1} -cv=10 -table_data=true -minimal_output=true\
                 {2} > {3}'.format(mdr_jar, max_model, fmdr, output)
         commandfile = os.path.join(self.tmpdir, 'mdrun.sh')
         with open(commandfile, 'wt') as fh:
             fh.write(mdr_command)
-        subprocess.run(["sh", commandfile])
+        self.runner.run(output, ["sh", commandfile], os.path.join(self.resultdir, 'mdr.job.log'),
+                        [fmdr, mdr_jar, commandfile], [output])
         return output
 
     def read_mdr_result(self, result):
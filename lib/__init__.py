@@ -3,8 +3,8 @@ from ._formation import Formater
 
 from .MDRKit import MdrOperate
 from .haplokit import hap_analysis
-from .mathematics import LogitRegression, ChiSquare, Ttest
+from .mathematics import LogitRegression, ChiSquare, FisherExact, Ttest
 from .pheno_indeptest import PhenoIndepTest
 from .assoc_reporter import reporter
 from .stratify import Stratify
-from .api import LRanalysis, Chi_test
+from .api import LRanalysis, Chi_test, Fisher_test
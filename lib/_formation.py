@@ -12,18 +12,21 @@ import functools
 
 import pandas as pd
 
-from .utils import dir_check, parse_column
+from .utils import dir_check, parse_column, infer_dtypes
+from .genotype import GenoReader, CELL_BYTES
+from .vcf import VcfReader, is_vcf
+from .bedfile import write_bed, write_bim
 
 
 class Formater:
-    """Take in tab separated genotype file and phenotype file, and turns
-    them into plink format.
+    """Take in tab separated (or vcf) genotype file and phenotype file, and
+    turns them into plink binary format.
 
     :param config: a config instance.
     """
-    from .assoc_operator import plink_operator
 
     def __init__(self, asinst):
+        self.asinst = asinst
         self.config = asinst.config
         self.root_path = self.config.get('ROUTINE', None)
         self.geno_file = self.config.get('GENOFILE', None)
@@ -33,25 +36,30 @@ class Formater:
         self.cov_num = self.config.get('CORRECTION', None)
         self.pheno_num = self.config.get('PHENO', None)
         self.hap_cutofff = self.config.get('HAP_CUTOFF', None) or 100
-        self.mdr_analysis = self.config.get('MDR') or False
+        self.memory = self.config.get('MEMORY_LIMIT', None)
         self.hap_treat = None
 
         self.tmpdir = os.path.join(self.root_path, 'tmp')
         dir_check(self.tmpdir)
         self.config['TMPDIR'] = self.tmpdir
 
+        self.bed_prefix = os.path.join(self.tmpdir, 'bsample')
+        self.cache = asinst.cache
+        self.manifest = asinst.manifest
+
         self.load_table()
-        self.to_ped()
-        self.to_map()
+        self.to_fam()
+        self.to_bim()
+        asinst.genotypes = self.genotypes
 
     def load_table(self):
-        """Load genotype file and phenotype file into pandas DataFrame. And check if these files
-        exists or matched."""
+        """Load genotype file and phenotype file, genotype calls are streamed in
+        chunks bounded by `MEMORY_LIMIT` and encoded into a compact `GenoMatrix`.
+        Column dtypes of phenotype file are inferred once by `infer_dtypes`.
+        Parsed tables are taken from cache if the files are not changed.
+        And check if these files exists or matched."""
         try:
-            geno_tab = pd.read_table(self.geno_file, header=0, index_col=0, sep='\t', low_memory=False)
-            geno_tab.replace('\s+', '0 0', regex=True, inplace=True)
-            geno_tab.replace('\/', ' ', regex=True, inplace=True)
-            self.geno_tab = geno_tab.fillna('0 0')
+            self.genotypes = self.cache.fetch_genotypes(self.geno_file, self.encode_geno)
         except IOError as e:
             if e.errno in (errno.ENOENT, errno.EISDIR):
                 e.strerror = 'Unable to load geno_file <%s>' % e.strerror
@@ -59,91 +67,84 @@ class Formater:
             raise Exception('Melformed geno_file <%s>' % e.strerror)
 
         try:
-            info_tab = pd.read_table(self.info_file, header=0, index_col=0, sep='\t')
-            # if self.gender_col:
-                # info_tab.iloc[:, self.gender_col - 1].fillna('-9')
-            self.info_tab = info_tab.fillna('-9')
+            info_tab = self.cache.fetch('info', self.info_file, self.read_info)
+            self.info_tab = info_tab
         except IOError as e:
             if e.errno in (errno.ENOENT, errno.EISDIR):
                 e.strerror = 'Unable to load info_file <%s>' % e.strerror
                 raise Exception()
             raise Exception('Melformed info_file <%s>' % e.strerror)
 
-        shape_geno = geno_tab.shape
+        shape_geno = self.genotypes.shape
         shape_info = info_tab.shape
         if not shape_geno[0] == shape_info[0]:
             raise Exception('Samples not match: <geno: %s / pheno: %s>' %(shape_geno[0], shape_info[0]))
+        if set(self.genotypes.samples) != set(info_tab.index):
+            raise Exception('Samples not match: <geno and pheno sample names differ>')
+        # samples in fam must follow the row order of bed.
+        self.info_tab = self.info_tab.reindex(self.genotypes.samples)
+
+    def encode_geno(self):
+        if is_vcf(self.geno_file):
+            reader = VcfReader(self.geno_file, self.memory, self.tmpdir)
+        else:
+            reader = GenoReader(self.geno_file, self.memory, self.tmpdir)
+        return reader.encode()
+
+    def read_info(self):
+        info_tab = pd.read_table(self.info_file, header=0, index_col=0, sep='\t')
+        info_tab.index = info_tab.index.astype(str)
+        return infer_dtypes(info_tab, na_value=-9)
 
-    def to_ped(self):
-        """Turn genotype file into plink ped format."""
-        self.snv_sites = self.geno_tab.columns
+    def to_fam(self):
+        """Turn phenotype file into plink fam format."""
+        self.snv_sites = self.genotypes.snps
         self.info_tab.replace('case', 2, inplace=True)
         self.info_tab.replace('control', 1, inplace=True)
-        # self.info_tab.iloc[:,0][self.info_tab.iloc[:,0] == 'case'] = 2
-        # self.info_tab.iloc[:,0][self.info_tab.iloc[:,0] == 'control'] = 1
-
-        shape_info = self.info_tab.shape
-        merged = pd.concat([self.info_tab, self.geno_tab], axis=1)
-        #merged.to_csv('merged.csv', header=True, index=True, sep='\t')
-        shape_merged = merged.shape
-        require_cols = [0] + list(range(shape_info[1], shape_merged[1]))
-        require_cols_mdr = list(range(shape_info[1], shape_merged[1])) + [0]
-
-        required_tab = merged.iloc[:, require_cols]
 
+        fam = self.info_tab.iloc[:, [0]]
         if self.gender_col is not None and re.match(r'\d', str(self.gender_col)):
-            required_tab.insert(0, 'gender', merged.iloc[:, self.gender_col - 1])
+            fam.insert(0, 'gender', self.info_tab.iloc[:, self.gender_col - 1])
         else:
-            required_tab.insert(0, 'gender', 0)
+            fam.insert(0, 'gender', 0)
 
-        required_tab.insert(0, 'MID',0)
-        required_tab.insert(0, 'PID',0)
-        required_tab.insert(0, 'IID',required_tab.index)
+        fam.insert(0, 'MID',0)
+        fam.insert(0, 'PID',0)
+        fam.insert(0, 'IID',fam.index)
 
-        ped_file = os.path.join(self.tmpdir, 'sample.ped')
-        required_tab.apply(self.convert_dtype).to_csv(ped_file, header=False, index=True, sep='\t')
-        self.config['PEDFILE'] = ped_file
+        fam_file = self.bed_prefix + '.fam'
+        self.write_table(fam, fam_file, header=False, index=True)
 
-        self.to_covar(merged)
-        self.to_pheno(merged)
-        if self.mdr_analysis:
-            self.to_mdr(merged, require_cols_mdr)
+        self.to_covar(self.info_tab)
+        self.to_pheno(self.info_tab)
 
-    def to_map(self):
-        """Turn genotype file into plink map format."""
+    def to_bim(self):
+        """Turn snv info file into plink bim format, minor allele as A1."""
         try:
-            snp_info = {}
-            with open(self.snp_file, 'rt') as fh:
-                count = 0
-                for line in fh:
-                    count += 1
-                    if re.match(r'^\s+$', line):
-                        continue
-                    line = re.sub(r'[\r\n]$', '', line)
-                    arr = line.split()
-                    if count == 1:
-                        if not set(arr) & set(['Gene', 'Chr', 'Position', 'ref', 'alt']):
-                            raise Exception('Loss file header <%s>' % self.snp_file)
-                        if len(arr) > 5 or re.match(r'GENE', arr[-1], re.I):
-                            self.hap_treat = True
-                            continue
-                    snp_info[arr[0]] = arr
-            if self.hap_treat and count <= self.hap_cutofff:
+            index = self.asinst.snp_index
+            if index.has_gene and index.nlines <= self.hap_cutofff:
                 self.hap_treat = True
                 self.config['TREATHAP'] = True
 
-            map_file = os.path.join(self.tmpdir, 'sample.map')
-            with open(map_file, 'wt') as fh:
-                for snv in self.snv_sites:
-                    record = snp_info.get(snv, None)
-                    if record is None:
+            bim_file = self.bed_prefix + '.bim'
+            fingerprint = self.manifest.fingerprint('bim', self.geno_digest(), self.snp_digest())
+            if not self.manifest.fresh(bim_file, fingerprint):
+                records = []
+                minor, major = self.genotypes.minor_major()
+                for snv, a1, a2 in zip(self.snv_sites, minor, major):
+                    n = index.row(snv)
+                    if n is None:
                         raise Exception('Loss snv info: <%s>' % snv)
-                    rs, chrs, pos, *rest = record
-                    pos = self.parse_pos(pos)
-                    fh.write('{0}\t{1}\t0\t{2}\n'.format(chrs, rs, pos))
+                    # plink bim only recognises base position of indel regions.
+                    records.append((index.chrs[n], snv, index.starts[n], a1, a2))
+                write_bim(bim_file, records)
+                self.manifest.record(bim_file, fingerprint)
             if self.hap_treat:
                 hapfile = os.path.join(os.path.dirname(self.snp_file), 'raw_hap.txt')
-                self.to_hap(hapfile, snp_info)
+                fingerprint = self.manifest.fingerprint('raw_hap', self.snp_digest())
+                if not self.manifest.fresh(hapfile, fingerprint):
+                    self.to_hap(hapfile, index)
+                    self.manifest.record(hapfile, fingerprint)
                 self.config['RAW_HAP'] = hapfile
 
         except IOError as e:
@@ -151,12 +152,6 @@ class Formater:
                 e.strerror = 'Unable to load geno_file <%s>' % e.strerror
                 raise Exception()
 
-    def to_mdr(self, table, cols):
-        filename = os.path.join(self.tmpdir, 'mdrdata.txt')
-        required_tab = table.iloc[:, cols]
-        required_tab.to_csv(filename, header=True, index=False, sep='\t')
-        self.config['MDR'] = filename
-
     def to_covar(self, table):
         filename = os.path.join(self.tmpdir, 'covar.txt')
         if self.cov_num is not None and re.search(r'\d', str(self.cov_num)):
@@ -164,8 +159,7 @@ class Formater:
             covar = table.iloc[:, cols]
             covar.insert(0, 'IID', table.index)
             covar.insert(0, 'FID', table.index)
-            # covar.fillna('-9')
-            covar.apply(self.convert_dtype).to_csv(filename, header=True, index=False, sep='\t')
+            self.write_table(covar, filename, header=True, index=False)
             self.config['COVARFILE'] = filename
 
     def to_pheno(self, table):
@@ -175,46 +169,51 @@ class Formater:
             covar = table.iloc[:, cols]
             covar.insert(0, 'IID', table.index)
             covar.insert(0, 'FID', table.index)
-            covar.apply(self.convert_dtype).to_csv(filename, header=True, index=False, sep='\t')
+            self.write_table(covar, filename, header=True, index=False)
             self.config['PHENOFILE'] = filename
 
-    @staticmethod
-    def convert_dtype(x):
-        try:
-            return x.astype(int)
-        except:
-            return x
-
-    @staticmethod
-    def to_hap(filename, snp_info):
-        from collections import defaultdict
-        tmp = defaultdict(list)
-        for i in snp_info:
-            gene = snp_info[i][-1]
-            if len(snp_info[i]) < 6 or not gene.strip():
-                continue
-            tmp[gene].append(i)
+    def write_table(self, table, filename, **kwargs):
+        """Write a tab separated table, missing as -9. The file is left
+        untouched if its content is not changed since last written."""
+        text = table.to_csv(None, sep='\t', na_rep='-9', **kwargs)
+        fingerprint = self.manifest.fingerprint(text)
+        if self.manifest.fresh(filename, fingerprint):
+            return
         with open(filename, 'wt') as fh:
-            for gene in tmp:
-                if len(tmp[gene]) >= 2:
-                    fh.write('**\t{0}\t{1}\n'.format(gene, '\t'.join(tmp[gene])))
-
-    @staticmethod
-    def parse_pos(pos):
-        """Handle indel regions cause plink map format only recognise base position.
-        -  e.g. 180047739-180047739 will be converted to 180047739.
-
-        :param pos: chromosome position of a snp site.
-        """
-        return pos.split('-')[0]
+            fh.write(text)
+        self.manifest.record(filename, fingerprint)
 
-    @plink_operator('--file', '--make-bed')
-    def make_bed(self):
-        filename = os.path.join(self.tmpdir, 'sample')
-        outname = os.path.join(self.tmpdir, 'bsample')
-        self.config['BED'] =  outname
-        return filename, outname
+    def geno_digest(self):
+        return self.cache.digest(self.geno_file)
 
+    def snp_digest(self):
+        """Digest of the source of `SnpIndex`, i.e. SNPFILE or vcf GENOFILE."""
+        return self.cache.digest(self.snp_file or self.geno_file)
 
+    @staticmethod
+    def to_hap(filename, index):
+        genes = index.gene_snps()
+        with open(filename, 'wt') as fh:
+            for gene in genes:
+                if len(genes[gene]) >= 2:
+                    fh.write('**\t{0}\t{1}\n'.format(gene, '\t'.join(genes[gene])))
 
+    def bed_block(self):
+        """Number of snvs packed into bed at a time under `MEMORY_LIMIT`."""
+        nsamples = self.genotypes.shape[0]
+        if not self.memory:
+            return self.genotypes.shape[1] or 1
+        return max(int(self.memory) * 2 ** 20 // (CELL_BYTES * max(nsamples, 1)), 1)
 
+    def make_bed(self):
+        """Write snv-major bed file straight from the genotype matrix, skipped
+        if genotype file is not changed since the bed was written."""
+        bed_file = self.bed_prefix + '.bed'
+        fingerprint = self.manifest.fingerprint('bed', self.geno_digest())
+        if not self.manifest.fresh(bed_file, fingerprint):
+            multi = self.genotypes.multiallelic()
+            if multi:
+                print('[NOTE] Calls with a third allele are set missing: %s' % ','.join(multi))
+            write_bed(bed_file, self.genotypes.iter_dosage(self.bed_block()))
+            self.manifest.record(bed_file, fingerprint)
+        self.config['BED'] = self.bed_prefix
@@ -0,0 +1,263 @@
+"""
+    annotation module
+    ~~~~~~~~~~~~~~~~~
+
+    Implements gene region and 1000 genomes frequency annotation of snvs by
+    lookups in sorted interval indexes, in place of annovar.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# precedence of the regions of a snv hitting several transcripts, the same
+# as annovar: exonic = splicing > ncRNA > UTR5 = UTR3 > intronic >
+# upstream = downstream > intergenic.
+PRECEDENCE = OrderedDict([
+        ('exonic', 0), ('splicing', 0),
+        ('ncRNA_exonic', 1), ('ncRNA_splicing', 1), ('ncRNA_intronic', 1),
+        ('UTR5', 2), ('UTR3', 2),
+        ('intronic', 3),
+        ('upstream', 4), ('downstream', 4),
+        ('intergenic', 5),
+        ])
+
+
+def chrom_name(chrom):
+    """Chromosome without the 'chr' prefix, e.g. 'chr10' to '10'."""
+    chrom = str(chrom)
+    return chrom[3:] if chrom.lower().startswith('chr') else chrom
+
+def chrom_range(chroms, chrom):
+    """Rows of `chrom` in arrays sorted by chromosome."""
+    return (np.searchsorted(chroms, chrom, 'left'),
+            np.searchsorted(chroms, chrom, 'right'))
+
+def column(table, n, dtype=str):
+    """Column of a table as a plain numpy array."""
+    return np.array(table[n].tolist(), dtype=dtype)
+
+def sorted_arrays(arrays, chroms, starts):
+    """Reorder a dict of arrays by chromosome, then start."""
+    order = np.lexsort((starts, chroms))
+    return dict((key, value[order]) for key, value in arrays.items())
+
+
+class GeneIndex:
+    """Transcripts of a UCSC refGene table, e.g. hg19_refGene.txt of annovar,
+    sorted by chromosome and start. The running max of transcript ends
+    makes transcripts overlapping a position a binary search away.
+
+    Coordinates are those of UCSC, 0-based starts and 1-based ends, while
+    positions looked up are 1-based.
+
+    :param arrays: a dict of arrays given by `build`.
+    """
+    def __init__(self, arrays):
+        for key, value in arrays.items():
+            setattr(self, key, value)
+        # running max of ends within each chromosome, and the transcript
+        # reaching it.
+        self.reach = np.empty_like(self.ends)
+        self.reach_by = np.empty_like(self.ends)
+        rows = np.arange(len(self.ends))
+        for chrom in np.unique(self.chroms):
+            lo, hi = chrom_range(self.chroms, chrom)
+            ends = self.ends[lo:hi]
+            self.reach[lo:hi] = np.maximum.accumulate(ends)
+            record = np.where(ends == self.reach[lo:hi], rows[lo:hi], lo)
+            self.reach_by[lo:hi] = np.maximum.accumulate(record)
+
+    @staticmethod
+    def build(filename):
+        """Parse a refGene table into arrays, exons kept flat and found by
+        `exon_first` and `exon_count` of each transcript."""
+        table = pd.read_csv(filename, sep='\t', header=None, usecols=list(range(11)) + [12],
+                            dtype={1: str, 2: str, 3: str, 9: str, 10: str, 12: str})
+        counts = column(table, 8, np.int64)
+        exon_starts = np.array(','.join(table[9].str.rstrip(',')).split(','), dtype=np.int64)
+        exon_ends = np.array(','.join(table[10].str.rstrip(',')).split(','), dtype=np.int64)
+        arrays = dict(names=column(table, 1),
+                      chroms=np.array([chrom_name(c) for c in table[2]], dtype=str),
+                      strands=column(table, 3),
+                      starts=column(table, 4, np.int64),
+                      ends=column(table, 5, np.int64),
+                      cds_starts=column(table, 6, np.int64),
+                      cds_ends=column(table, 7, np.int64),
+                      genes=column(table, 12),
+                      exon_first=np.cumsum(counts) - counts,
+                      exon_count=counts)
+        arrays = sorted_arrays(arrays, arrays['chroms'], arrays['starts'])
+        arrays.update(exon_starts=exon_starts, exon_ends=exon_ends)
+        return arrays
+
+    def region(self, t, pos, splicing):
+        """Region of 1-based `pos` in transcript `t`, or its flanks."""
+        plus = self.strands[t] == '+'
+        if pos <= self.starts[t]:
+            return 'upstream' if plus else 'downstream'
+        if pos > self.ends[t]:
+            return 'downstream' if plus else 'upstream'
+        coding = self.cds_starts[t] < self.cds_ends[t]
+        first = self.exon_first[t]
+        starts = self.exon_starts[first:first + self.exon_count[t]]
+        ends = self.exon_ends[first:first + self.exon_count[t]]
+        n = np.searchsorted(starts, pos, 'left') - 1
+        if pos <= ends[n]:
+            if not coding:
+                return 'ncRNA_exonic'
+            if pos <= self.cds_starts[t]:
+                return 'UTR5' if plus else 'UTR3'
+            if pos > self.cds_ends[t]:
+                return 'UTR3' if plus else 'UTR5'
+            return 'exonic'
+        if min(pos - ends[n], starts[n + 1] + 1 - pos) <= splicing:
+            return 'splicing' if coding else 'ncRNA_splicing'
+        return 'intronic' if coding else 'ncRNA_intronic'
+
+    def intergenic(self, lo, hi, pos):
+        """Nearest genes on both sides of a position hitting no transcript,
+        in the form of annovar, e.g. 'A(dist=1200),B(dist=3400)'."""
+        left = lo + np.searchsorted(self.starts[lo:hi], pos, 'left') - 1
+        sides = []
+        if left >= lo:
+            t = self.reach_by[left]
+            sides.append('%s(dist=%d)' % (self.genes[t], pos - self.ends[t]))
+        else:
+            sides.append('NONE(dist=NONE)')
+        if left + 1 < hi:
+            t = left + 1
+            sides.append('%s(dist=%d)' % (self.genes[t], self.starts[t] + 1 - pos))
+        else:
+            sides.append('NONE(dist=NONE)')
+        return ','.join(sides)
+
+    def annotate(self, chroms, positions, splicing=8, neighbor=1000):
+        """Region, gene and mRNAs of each snv, like annovar --geneanno.
+
+        :param chroms: chromosome of each snv, without the 'chr' prefix.
+        :param positions: 1-based position of each snv.
+        :param splicing: distance to an exon boundary of splicing snvs.
+        :param neighbor: distance to a transcript of up/downstream snvs.
+        :returns: lists of regions, genes and mRNAs, the mRNAs being NM
+                  transcripts of exonic snvs.
+        """
+        chroms = np.asarray(chroms).astype(str)
+        positions = np.asarray(positions, dtype=np.int64)
+        regions = [''] * len(positions)
+        genes = [''] * len(positions)
+        mrnas = [''] * len(positions)
+        for chrom in np.unique(chroms):
+            lo, hi = chrom_range(self.chroms, chrom)
+            rows = np.flatnonzero(chroms == chrom)
+            pos = positions[rows]
+            # transcripts within `neighbor` of a position end no earlier
+            # than pos - neighbor, and start before pos + neighbor.
+            firsts = lo + np.searchsorted(self.reach[lo:hi], pos - neighbor, 'left')
+            lasts = lo + np.searchsorted(self.starts[lo:hi], pos + neighbor, 'left')
+            for row, p, first, last in zip(rows, pos, firsts, lasts):
+                hits = [(self.region(t, p, splicing), t) for t in range(first, last)
+                        if self.ends[t] >= p - neighbor]
+                if not hits:
+                    regions[row] = 'intergenic'
+                    genes[row] = self.intergenic(lo, hi, p)
+                    continue
+                level = min(PRECEDENCE[region] for region, _ in hits)
+                hits = [(region, t) for region, t in hits if PRECEDENCE[region] == level]
+                regions[row] = ';'.join(r for r in PRECEDENCE if r in set(h[0] for h in hits))
+                genes[row] = ','.join(OrderedDict((self.genes[t], None) for _, t in hits))
+                mrnas[row] = ','.join(sorted(set(self.names[t] for region, t in hits
+                                                 if region == 'exonic' and
+                                                 self.names[t].startswith('NM'))))
+        return regions, genes, mrnas
+
+
+class SiteFrequency:
+    """Allele frequencies of a 1000 genomes sites table of annovar, e.g.
+    hg19_CHBS.sites.2014_10.txt, whose columns are chromosome, position,
+    ref, alt and frequency, sorted by chromosome and position.
+
+    :param arrays: a dict of arrays given by `build`.
+    """
+    def __init__(self, arrays):
+        for key, value in arrays.items():
+            setattr(self, key, value)
+
+    @staticmethod
+    def build(filename):
+        table = pd.read_csv(filename, sep='\t', header=None, usecols=list(range(5)),
+                            dtype={0: str, 2: str, 3: str}, comment='#')
+        arrays = dict(chroms=np.array([chrom_name(c) for c in table[0]], dtype=str),
+                      positions=column(table, 1, np.int64),
+                      refs=column(table, 2),
+                      alts=column(table, 3),
+                      freqs=column(table, 4, np.float64))
+        return sorted_arrays(arrays, arrays['chroms'], arrays['positions'])
+
+    def lookup(self, chroms, positions, refs, alts):
+        """Frequency of the alt allele of each snv, NaN if not in the table.
+        Sites are matched on position and alleles, like annovar -filter."""
+        chroms = np.asarray(chroms).astype(str)
+        positions = np.asarray(positions, dtype=np.int64)
+        freqs = np.full(len(positions), np.nan)
+        for chrom in np.unique(chroms):
+            lo, hi = chrom_range(self.chroms, chrom)
+            rows = np.flatnonzero(chroms == chrom)
+            firsts = lo + np.searchsorted(self.positions[lo:hi], positions[rows], 'left')
+            lasts = lo + np.searchsorted(self.positions[lo:hi], positions[rows], 'right')
+            for row, first, last in zip(rows, firsts, lasts):
+                for n in range(first, last):
+                    if self.alts[n] == alts[row] and self.refs[n] == refs[row]:
+                        freqs[row] = self.freqs[n]
+                        break
+        return freqs
+
+
+class SnvAnnotation:
+    """Annotation of all snvs of `SnpIndex`, either index being optional.
+
+    :param snp_index: a `SnpIndex` instance.
+    :param genes: optional `GeneIndex`.
+    :param sites: optional `SiteFrequency`.
+    """
+    def __init__(self, snp_index, genes=None, sites=None):
+        self.snp_index = snp_index
+        self.genes = genes
+        self.sites = sites
+
+    def run(self):
+        """Arrays keyed 'REGION', 'GENE', 'MRNA' and 'G1000'."""
+        index = self.snp_index
+        chroms = [chrom_name(c) for c in index.chrs]
+        nsnps = len(index.snps)
+        result = OrderedDict()
+        if self.genes is not None:
+            regions, genes, mrnas = self.genes.annotate(chroms, index.starts)
+        else:
+            regions = genes = mrnas = [''] * nsnps
+        result['REGION'] = np.array(regions, dtype=str)
+        result['GENE'] = np.array(genes, dtype=str)
+        result['MRNA'] = np.array(mrnas, dtype=str)
+        if self.sites is not None:
+            result['G1000'] = self.sites.lookup(chroms, index.starts, index.refs, index.alts)
+        else:
+            result['G1000'] = np.full(nsnps, np.nan)
+        return result
+
+    def save(self, filename):
+        """Save annotation into a npz file along with snv names."""
+        arrays = dict(snps=np.array(self.snp_index.snps, dtype=str))
+        arrays.update(self.run())
+        np.savez(filename, **arrays)
+        return filename
+
+
+def load_annotation(filename):
+    """Load a npz saved by `SnvAnnotation.save` into a dict of annotation of
+    each snv, e.g. {'rs123': {'REGION': 'exonic', ...}}."""
+    with np.load(filename) as data:
+        keys = [key for key in data.files if key != 'snps']
+        return dict((snp, dict((key, data[key][n]) for key in keys))
+                    for n, snp in enumerate(data['snps']))
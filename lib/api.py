@@ -2,7 +2,7 @@ import re
 import numpy as np
 import pandas as pd
 
-from .mathematics import LogitRegression, ChiSquare
+from .mathematics import LogitRegression, ChiSquare, FisherExact
 
 
 def LRanalysis(filename, formula):
@@ -25,3 +25,7 @@ def Chi_test(filename, y, x):
     result = chi.calculator()
     return result
 
+def Fisher_test(filename, y, x):
+    fisher = FisherExact(filename=filename, items=(y, x))
+    result = fisher.calculator()
+    return result
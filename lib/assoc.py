@@ -6,18 +6,32 @@
 """
 
 import os
-import re
-import subprocess
+import threading
 from collections import namedtuple
 
 from .config import Config
 from .utils import dir_check, file_check
+from .cache import TableCache, ArtifactManifest, RunCache
+from .snpindex import SnpIndex
+from .vcf import VcfReader, is_vcf
+from .scheduler import ProcessSlots, StageScheduler
+from .jobs import ToolRunner, Timeline
+from .contingency import GenoCounts, ChiSquareTest, FisherTest
+from .hwe import HweTest
+from .frequency import AlleleFrequency
+from .regression import LogisticScan, LinearScan
+from .permutation import MaxTPermutation
+from .annotation import GeneIndex, SiteFrequency, SnvAnnotation
+from .chunks import SnvChunks
 
 
 default_config = {
         'PLINK':  '/home/wuj/bin/software/plink_1.90_beta/plink',
         'annovar': '/home/pub/software/annovar/annotate_variation.pl',
+        'humandb': '/home/pub/database/Human/hg19/Annotation',
         'basepath': os.path.abspath(os.path.dirname(__file__)),
+        'JOBS': 1,
+        'ENGINE': 'native',
         }
 
 
@@ -29,6 +43,19 @@ class AssocStudy:
 
     def __init__(self, cfgfile=None):
         self.config = self.make_config()
+        # encoded genotypes, given by `Formater`.
+        self.genotypes = None
+        self._cache = None
+        self._manifest = None
+        self._runcache = None
+        self._snp_index = None
+        self._slots = None
+        self._runner = None
+        self._counts = None
+        self._frequency = None
+        self._counts_lock = threading.Lock()
+        self._chunks = {}
+        self._chunks_lock = threading.Lock()
 
         if os.path.isfile(cfgfile):
             self.config.from_pyfile(cfgfile)
@@ -37,29 +64,172 @@ class AssocStudy:
         """Used to create the config attribute."""
         return self.config_class(default_config)
 
+    @property
+    def cache(self):
+        """Cache of parsed input tables under ROUTINE/tmp/cache."""
+        if self._cache is None:
+            self._cache = TableCache(os.path.join(self.config.get('ROUTINE'), 'tmp/cache'))
+        return self._cache
+
+    @property
+    def manifest(self):
+        """Fingerprints of the outputs under ROUTINE/tmp."""
+        if self._manifest is None:
+            self._manifest = ArtifactManifest(os.path.join(self.cache.cachedir, 'manifest.json'))
+        return self._manifest
+
+    @property
+    def runcache(self):
+        """Outputs of external tools under ROUTINE/tmp/runcache, None if
+        RUNCACHE is set False."""
+        if self._runcache is None and self.config.get('RUNCACHE', True):
+            self._runcache = RunCache(os.path.join(self.config.get('ROUTINE'), 'tmp/runcache'),
+                                      self.cache.digest)
+        return self._runcache
+
+    @property
+    def snp_index(self):
+        """Index of SNPFILE shared by all stages, parsed once and cached.
+        SNPFILE is optional for vcf GENOFILE, whose records make the index."""
+        if self._snp_index is None:
+            snpfile = self.config.get('SNPFILE', None)
+            genofile = self.config.get('GENOFILE', None)
+            if snpfile:
+                self._snp_index = self.cache.fetch('snpindex', snpfile, lambda: SnpIndex.from_file(snpfile))
+            elif is_vcf(genofile):
+                self._snp_index = self.cache.fetch('snpindex', genofile, lambda: VcfReader(genofile).snp_index())
+            else:
+                raise Exception('SNPFILE not provided, which is optional only for vcf GENOFILE.')
+        return self._snp_index
+
+    @property
+    def slots(self):
+        """Budget of `JOBS` processes running at the same time."""
+        if self._slots is None:
+            self._slots = ProcessSlots(self.config.get('JOBS', 1))
+        return self._slots
+
+    @property
+    def runner(self):
+        """`ToolRunner` of external tools shared by all stages, each job
+        killed after JOB_TIMEOUT seconds and recorded in
+        ROUTINE/tmp/timeline.txt."""
+        if self._runner is None:
+            timeline = Timeline(os.path.join(self.config.get('ROUTINE'), 'tmp/timeline.txt'))
+            self._runner = ToolRunner(self.slots, self.runcache, timeline,
+                                      self.config.get('JOB_TIMEOUT', None))
+        return self._runner
+
+    def run_command(self, name, commands, inputs=None, outputs=None):
+        """Run an external command by `runner`, with its output kept in
+        `name`.job.log. With `inputs` and `outputs` given, the command is
+        skipped if it was run on the same inputs, and its outputs are
+        restored from `runcache`.
+
+        :param name: name of the job, e.g. output prefix of plink.
+        :param inputs: files the command reads.
+        :param outputs: glob patterns of files the command writes.
+        """
+        return self.runner.run(name, commands, name + '.job.log', inputs, outputs)
+
+    def snv_chunks(self, prefix):
+        """`SnvChunks` of the bed fileset `prefix` by CHUNKS, shared by the
+        plink stages, None unless CHUNKS is above 1."""
+        n = int(self.config.get('CHUNKS', None) or 1)
+        if n <= 1:
+            return None
+        with self._chunks_lock:
+            if prefix not in self._chunks:
+                workdir = os.path.join(self.config.get('ROUTINE'), 'tmp/chunks', os.path.basename(prefix))
+                self._chunks[prefix] = SnvChunks(prefix + '.bim', n, workdir)
+        return self._chunks[prefix]
+
+    @property
+    def native(self):
+        """Whether tests are computed in-process, or by plink if `ENGINE`
+        is 'plink'."""
+        return self.config.get('ENGINE', 'native') != 'plink'
+
+    def genotype_counts(self):
+        """`GenoCounts` of the bed, counted once and shared by stages."""
+        with self._counts_lock:
+            if self._counts is None:
+                self._counts = GenoCounts.from_bed(self.config.get('BED', None),
+                                                   self.config.get('MEMORY_LIMIT', None))
+        return self._counts
+
+    def allele_frequency(self):
+        """`AlleleFrequency` of the bed, in place of plink --freq and
+        --freq case-control of the native engine."""
+        if self._frequency is None:
+            self._frequency = AlleleFrequency(self.genotype_counts())
+        return self._frequency
+
     def batch_run(self):
-        self.hwe()
-        self.freq()
-        self.freqcc()
-        self.annotation()
-        self.chitest()
-        self.fisher_test()
-        self.modelchi()
-        self.logistic()
+        """Run stages that read the same bed concurrently."""
+        scheduler = StageScheduler(self.slots)
+        # native stages compute in-process, each within a slot.
+        if self.native:
+            scheduler.add('hwe', self.hardy_weinberg, inprocess=True)
+        else:
+            scheduler.add('hwe', self.hwe)
+        if not self.native:
+            scheduler.add('freq', self.freq)
+            # freq and freqcc share the output prefix, and so the log.
+            scheduler.add('freqcc', self.freqcc, after=['freq'])
+        if self.native:
+            scheduler.add('annotation', self.annotate, inprocess=True)
+        else:
+            scheduler.add('annotation', self.annotation)
+        if self.native:
+            scheduler.add('chisquare', self.chisquare, inprocess=True)
+        else:
+            scheduler.add('chitest', self.chitest)
+            scheduler.add('modelchi', self.modelchi)
+        scheduler.add('fisher_test', self.fisher_test, inprocess=self.native)
+        if self.native:
+            scheduler.add('regression', self.regression, inprocess=True)
+            scheduler.add('linear', self.linear_regression, inprocess=True)
+        else:
+            scheduler.add('logistic', self.logistic)
+        if self.config.get('PERMUTATION', None):
+            scheduler.add('permutation', self.permutation)
+        scheduler.run()
 
     def annotation(self):
         annovar = self.config.get('annovar')
-        snpfile = self.config.get('SNPFILE', None)
         outdir = os.path.join(self.config.get('ROUTINE'), 'result/hwe')
         dir_check(outdir)
-        library = self.library_prepare(snpfile, outdir)
-        subprocess.run([annovar, '--hgvs', '-filter',
+        library = self.library_prepare(outdir)
+        self.run_command(library + '.filter', [annovar, '--hgvs', '-filter',
                         '-dbtype', '1000g2014oct_chbs',
                         '--buildver', 'hg19',
-                        library, '/home/pub/database/Human/hg19/Annotation'])
-        subprocess.run([annovar, '--hgvs', '--splicing_threshold',
+                        library, self.config.get('humandb')],
+                        inputs=[library], outputs=[library + '.*'])
+        self.run_command(library + '.gene', [annovar, '--hgvs', '--splicing_threshold',
                         '8', '--buildver', 'hg19', library,
-                        '/home/pub/database/Human/hg19/Annotation'])
+                        self.config.get('humandb')],
+                        inputs=[library], outputs=[library + '.*'])
+
+    def annotate(self):
+        """Gene region and 1000 genomes frequency of all snvs by in-process
+        lookups, saved as result/hwe/annotation.npz. Indexes of REFGENE and
+        G1000 tables are cached, a table not found is left out."""
+        humandb = self.config.get('humandb')
+        refgene = self.config.get('REFGENE', None) or os.path.join(humandb, 'hg19_refGene.txt')
+        g1000 = self.config.get('G1000', None) or os.path.join(humandb, 'hg19_CHBS.sites.2014_10.txt')
+        genes = sites = None
+        if os.path.isfile(refgene):
+            genes = GeneIndex(self.cache.fetch_arrays('refgene', refgene, lambda: GeneIndex.build(refgene)))
+        else:
+            print('[NOTE] REFGENE <%s> not found, ignoring gene annotation.' % refgene)
+        if os.path.isfile(g1000):
+            sites = SiteFrequency(self.cache.fetch_arrays('g1000', g1000, lambda: SiteFrequency.build(g1000)))
+        else:
+            print('[NOTE] G1000 <%s> not found, ignoring 1000 genomes frequency.' % g1000)
+        outdir = os.path.join(self.config.get('ROUTINE'), 'result/hwe')
+        dir_check(outdir)
+        return SnvAnnotation(self.snp_index, genes, sites).save(os.path.join(outdir, 'annotation.npz'))
 
     @plink_operator('--bfile', '--hardy')
     def hwe(self):
@@ -73,6 +243,13 @@ class AssocStudy:
 
         return options
 
+    def hardy_weinberg(self):
+        """Exact HWE test in ALL, AFF and UNAFF samples in-process, saved as
+        result/hwe/hwe.npz."""
+        outdir = os.path.join(self.config.get('ROUTINE'), 'result/hwe')
+        dir_check(outdir)
+        return HweTest(self.genotype_counts()).save(os.path.join(outdir, 'hwe.npz'))
+
     @plink_operator('--bfile', '--freq')
     def freq(self):
         filename = self.config.get('BED', None)
@@ -108,6 +285,13 @@ class AssocStudy:
         options = Options(filename=filename, outname=outname, covar=None, pheno=None)
         return options
 
+    def chisquare(self):
+        """Allelic, genotypic, dominant, recessive and trend chi-square tests
+        in-process, saved as result/chi-test/chisquare.npz."""
+        outdir = os.path.join(self.config.get('ROUTINE'), 'result/chi-test')
+        dir_check(outdir)
+        return ChiSquareTest(self.genotype_counts()).save(os.path.join(outdir, 'chisquare.npz'))
+
     @plink_operator('--bfile', '--assoc', 'fisher', '--adjust', '--ci', '0.95')
     def fishertest(self):
         filename = self.config.get('BED', None)
@@ -143,10 +327,18 @@ class AssocStudy:
 
     def fisher_test(self):
         do_fisher = self.config.get('FISHER', None)
-        if do_fisher:
+        if do_fisher and self.native:
+            self.fisher_exact()
+        elif do_fisher:
             self.fishertest()
             self.modelfisher()
 
+    def fisher_exact(self):
+        """Fisher exact tests in-process, saved as result/fisher-test/fisher.npz."""
+        outdir = os.path.join(self.config.get('ROUTINE'), 'result/fisher-test')
+        dir_check(outdir)
+        return FisherTest(self.genotype_counts()).save(os.path.join(outdir, 'fisher.npz'))
+
     @genetic_models('--logistic', '', 'dominant', 'recessive', 'hethom')
     def logistic(self):
         filename = self.config.get('BED', None)
@@ -165,38 +357,74 @@ class AssocStudy:
         if pheno_file is not None and file_check(pheno_file):
             pheno = pheno_file
 
-        Options = namedtuple('Opts', 'filename outname covar pheno')
-        options = Options(filename=filename, outname=outname, covar=covar, pheno=pheno)
+        # case/control models are fitted by `regression` unless plink is the engine.
+        Options = namedtuple('Opts', 'filename outname covar pheno casecontrol')
+        options = Options(filename=filename, outname=outname, covar=covar, pheno=pheno,
+                          casecontrol=not self.native)
         return options
 
-    @staticmethod
-    def library_prepare(filename, outdir):
+    def regression(self):
+        """Logistic regression of case/control status under all genetic
+        models in-process, saved as result/logistic-test/logistic.npz, and
+        logit_covar/logistic.npz with covariates of COVARFILE. With
+        SCORE_CUTOFF, snvs are score tested and only those below it refitted."""
+        filename = self.config.get('BED', None)
+        memory = self.config.get('MEMORY_LIMIT', None)
+        cutoff = self.config.get('SCORE_CUTOFF', None)
+        outdir = os.path.join(self.config.get('ROUTINE'), 'result/logistic-test')
+        dir_check(outdir)
+        LogisticScan(filename, memory=memory, cutoff=cutoff).save(os.path.join(outdir, 'logistic.npz'))
+
+        covar_file = self.config.get('COVARFILE', None)
+        if covar_file is not None and file_check(covar_file):
+            outdir = os.path.join(outdir, 'logit_covar')
+            dir_check(outdir)
+            LogisticScan(filename, covar_file, memory, cutoff).save(os.path.join(outdir, 'logistic.npz'))
+
+    def linear_regression(self):
+        """Linear regression of quantitative phenotypes of PHENOFILE under
+        all genetic models in-process, saved as
+        result/logistic-test/phenoassoc/linear.npz, and
+        phenoassoc_covar/linear.npz with covariates of COVARFILE."""
+        pheno_file = self.config.get('PHENOFILE', None)
+        if pheno_file is None or not file_check(pheno_file):
+            return
+        filename = self.config.get('BED', None)
+        memory = self.config.get('MEMORY_LIMIT', None)
+        basedir = os.path.join(self.config.get('ROUTINE'), 'result/logistic-test')
+        outdir = os.path.join(basedir, 'phenoassoc')
+        dir_check(outdir)
+        LinearScan(filename, pheno_file, memory=memory).save(os.path.join(outdir, 'linear.npz'))
+
+        covar_file = self.config.get('COVARFILE', None)
+        if covar_file is not None and file_check(covar_file):
+            outdir = os.path.join(basedir, 'phenoassoc_covar')
+            dir_check(outdir)
+            LinearScan(filename, pheno_file, covar_file, memory).save(os.path.join(outdir, 'linear.npz'))
+
+    def permutation(self):
+        """Empirical p-values of the allelic and trend tests by PERMUTATION
+        max(T) permutations, and adaptive ones up to PERMUTATION_MAX, saved
+        as result/permutation/permutation.npz."""
+        outdir = os.path.join(self.config.get('ROUTINE'), 'result/permutation')
+        dir_check(outdir)
+        perm = MaxTPermutation(self.config.get('BED', None), self.config.get('PERMUTATION'),
+                               maxperm=self.config.get('PERMUTATION_MAX', None),
+                               slots=self.slots, seed=self.config.get('PERMUTATION_SEED', 0),
+                               memory=self.config.get('MEMORY_LIMIT', None))
+        return perm.save(os.path.join(outdir, 'permutation.npz'))
+
+    def library_prepare(self, outdir):
+        """Write snvs into annovar input format."""
         output = os.path.join(outdir, 'library')
-        count = 0
-        with open(filename, 'rt') as fh,\
-                open(output, 'wt') as foh:
-            for line in fh:
-                count += 1
-                if re.match(r'^\s$', line):
-                    continue
-                if count == 1:
-                    continue
-                arr = line.strip().split()
-                snp, Chr, pos, *rest = arr
-                if re.search('-', pos):
-                    start, end = pos.split('-')
-                else:
-                    start = pos
-                    end = pos
-                newline = '\t'.join([Chr, start, end] + rest + [snp])
+        index = self.snp_index
+        with open(output, 'wt') as foh:
+            for n, snp in enumerate(index.snps):
+                start, end = str(index.starts[n]), str(index.ends[n])
+                rest = [index.refs[n], index.alts[n]]
+                if index.genes[n]:
+                    rest.append(index.genes[n])
+                rest.extend(index.extras[n])
+                newline = '\t'.join([index.chrs[n], start, end] + rest + [snp])
                 foh.write(newline + '\n')
         return output
-
-
-
-
-
-
-
-
-
@@ -7,7 +7,6 @@
 
 import os
 import re
-import subprocess
 from functools import wraps
 
 from .utils import dir_check
@@ -15,18 +14,60 @@ from .assoc import default_config
 plink = default_config.get('PLINK')
 
 
+def fileset(filetype, filename):
+    """Input files of plink by the type of input option."""
+    if filetype == '--bfile':
+        return [filename + ext for ext in ('.bed', '.bim', '.fam')]
+    if filetype == '--file':
+        return [filename + ext for ext in ('.ped', '.map')]
+    return [filename]
+
+class PlinkJobs:
+    """plink runs of a stage as a `JobSet`. With CHUNKS set, a run on a bed
+    fileset is split into runs on chunks of its snvs by --extract, whose
+    outputs are merged into those of the single run once all are done.
+
+    :param assoc_inst: an `AssocStudy` instance.
+    """
+    def __init__(self, assoc_inst):
+        self.assoc_inst = assoc_inst
+        self.jobs = assoc_inst.runner.jobs()
+        self.merges = []
+
+    def add(self, outname, commands, inputs, bfile=None):
+        """Add a plink run writing `outname`.*, split into chunks of the
+        snvs of `bfile` if given."""
+        chunks = self.assoc_inst.snv_chunks(bfile) if bfile else None
+        if chunks is None:
+            self.jobs.add(outname, commands + ['--out', outname, '--allow-no-sex'],
+                          outname + '.job.log', inputs, [outname + '.*'])
+            return
+        for listfile, prefix in chunks.parts(outname):
+            self.jobs.add(prefix, commands + ['--extract', listfile, '--out', prefix, '--allow-no-sex'],
+                          prefix + '.job.log', inputs + [listfile], [prefix + '.*'])
+        self.merges.append((chunks, outname))
+
+    def run(self):
+        self.jobs.run()
+        for chunks, outname in self.merges:
+            chunks.merge(outname)
+
 def plink_operator(filetype, *args):
     def decorator(func):
         @wraps(func)
         def wrapper(*opts):
             filename, outname, *rest = func(*opts)
-            commands = [plink, filetype, filename, '--out', outname, '--allow-no-sex'] + list(args)
-            subprocess.run(commands)
+            jobs = PlinkJobs(opts[0])
+            jobs.add(outname, [plink, filetype, filename] + list(args), fileset(filetype, filename),
+                     filename if filetype == '--bfile' else None)
+            jobs.run()
 
         return wrapper
     return decorator
 
 def genetic_models(*args):
+    """Run each genetic model crossed with covariates and phenotypes as a
+    set of independent plink jobs, see `PlinkJobs`."""
     def decorator(func):
         @wraps(func)
         def wrapper(*opts):
@@ -37,61 +78,36 @@ def genetic_models(*args):
             basedir = os.path.dirname(outname)
             covar = options.covar
             pheno = options.pheno
+            casecontrol = getattr(options, 'casecontrol', True)
+            jobs = PlinkJobs(opts[0])
+            inputs = fileset('--bfile', filename)
             for model in models:
-                tmpname = outname + model
+                commands = [plink, '--bfile', filename, analysis]
                 if model.strip():
-                    commands = [plink, '--bfile', filename, analysis, model,
-                            '--adjust', '--ci', '0.95',
-                            '--out', tmpname, '--allow-no-sex']
-                else:
-                    commands = [plink, '--bfile', filename, analysis,
-                            '--adjust', '--ci', '0.95',
-                            '--out', tmpname, '--allow-no-sex']
-                subprocess.run(commands)
+                    commands.append(model)
+                commands.extend(['--adjust', '--ci', '0.95'])
+
+                if casecontrol:
+                    tmpname = outname + model
+                    jobs.add(tmpname, commands, inputs, filename)
 
-                if covar is not None:
+                if covar is not None and casecontrol:
                     outdir = os.path.join(basedir, 'logit_covar')
                     dir_check(outdir)
                     tmpname = os.path.join(outdir, 'logistic%s' %model)
-                    if model.strip():
-                        commands = [plink, '--bfile', filename, analysis, model,
-                                '--adjust', '--ci', '0.95', '--covar', covar,
-                                '--out', tmpname, '--allow-no-sex']
-                    else:
-                        commands = [plink, '--bfile', filename, analysis,
-                                '--adjust', '--ci', '0.95', '--covar', covar,
-                                '--out', tmpname, '--allow-no-sex']
-                    subprocess.run(commands)
+                    jobs.add(tmpname, commands + ['--covar', covar], inputs + [covar], filename)
                 if pheno is not None:
                     outdir = os.path.join(basedir, 'phenoassoc')
                     dir_check(outdir)
-                    if model.strip():
-                        tmpname = os.path.join(outdir, 'logistic_%s' %model)
-                        commands = [plink, '--bfile', filename, analysis, model,
-                                '--adjust', '--ci', '0.95', '--pheno', pheno,
-                                '--all-pheno', '--out', tmpname, '--allow-no-sex']
-                    else:
-                        tmpname = os.path.join(outdir, 'logistic_add')
-                        commands = [plink, '--bfile', filename, analysis,
-                                '--adjust', '--ci', '0.95', '--pheno', pheno,
-                                '--all-pheno', '--out', tmpname, '--allow-no-sex']
-                    subprocess.run(commands)
+                    tmpname = os.path.join(outdir, 'logistic_%s' %(model.strip() or 'add'))
+                    jobs.add(tmpname, commands + ['--pheno', pheno, '--all-pheno'],
+                             inputs + [pheno], filename)
                 if pheno is not None and covar is not None:
                     outdir = os.path.join(basedir, 'phenoassoc_covar')
                     dir_check(outdir)
-                    if model.strip():
-                        tmpname = os.path.join(outdir, 'logistic_%s' %model)
-                        commands = [plink, '--bfile', filename, analysis, model,
-                                '--adjust', '--ci', '0.95', '--pheno', pheno,
-                                '--all-pheno', '--covar', covar,
-                                '--out', tmpname, '--allow-no-sex']
-                    else:
-                        tmpname = os.path.join(outdir, 'logistic_add')
-                        commands = [plink, '--bfile', filename, analysis,
-                                '--adjust', '--ci', '0.95', '--pheno', pheno,
-                                '--all-pheno', '--covar', covar,
-                                '--out', tmpname, '--allow-no-sex']
-                    subprocess.run(commands)
+                    tmpname = os.path.join(outdir, 'logistic_%s' %(model.strip() or 'add'))
+                    jobs.add(tmpname, commands + ['--pheno', pheno, '--all-pheno', '--covar', covar],
+                             inputs + [pheno, covar], filename)
+            jobs.run()
         return wrapper
     return decorator
-
@@ -12,8 +12,13 @@ import shutil
 import xlsxwriter
 from collections import defaultdict
 import numpy as np
-from .utils import file_check, dir_check, formater_type, print_readme
+from .utils import file_check, dir_check, formater_type, print_readme, to_float
 from .xlsx_formater import Formater
+from .contingency import GROUPS, TESTS, DEGREES, load_result, plink_format
+from .regression import MODELS, load_scan
+from .permutation import load_permutation
+from .annotation import load_annotation
+from .multitest import METHODS, adjust, config_method
 
 
 def reporter(assoc_inst):
@@ -45,16 +50,34 @@ def reporter(assoc_inst):
     all_reporter.report()
 
 
+def read_permutation(assoc_inst):
+    """Empirical p-values of `MaxTPermutation` by snv, None if PERMUTATION
+    is not set."""
+    if not assoc_inst.config.get('PERMUTATION', None):
+        return None
+    return load_permutation(os.path.join(assoc_inst.config.get('ROUTINE'),
+                                         'result/permutation/permutation.npz'))
+
+def emp_columns(permutation, snp, test, matched):
+    """EMP1 and EMP2 of `test` for the row of the model tested, blanks for
+    rows of other models."""
+    if not matched or snp not in permutation:
+        return ['', '']
+    emp = permutation.get(snp)
+    return [plink_format(emp[test + '_EMP1']), plink_format(emp[test + '_EMP2'])]
+
+
 class AllReport:
     def __init__(self, assoc_inst, chisq_info_container, logit_info_container, covar=False, *args):
         self.reportdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'report')
         raw_datadir = os.path.join(self.reportdir, 'Raw_data')
         dir_check(raw_datadir)
         tmpdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'tmp')
-        shutil.copy(os.path.join(tmpdir, 'sample.map'), raw_datadir)
-        shutil.copy(os.path.join(tmpdir, 'sample.ped'), raw_datadir)
+        for ext in ('bed', 'bim', 'fam'):
+            shutil.copy(os.path.join(tmpdir, 'bsample.%s' % ext), raw_datadir)
 
         self.report_cutoff = assoc_inst.config.get('REPORT_CUTOFF', None) or 1
+        self.adjusted = '%s adjusted' % METHODS[config_method(assoc_inst.config)]
         self.chisq = chisq_info_container
         self.logit = logit_info_container
         self.report_covar = False
@@ -85,9 +108,9 @@ class AllReport:
         sheet_logit = workbook.add_worksheet('逻辑回归')
         if self.report_covar:
             sheet_logit_covar = workbook.add_worksheet('逻辑回归校正')
-        header_chi = 'SNP,Class,Model,Genotype,Case,Control,ChiScore,OR(95%CI),P-value,FDR_BH adjusted'.split(',')
-        header_fisher = 'SNP,Class,Model,Genotype,Case,Control,OR(95%CI),P-value,FDR_BH adjusted'.split(',')
-        header_logit = 'SNP,Class,Model,Genotype,Case,Control,OR(95%CI),P-value,FDR_BH adjusted'.split(',')
+        header_chi = 'SNP,Class,Model,Genotype,Case,Control,ChiScore,OR(95%CI),P-value'.split(',') + [self.adjusted]
+        header_fisher = 'SNP,Class,Model,Genotype,Case,Control,OR(95%CI),P-value'.split(',') + [self.adjusted]
+        header_logit = 'SNP,Class,Model,Genotype,Case,Control,OR(95%CI),P-value'.split(',') + [self.adjusted]
 
         row_chi = 0
         row_fisher = 0
@@ -311,8 +334,10 @@ class ChiBlockHandler:
 
 class HweReporter:
     def __init__(self, assoc_inst):
+        self.native = assoc_inst.native
+        self.assoc_inst = assoc_inst
         self.basepath = assoc_inst.config.get('basepath')
-        self.snpinfo = assoc_inst.config.get('SNPFILE')
+        self.snp_index = assoc_inst.snp_index
         self.reportdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'report')
         dir_check(self.reportdir)
         self.resultdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'result')
@@ -327,9 +352,16 @@ class HweReporter:
         readmefile = os.path.join(self.basepath, 'ReadMetxt/readme_hwe.txt')
         print_readme(sheet_readme, readmefile, formater)
 
-        self.record_hwe_result()
-        self.record_maf()
-        self.parse_annotation()
+        if self.native:
+            self.record_native_hwe()
+            self.record_native_maf()
+        else:
+            self.record_hwe_result()
+            self.record_maf()
+        if self.native:
+            self.record_native_annotation()
+        else:
+            self.parse_annotation()
         header = 'SNP,CHR,Position(hg19),Minor allele,Major allele,GeneName,Mrna,Region,\
                 CHBS_1000g,Total(11/01/00),Total MAF,HWE,Case(11/01/00),\
                 Case_majorallele_number,Case_minorallele_number,Case MAF,HWE_Case,\
@@ -350,7 +382,6 @@ class HweReporter:
         workbook.close()
 
     def record_hwe_result(self):
-        snpinfo = self.get_snpinfo()
         hwefile = os.path.join(self.resultdir, 'hwe/hwe.hwe')
         count = 0
         with open(hwefile, 'rt') as fh:
@@ -365,19 +396,28 @@ class HweReporter:
                     handler = HweHandler(arr[1])
                     self.info_container[arr[1]] = handler
                 handler.Chr = arr[0]
-                handler.pos = snpinfo[arr[1]][0]
+                handler.pos = self.snp_index.get(arr[1], 'positions')
                 handler.Minorallele = arr[3]
                 handler.Majorallele = arr[4]
                 handler.add_info(arr)
-    def get_snpinfo(self):
-        snp = {}
-        with open(self.snpinfo, 'rt') as fh:
-            for line in fh:
-                if re.match(r'^\s$', line):
-                    continue
-                arr = line.split()
-                snp[arr[0]] = arr[2:5]
-        return snp
+
+    def record_native_hwe(self):
+        """Fill handlers from result of `HweTest`, the same way as the plink
+        output is parsed."""
+        counts, result = load_result(os.path.join(self.resultdir, 'hwe/hwe.npz'))
+        for n, snp in enumerate(counts.snps):
+            handler = HweHandler(snp)
+            self.info_container[snp] = handler
+            handler.Chr = counts.chrs[n]
+            handler.pos = self.snp_index.get(snp, 'positions')
+            handler.Minorallele = counts.minor[n]
+            handler.Majorallele = counts.major[n]
+            for group in GROUPS:
+                geno = '/'.join(map(str, counts.counts[group][n]))
+                handler.add_info([handler.Chr, snp, group, handler.Minorallele, handler.Majorallele, geno,
+                                  plink_format(result[group + '_OHET'][n]),
+                                  plink_format(result[group + '_EHET'][n]),
+                                  plink_format(result[group + '_P'][n])])
 
     def record_maf(self):
         maffile = os.path.join(self.resultdir, 'hwe/freq.frq')
@@ -410,6 +450,32 @@ class HweReporter:
                 handler.data.get('AFF')['maf'] = arr[4]
                 handler.data.get('UNAFF')['maf'] = arr[5]
 
+    def record_native_maf(self):
+        """Fill MAF of each group from `AlleleFrequency`, held in memory
+        instead of freq.frq and freq.frq.cc."""
+        frequency = self.assoc_inst.allele_frequency()
+        for snp, handler in self.info_container.items():
+            for group in GROUPS:
+                maf = frequency.get(snp, group + '_MAF')
+                if maf is not None:
+                    handler.data.setdefault(group, {})['maf'] = plink_format(maf)
+
+    def record_native_annotation(self):
+        """Fill annotation from result of `SnvAnnotation`, the same way as
+        outputs of annovar are parsed."""
+        annotation = load_annotation(os.path.join(self.resultdir, 'hwe/annotation.npz'))
+        for snp, handler in self.info_container.items():
+            record = annotation.get(snp)
+            if record is None:
+                continue
+            if not np.isnan(record['G1000']):
+                handler.g1000 = '%g' % record['G1000']
+            if record['REGION']:
+                handler.region = str(record['REGION'])
+                handler.gene = re.match(r'^(\w+)', str(record['GENE'])).group(1)
+            if record['MRNA']:
+                handler.mrna = str(record['MRNA'])
+
     def parse_annotation(self):
         f1000g = os.path.join(self.resultdir, 'hwe/library.hg19_ALL.sites.2012_02_dropped')
         fgeneanno = os.path.join(self.resultdir, 'hwe/library.variant_function')
@@ -501,11 +567,14 @@ class HweHandler:
 class ChiReporter:
     """Put chi-square analysis result into xlsx files."""
     def __init__(self, assoc_inst):
+        self.native = assoc_inst.native
         self.basepath = assoc_inst.config.get('basepath')
         self.reportdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'report')
         dir_check(self.reportdir)
         self.resultdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'result')
         self.info_container = {}
+        self.permutation = read_permutation(assoc_inst)
+        self.adjust = config_method(assoc_inst.config)
 
     def report(self):
         workbook = xlsxwriter.Workbook(os.path.join(self.reportdir, 'ChiSquare.xlsx'))
@@ -516,11 +585,17 @@ class ChiReporter:
         readmefile = os.path.join(self.basepath, 'ReadMetxt/readme_chi.txt')
         print_readme(sheet_readme, readmefile, formater)
 
-        self.record_model_result()
-        self.record_assoc_result()
+        if self.native:
+            self.record_native_result()
+        else:
+            self.record_model_result()
+            self.record_assoc_result()
+        self.record_adjusted()
 
         header = 'SNP,CHR,Major allele,Minor allele,Model,AFF(11|10|00),\
-                UNAFF(11|10|00),ChiScore,OR(95%CI),P-value,FDR_BH adjusted'.split(',')
+                UNAFF(11|10|00),ChiScore,OR(95%CI),P-value'.split(',') + [METHODS[self.adjust] + ' adjusted']
+        if self.permutation is not None:
+            header += ['EMP1', 'EMP2']
         row = 0
         for i, j in enumerate(map(lambda s: s.strip(),header)):
             sheet.write(row, i, j, formater.header)
@@ -530,7 +605,9 @@ class ChiReporter:
             handler = self.info_container.get(snp)
             lines = handler.output()
             for line in lines:
-                fmt = formater_type(line, [9, 10], formater)
+                if self.permutation is not None:
+                    line = line + emp_columns(self.permutation, snp, 'ALLELIC', line[4] == 'Allele')
+                fmt = formater_type(line, [9, 10, 11, 12], formater)
                 for i, j in enumerate(line):
                     sheet.write(row, i, j, fmt[i])
                 row += 1
@@ -561,7 +638,6 @@ class ChiReporter:
 
     def record_assoc_result(self):
         assocfile = os.path.join(self.resultdir, 'chi-test/chi.assoc')
-        adjustfile = os.path.join(self.resultdir, 'chi-test/chi.assoc.adjusted')
         count = 0
         with open(assocfile, 'rt') as fh:
             for line in fh:
@@ -576,19 +652,34 @@ class ChiReporter:
                     continue
                 handler.data['ALLELIC']['ORCI'] = '%s(%s-%s)' %(arr[9], arr[11], arr[12])
 
-        count = 0
-        with open(adjustfile, 'rt') as fh:
-            for line in fh:
-                count += 1
-                if count == 1:
+    def record_native_result(self):
+        """Fill handlers from result of `ChiSquareTest`, the same way as the
+        plink output is parsed."""
+        counts, result = load_result(os.path.join(self.resultdir, 'chi-test/chisquare.npz'))
+        tables = counts.tables()
+        for n, snp in enumerate(counts.snps):
+            handler = ChiHandler(snp)
+            self.info_container[snp] = handler
+            handler.Chr = counts.chrs[n]
+            handler.Minorallele = counts.minor[n]
+            handler.Majorallele = counts.major[n]
+            for test in TESTS:
+                if test == 'TREND':
                     continue
-                arr = line.split()
-                snp = arr[1]
-                if snp in self.info_container:
-                    handler = self.info_container.get(snp)
-                else:
-                    continue
-                handler.data['ALLELIC']['FDR'] = arr[-2]
+                aff, unaff = ['/'.join(map(str, row)) for row in tables[test][n]]
+                handler.add_info([handler.Chr, snp, handler.Minorallele, handler.Majorallele,
+                                  test, aff, unaff, plink_format(result[test + '_CHISQ'][n]),
+                                  str(DEGREES[test]), plink_format(result[test + '_P'][n])])
+            handler.data['ALLELIC']['ORCI'] = '%s(%s-%s)' % tuple(
+                    plink_format(result[key][n]) for key in ('OR', 'L95', 'U95'))
+
+
+    def record_adjusted(self):
+        """Adjust p-values of the allelic test over all snvs by `ADJUST`."""
+        handlers = [h for h in self.info_container.values() if 'ALLELIC' in h.data]
+        values = adjust([to_float(h.data['ALLELIC'].get('p')) for h in handlers], self.adjust)
+        for handler, value in zip(handlers, values):
+            handler.data['ALLELIC']['FDR'] = plink_format(value)
 
 
 class ChiHandler:
@@ -633,11 +724,15 @@ class FisherReporter(ChiReporter):
         readmefile = os.path.join(self.basepath, 'ReadMetxt/readme_fisher.txt')
         print_readme(sheet_readme, readmefile, formater)
 
-        self.record_model_result()
-        self.record_assoc_result()
+        if self.native:
+            self.record_native_result()
+        else:
+            self.record_model_result()
+            self.record_assoc_result()
+        self.record_adjusted()
 
         header = 'SNP,CHR,Major allele,Minor allele,Model,AFF(11|10|00),\
-                UNAFF(11|10|00),OR(95%CI),P-value,FDR_BH adjusted'.split(',')
+                UNAFF(11|10|00),OR(95%CI),P-value'.split(',') + [METHODS[self.adjust] + ' adjusted']
         row = 0
         for i, j in enumerate(map(lambda s: s.strip(),header)):
             sheet.write(row, i, j, formater.header)
@@ -678,7 +773,6 @@ class FisherReporter(ChiReporter):
 
     def record_assoc_result(self):
         assocfile = os.path.join(self.resultdir, 'fisher-test/fisher.assoc.fisher')
-        adjustfile = os.path.join(self.resultdir, 'fisher-test/fisher.assoc.fisher.adjusted')
         count = 0
         with open(assocfile, 'rt') as fh:
             for line in fh:
@@ -693,19 +787,25 @@ class FisherReporter(ChiReporter):
                     continue
                 handler.data['ALLELIC']['ORCI'] = '%s(%s-%s)' %(arr[8], arr[10], arr[11])
 
-        count = 0
-        with open(adjustfile, 'rt') as fh:
-            for line in fh:
-                count += 1
-                if count == 1:
+    def record_native_result(self):
+        """Fill handlers from result of `FisherTest`, the same way as the
+        plink output is parsed."""
+        counts, result = load_result(os.path.join(self.resultdir, 'fisher-test/fisher.npz'))
+        tables = counts.tables()
+        for n, snp in enumerate(counts.snps):
+            handler = FisherHandler(snp)
+            self.info_container[snp] = handler
+            handler.Chr = counts.chrs[n]
+            handler.Minorallele = counts.minor[n]
+            handler.Majorallele = counts.major[n]
+            for test in TESTS:
+                if test == 'TREND':
                     continue
-                arr = line.split()
-                snp = arr[1]
-                if snp in self.info_container:
-                    handler = self.info_container.get(snp)
-                else:
-                    continue
-                handler.data['ALLELIC']['FDR'] = arr[-2]
+                aff, unaff = ['/'.join(map(str, row)) for row in tables[test][n]]
+                handler.add_info([handler.Chr, snp, handler.Minorallele, handler.Majorallele,
+                                  test, aff, unaff, plink_format(result[test + '_P'][n])])
+            handler.data['ALLELIC']['ORCI'] = '%s(%s-%s)' % tuple(
+                    plink_format(result[key][n]) for key in ('OR', 'L95', 'U95'))
 
 
 class FisherHandler(ChiHandler):
@@ -733,17 +833,27 @@ class FisherHandler(ChiHandler):
 class LogitReporter:
     """Put result of logistic analysis into a xlsx."""
     def __init__(self, assoc_inst, covar=False):
+        self.native = assoc_inst.native
         self.basepath = assoc_inst.config.get('basepath')
         self.reportdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'report')
         dir_check(self.reportdir)
         self.resultdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'result/logistic-test')
         self.info_container = {}
+        self.untested = []
         self.report_covar = covar
+        self.adjust = config_method(assoc_inst.config)
+        # permutation is of case/control labels, without covariates.
+        self.permutation = None
         if self.report_covar:
             self.resultdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'result/logistic-test/logit_covar')
+        else:
+            self.permutation = read_permutation(assoc_inst)
 
     def report(self):
-        self.iter_models()
+        if self.native:
+            self.record_native_logit()
+        else:
+            self.iter_models()
         if self.report_covar:
             workbook = xlsxwriter.Workbook(os.path.join(self.reportdir, 'Logistic_CORRECT.xlsx'))
         else:
@@ -755,7 +865,10 @@ class LogitReporter:
         readmefile = os.path.join(self.basepath, 'ReadMetxt/readme_logit.txt')
         print_readme(sheet_readme, readmefile, formater)
 
-        header = 'SNP,CHR,BP,Alt Allele,Model,NMISS,OR,SE,L95,U95,STAT,P-value,FDR_BH adjusted'.split(',')
+        header = 'SNP,CHR,BP,Alt Allele,Model,NMISS,OR,SE,L95,U95,STAT,P-value'.split(',')
+        header.append(METHODS[self.adjust] + ' adjusted')
+        if self.permutation is not None:
+            header += ['EMP1', 'EMP2']
         row = 0
         for i, j in enumerate(header):
             sheet.write(row, i, j, formater.header)
@@ -765,7 +878,9 @@ class LogitReporter:
             handler = self.info_container.get(snp)
             lines = handler.output()
             for line in lines:
-                fmt = formater_type(line, [11,12], formater)
+                if self.permutation is not None:
+                    line = line + emp_columns(self.permutation, snp, 'TREND', line[4] == 'Additive')
+                fmt = formater_type(line, [11, 12, 13, 14], formater)
                 for i, j in enumerate(line):
                     sheet.write(row, i, j, fmt[i])
                 row += 1
@@ -782,7 +897,7 @@ class LogitReporter:
         """extracting result  from logistic analysis result files
         of different genetic models.
         """
-        adjusted = filename + '.adjusted'
+        tested = []
         try:
             with open(filename, 'rt') as fh:
                 for line in fh:
@@ -798,26 +913,45 @@ class LogitReporter:
                         handler.pos = arr[2]
                         handler.Minorallele = arr[3]
                         handler.add_info(arr)
+                    if arr[4] == ('GENO_2DF' if mark == 'HETHOM' else mark):
+                        tested.append((self.info_container.get(snp), arr[-1]))
         except FileNotFoundError:
             pass
+        self.record_adjusted(tested, mark)
 
-        count = 0
-        try:
-            with open(adjusted, 'rt') as fh:
-                for line in fh:
-                    count += 1
-                    if count == 1:
-                        continue
-                    arr = line.split()
-                    snp = arr[1]
-                    handler = self.info_container.get(snp)
-                    if mark == 'HETHOM':
-                        handler.data.get('HET').__setitem__('fdr', arr[-2])
-                        handler.data.get('HOM').__setitem__('fdr', arr[-2])
-                    else:
-                        handler.data.get(mark).__setitem__('fdr', arr[-2])
-        except FileNotFoundError:
-            pass
+    def record_adjusted(self, tested, mark):
+        """Adjust p-values of a model over all snvs by `ADJUST`.
+
+        :param tested: pairs of handler and p-value of the model, that of
+                       the joint 2 df test for het/hom.
+        """
+        values = adjust([to_float(p) for _, p in tested], self.adjust)
+        terms = MODELS.get(mark, (mark,))
+        for (handler, _), value in zip(tested, values):
+            for term in terms:
+                handler.data.setdefault(term, {})['fdr'] = plink_format(value)
+
+    def record_native_logit(self):
+        """Fill handlers from result of `LogisticScan`, the same way as the
+        plink output is parsed."""
+        result = load_scan(os.path.join(self.resultdir, 'logistic.npz'))
+        handlers = []
+        for n, snp in enumerate(result['snps']):
+            handler = LogitHandler(snp)
+            self.info_container[snp] = handler
+            handlers.append(handler)
+            handler.Chr = result['chrs'][n]
+            handler.pos = result['pos'][n]
+            handler.Minorallele = result['minor'][n]
+            for terms in MODELS.values():
+                for term in terms:
+                    values = [plink_format(result['%s_%s' % (term, key)][n])
+                              for key in ('OR', 'SE', 'L95', 'U95', 'STAT', 'P')]
+                    handler.add_info([handler.Chr, snp, handler.pos, handler.Minorallele, term,
+                                      str(int(result[term + '_NMISS'][n]))] + values)
+        for model, terms in MODELS.items():
+            p = result['%s_P' % (terms[0] if len(terms) == 1 else model)]
+            self.record_adjusted(list(zip(handlers, p)), model)
 
 
 class LogitHandler:
@@ -872,14 +1006,19 @@ class PhenoLogitReporter(LogitReporter):
         self.basepath = assoc_inst.config.get('basepath')
         self.reportdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'report')
         dir_check(self.reportdir)
+        self.native = assoc_inst.native
         self.resultdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'result/logistic-test/phenoassoc')
         self.info_container = {}
         self.report_covar = covar
+        self.adjust = config_method(assoc_inst.config)
         if self.report_covar:
             self.resultdir = os.path.join(assoc_inst.config.get('ROUTINE'), 'result/logistic-test/phenoassoc_covar')
 
     def report(self):
-        self.iter_models()
+        if self.native:
+            self.record_native_linear()
+        else:
+            self.iter_models()
         readmefile = os.path.join(self.basepath, 'ReadMetxt/readme_phenologit.txt')
         if self.report_covar:
             workbook = xlsxwriter.Workbook(os.path.join(self.reportdir, 'PhenoLogistic_CORRECT.xlsx'))
@@ -889,8 +1028,13 @@ class PhenoLogitReporter(LogitReporter):
         sheet = workbook.add_worksheet('ALL')
         sheet.set_row(0, 30)
         sheet_readme = workbook.add_worksheet('ReadMe')
-        print_readme(sheet_readme, readmefile, formater)
-        header = 'PhenoName,SNP,CHR,BP,Alt Allele,Model,NMISS,Beta,SE,L95,U95,STAT,P-value,FDR_BH adjusted'.split(',')
+        readme_row = print_readme(sheet_readme, readmefile, formater)
+        if self.untested:
+            sheet_readme.write(readme_row, 0, '未检验表型', formater.normal)
+            sheet_readme.write(readme_row, 1, '%s 可由协变量完全解释，未进行检验，结果为 NA' %
+                               ','.join(self.untested), formater.normal)
+        header = 'PhenoName,SNP,CHR,BP,Alt Allele,Model,NMISS,Beta,SE,L95,U95,STAT,P-value'.split(',')
+        header.append(METHODS[self.adjust] + ' adjusted')
         row = 0
         for i, j in enumerate(header):
             sheet.write(row, i, j, formater.header)
@@ -916,12 +1060,12 @@ class PhenoLogitReporter(LogitReporter):
             self.record_logit_result(filename, models_mark)
 
     def record_logit_result(self, filename, models_mark):
-        adjusted = filename + '.adjusted'
         basename_info = os.path.basename(filename).split('.')
         pheno_name = basename_info[1]
         model = basename_info[0].split('_')[1]
         mark = models_mark.get(model)
 
+        tested = []
         try:
             with open(filename, 'rt') as fh:
                 for line in fh:
@@ -937,27 +1081,38 @@ class PhenoLogitReporter(LogitReporter):
                         handler.pos = arr[2]
                         handler.Minorallele = arr[3]
                         handler.add_info(arr)
+                    if arr[4] == ('GENO_2DF' if mark == 'HETHOM' else mark):
+                        tested.append((self.info_container.get(pheno_snp), arr[-1]))
         except FileNotFoundError:
             pass
-
-        count = 0
-        try:
-            with open(adjusted, 'rt') as fh:
-                for line in fh:
-                    count += 1
-                    if count == 1:
-                        continue
-                    arr = line.split()
-                    pheno_snp = '-'.join([pheno_name, arr[1]])
-                    handler = self.info_container.get(pheno_snp)
-                    if mark == 'HETHOM':
-                        handler.data.get('HET').__setitem__('fdr', arr[-2])
-                        handler.data.get('HOM').__setitem__('fdr', arr[-2])
-                    else:
-                        handler.data.get(mark).__setitem__('fdr', arr[-2])
-        except FileNotFoundError:
-            pass
-
+        self.record_adjusted(tested, mark)
+
+    def record_native_linear(self):
+        """Fill handlers from result of `LinearScan`, the same way as the
+        plink output of each phenotype is parsed. Phenotypes not tested get
+        NA."""
+        result = load_scan(os.path.join(self.resultdir, 'linear.npz'))
+        self.untested = list(result.get('untested', []))
+        for i, pheno_name in enumerate(result['phenos']):
+            handlers = []
+            for n, snp in enumerate(result['snps']):
+                pheno_snp = '-'.join([pheno_name, snp])
+                handler = LogitHandler(pheno_snp)
+                self.info_container[pheno_snp] = handler
+                handlers.append(handler)
+                handler.Chr = result['chrs'][n]
+                handler.pos = result['pos'][n]
+                handler.Minorallele = result['minor'][n]
+                for terms in MODELS.values():
+                    for term in terms:
+                        values = [plink_format(result['%s_%s' % (term, key)][i, n])
+                                  for key in ('BETA', 'SE', 'L95', 'U95', 'STAT', 'P')]
+                        nmiss = result[term + '_NMISS'][i, n]
+                        handler.add_info([handler.Chr, snp, handler.pos, handler.Minorallele, term,
+                                          'NA' if np.isnan(nmiss) else str(int(nmiss))] + values)
+            for model, terms in MODELS.items():
+                p = result['%s_P' % (terms[0] if len(terms) == 1 else model)][i]
+                self.record_adjusted(list(zip(handlers, p)), model)
 
 
 
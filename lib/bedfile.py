@@ -0,0 +1,139 @@
+"""
+    bedfile module
+    ~~~~~~~~~~~~~~
+
+    Implements plink binary (.bed/.bim/.fam) files operations.
+"""
+
+import numpy as np
+
+
+BED_MAGIC = bytes([0x6c, 0x1b, 0x01])
+
+# 2-bit bed codes indexed by minor allele (A1) dosage, the last one for -1,
+# i.e. missing: 00 hom A1, 10 het, 11 hom A2, 01 missing.
+DOSAGE_CODE = np.array([0b11, 0b10, 0b00, 0b01], dtype=np.uint8)
+
+
+def pack_dosage(dosage):
+    """Pack a (samples, snps) dosage array into snv-major bed bytes, four
+    samples in a byte with the first sample in the lowest two bits.
+
+    :param dosage: an int8 array of minor allele counts, -1 for missing.
+    """
+    nsamples, nsnps = dosage.shape
+    nbytes = (nsamples + 3) // 4
+    codes = np.full((nsnps, nbytes * 4), 0b01, dtype=np.uint8)
+    codes[:, :nsamples] = DOSAGE_CODE[dosage.T]
+    codes = codes.reshape(nsnps, nbytes, 4)
+    return codes[:, :, 0] | codes[:, :, 1] << 2 | codes[:, :, 2] << 4 | codes[:, :, 3] << 6
+
+
+def write_bed(filename, blocks):
+    """Write a snv-major bed file block by block.
+
+    :param filename: output bed file.
+    :param blocks: iterable of int8 arrays of minor allele counts, each shaped
+                   (samples, snps) for consecutive snvs.
+    """
+    with open(filename, 'wb') as fh:
+        fh.write(BED_MAGIC)
+        for dosage in blocks:
+            fh.write(pack_dosage(dosage).tobytes())
+
+
+def write_bim(filename, records):
+    """Write a bim file.
+
+    :param records: iterable of (chr, snp, position, A1, A2).
+    """
+    with open(filename, 'wt') as fh:
+        for chrs, snp, pos, a1, a2 in records:
+            fh.write('{0}\t{1}\t0\t{2}\t{3}\t{4}\n'.format(chrs, snp, pos, a1, a2))
+
+
+# minor allele (A1) dosage of each 2-bit bed code, -1 for missing.
+CODE_DOSAGE = np.array([2, -1, 1, 0], dtype=np.int8)
+# dosages of the four samples packed in each possible byte.
+BYTE_DOSAGE = CODE_DOSAGE[(np.arange(256)[:, None] >> np.array([0, 2, 4, 6])) & 3]
+
+
+class BedReader:
+    """Memory-mapped access to a snv-major plink binary fileset.
+
+    Raw bytes of a snv are zero-copy views of the mapped file, and only the
+    requested snvs (and samples) are decoded into dosages.
+
+    :param prefix: path of the fileset without extension.
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.fam = self.read_table(prefix + '.fam')
+        self.bim = self.read_table(prefix + '.bim')
+        self.samples = [r[1] for r in self.fam]
+        self.snps = [r[1] for r in self.bim]
+        self.snp_index = dict((snp, n) for n, snp in enumerate(self.snps))
+        self.nbytes = (len(self.samples) + 3) // 4
+
+        with open(prefix + '.bed', 'rb') as fh:
+            if fh.read(3) != BED_MAGIC:
+                raise Exception('Malformed bed file <%s>, snv-major bed is required.' % prefix)
+        self.bed = np.memmap(prefix + '.bed', dtype=np.uint8, mode='r', offset=3,
+                             shape=(len(self.snps), self.nbytes))
+
+    @staticmethod
+    def read_table(filename):
+        with open(filename, 'rt') as fh:
+            return [line.split() for line in fh if line.strip()]
+
+    @property
+    def shape(self):
+        return len(self.samples), len(self.snps)
+
+    def pheno(self):
+        """Phenotype column of fam, 2 for case, 1 for control."""
+        return np.array([r[5] for r in self.fam]).astype(float)
+
+    def minor_major(self):
+        return [r[4] for r in self.bim], [r[5] for r in self.bim]
+
+    def index(self, snps):
+        """Positions of snvs by name."""
+        return np.array([self.snp_index[s] for s in snps], dtype=np.intp)
+
+    def snp_bytes(self, pos):
+        """Raw bed bytes of the snv at `pos`, a view of the mapped file."""
+        return self.bed[pos]
+
+    def dosage(self, snps=None, samples=None):
+        """Decode minor allele dosage shaped (samples, snps), -1 for missing.
+
+        :param snps: positions of snvs, a slice or an array, default all.
+        :param samples: optional positions of samples to be taken.
+        """
+        rows = self.bed if snps is None else self.bed[snps]
+        if samples is None:
+            dosage = BYTE_DOSAGE[rows].reshape(rows.shape[0], -1)[:, :len(self.samples)]
+        else:
+            samples = np.asarray(samples)
+            dosage = CODE_DOSAGE[(rows[:, samples // 4] >> (2 * (samples % 4))) & 3]
+        return dosage.T
+
+    def iter_dosage(self, nsnps, samples=None):
+        """Yield (slice, dosage) of consecutive blocks of `nsnps` snvs."""
+        for start in range(0, len(self.snps), nsnps):
+            block = slice(start, min(start + nsnps, len(self.snps)))
+            yield block, self.dosage(block, samples)
+
+    def calls(self, snps, sep=' ', missing='0 0', samples=None):
+        """Render genotype calls of snvs into strings, e.g. 'A G'.
+
+        :param snps: positions of snvs.
+        """
+        snps = np.asarray(snps)
+        lookup = np.empty((len(snps), 4), dtype=object)
+        for n, pos in enumerate(snps):
+            a1, a2 = self.bim[pos][4:6]
+            lookup[n] = [a2 + sep + a2, a1 + sep + a2, a1 + sep + a1, missing]
+        dosage = self.dosage(snps, samples)
+        return lookup[np.arange(len(snps)), dosage]
@@ -0,0 +1,288 @@
+"""
+    cache module
+    ~~~~~~~~~~~~
+
+    Implements content addressed cache of parsed input tables and of outputs
+    of external tools.
+"""
+
+import os
+import glob
+import json
+import pickle
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+from .utils import dir_check, file_digest
+from .genotype import GenoMatrix
+
+
+# version of the table of each kind, bumped when the way it is built changes
+# so that entries of an older build are not loaded.
+VERSIONS = {'geno': 1, 'info': 2, 'snpindex': 2, 'refgene': 1, 'g1000': 1}
+# kinds no longer cached, their entries are removed.
+RETIRED = ('snp',)
+
+
+class TableCache:
+    """Keep parsed GENOFILE, INFOFILE and SNPFILE under ROUTINE/tmp/cache,
+    each entry keyed on the content hash of its input file. Only the latest
+    entry of a kind is kept.
+
+    Encoded genotypes are saved as a npy file and loaded memory-mapped, other
+    tables are small and pickled. Keys carry the version of each kind in
+    `VERSIONS`.
+
+    :param cachedir: directory of the cache.
+    """
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+        dir_check(self.cachedir)
+        self.digest_file = os.path.join(self.cachedir, 'digests.json')
+        # stages hash files from their own threads.
+        self.lock = threading.Lock()
+        try:
+            with open(self.digest_file, 'rt') as fh:
+                self.digests = json.load(fh)
+        except (IOError, ValueError):
+            self.digests = {}
+        for kind in RETIRED:
+            self.purge(kind, None)
+
+    def digest(self, filename):
+        """Content hash of a file. Hashes are remembered by path, size and
+        mtime, so an untouched file is not read again."""
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        record = self.digests.get(filename)
+        if record is not None and record[0] == stamp:
+            return record[1]
+        digest = file_digest(filename)
+        with self.lock:
+            self.digests[filename] = [stamp, digest]
+            with open(self.digest_file + '.part', 'wt') as fh:
+                json.dump(self.digests, fh)
+            os.replace(self.digest_file + '.part', self.digest_file)
+        return digest
+
+    def entry(self, kind, filename):
+        return os.path.join(self.cachedir, '%s-v%d-%s' % (
+            kind, VERSIONS.get(kind, 0), self.digest(filename)))
+
+    def purge(self, kind, keep):
+        for path in glob.glob(os.path.join(self.cachedir, '%s-*' % kind)):
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def fetch(self, kind, filename, build):
+        """Load a pickled table of `filename`, or build and save it.
+
+        :param kind: name of the table, e.g. 'info'.
+        :param build: a callable producing the table on cache miss.
+        """
+        entry = self.entry(kind, filename)
+        target = os.path.join(entry, 'table.pkl')
+        if os.path.isfile(target):
+            with open(target, 'rb') as fh:
+                return pickle.load(fh)
+        table = build()
+        dir_check(entry)
+        with open(target + '.part', 'wb') as fh:
+            pickle.dump(table, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(target + '.part', target)
+        self.purge(kind, entry)
+        return table
+
+    def fetch_arrays(self, kind, filename, build):
+        """Load a dict of arrays of `filename` saved as npz, or build and
+        save it.
+
+        :param kind: name of the arrays, e.g. 'refgene'.
+        :param build: a callable producing the dict of arrays on cache miss.
+        """
+        entry = self.entry(kind, filename)
+        target = os.path.join(entry, 'arrays.npz')
+        if os.path.isfile(target):
+            with np.load(target) as data:
+                return dict((key, data[key]) for key in data.files)
+        arrays = build()
+        dir_check(entry)
+        with open(target + '.part', 'wb') as fh:
+            np.savez(fh, **arrays)
+        os.replace(target + '.part', target)
+        self.purge(kind, entry)
+        return arrays
+
+    def fetch_genotypes(self, filename, build):
+        """Load memory-mapped `GenoMatrix` of `filename`, or build and save it.
+
+        :param build: a callable producing the `GenoMatrix` on cache miss.
+        """
+        entry = self.entry('geno', filename)
+        codes_file = os.path.join(entry, 'codes.npy')
+        meta_file = os.path.join(entry, 'meta.json')
+        if os.path.isfile(meta_file):
+            with open(meta_file, 'rt') as fh:
+                meta = json.load(fh)
+            codes = np.load(codes_file, mmap_mode='r')
+            alleles = [tuple(a) for a in meta['alleles']]
+            return GenoMatrix(meta['samples'], meta['snps'], codes, alleles)
+
+        genotypes = build()
+        dir_check(entry)
+        codes = genotypes.codes
+        if isinstance(codes, np.memmap) and codes.filename:
+            # already on disk as npy, see `GenoReader.allocate`.
+            codes.flush()
+            os.replace(codes.filename, codes_file)
+        else:
+            np.save(codes_file, codes)
+        meta = dict(samples=list(map(str, genotypes.samples)),
+                    snps=list(map(str, genotypes.snps)),
+                    alleles=[list(a) for a in genotypes.alleles])
+        with open(meta_file + '.part', 'wt') as fh:
+            json.dump(meta, fh)
+        os.replace(meta_file + '.part', meta_file)
+        self.purge('geno', entry)
+        return GenoMatrix(meta['samples'], meta['snps'], np.load(codes_file, mmap_mode='r'),
+                          genotypes.alleles)
+
+
+class ArtifactManifest:
+    """Fingerprints of the inputs that each output under ROUTINE/tmp was
+    built from, so that an output is rebuilt only when its inputs change.
+    Fingerprints are recorded by absolute path of the output.
+
+    :param filename: json file of the manifest.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            with open(self.filename, 'rt') as fh:
+                self.records = json.load(fh)
+        except (IOError, ValueError):
+            self.records = {}
+
+    @staticmethod
+    def fingerprint(*parts):
+        """sha1 of input digests, config values or content of an output."""
+        sha = hashlib.sha1()
+        sha.update(json.dumps([str(p) for p in parts]).encode('utf-8'))
+        return sha.hexdigest()
+
+    def get(self, target):
+        return self.records.get(os.path.abspath(target), None)
+
+    def fresh(self, target, fingerprint):
+        """Whether `target` exists and was built from the same inputs."""
+        return os.path.isfile(target) and self.get(target) == fingerprint
+
+    def record(self, target, fingerprint):
+        self.records[os.path.abspath(target)] = fingerprint
+        with open(self.filename + '.part', 'wt') as fh:
+            json.dump(self.records, fh)
+        os.replace(self.filename + '.part', self.filename)
+
+
+class RunCache:
+    """Outputs of external tool runs, e.g. plink, keyed on the command and
+    the content of its input files. Output files are stored once by their
+    content hash under `cachedir`/objects, and restored on a later run of
+    the same command on the same inputs instead of running it again.
+
+    :param cachedir: directory of the cache.
+    :param digest: a callable giving the content hash of a file, e.g.
+                   `TableCache.digest`.
+    """
+    def __init__(self, cachedir, digest=file_digest):
+        self.cachedir = cachedir
+        self.objects = os.path.join(cachedir, 'objects')
+        self.entries = os.path.join(cachedir, 'entries')
+        dir_check(self.objects)
+        dir_check(self.entries)
+        self.digest = digest
+
+    def key(self, commands, inputs):
+        """sha1 of the command and content hashes of its input files, a
+        missing input makes the run uncacheable and gives None."""
+        parts = [list(map(str, commands))]
+        for filename in inputs:
+            if not os.path.isfile(filename):
+                return None
+            parts.append([os.path.abspath(filename), self.digest(filename)])
+        return ArtifactManifest.fingerprint(*parts)
+
+    @staticmethod
+    def snapshot(patterns):
+        """Size and mtime of the files matching glob `patterns`."""
+        stamps = {}
+        for pattern in patterns:
+            for filename in glob.glob(pattern):
+                if os.path.isfile(filename):
+                    stat = os.stat(filename)
+                    stamps[os.path.abspath(filename)] = (stat.st_size, stat.st_mtime_ns)
+        return stamps
+
+    def restore(self, key):
+        """Put back the outputs of a cached run, False if there is none."""
+        entry = os.path.join(self.entries, key + '.json')
+        try:
+            with open(entry, 'rt') as fh:
+                outputs = json.load(fh)
+        except (IOError, ValueError):
+            return False
+        blobs = [os.path.join(self.objects, digest) for digest in outputs.values()]
+        if not all(os.path.isfile(blob) for blob in blobs):
+            return False
+        for filename, blob in zip(outputs, blobs):
+            dir_check(os.path.dirname(filename))
+            shutil.copyfile(blob, filename + '.part')
+            os.replace(filename + '.part', filename)
+        return True
+
+    def store(self, key, patterns, before):
+        """Save files matching `patterns` that are new or changed since the
+        `before` snapshot as outputs of the run of `key`."""
+        outputs = {}
+        for filename, stamp in self.snapshot(patterns).items():
+            if before.get(filename) == stamp:
+                continue
+            digest = file_digest(filename)
+            blob = os.path.join(self.objects, digest)
+            if not os.path.isfile(blob):
+                # concurrent jobs may store the same content, each through
+                # its own temporary file.
+                fd, part = tempfile.mkstemp(dir=self.objects, suffix='.part')
+                os.close(fd)
+                shutil.copyfile(filename, part)
+                os.replace(part, blob)
+            outputs[filename] = digest
+        entry = os.path.join(self.entries, key + '.json')
+        with open(entry + '.part', 'wt') as fh:
+            json.dump(outputs, fh)
+        os.replace(entry + '.part', entry)
+
+    def prepare(self, commands, inputs, outputs):
+        """Restore outputs of `commands` if it was run on the same inputs and
+        return None, otherwise return what `keep` needs after the run.
+
+        :param inputs: files the command reads.
+        :param outputs: glob patterns of files the command writes.
+        """
+        key = self.key(commands, inputs)
+        if key is not None and self.restore(key):
+            print('[NOTE] %s outputs restored from cache: %s' % (
+                os.path.basename(str(commands[0])), ', '.join(outputs)))
+            return None
+        return key, self.snapshot(outputs)
+
+    def keep(self, pending, outputs, returncode):
+        """Keep outputs of a run prepared by `prepare` if it succeeded."""
+        key, before = pending
+        if key is not None and returncode == 0:
+            self.store(key, outputs, before)
@@ -0,0 +1,111 @@
+"""
+    checkpoint module
+    ~~~~~~~~~~~~~~~~~
+
+    Implements resumable batch runs by a manifest of completed stages.
+"""
+
+import os
+import glob
+import json
+import traceback
+from collections import OrderedDict
+
+from .cache import ArtifactManifest
+
+
+# outputs of each stage of a batch run, glob patterns relative to ROUTINE.
+STAGE_OUTPUTS = {
+        'format': ['tmp/bsample.bed', 'tmp/bsample.bim', 'tmp/bsample.fam',
+                   'tmp/covar.txt', 'tmp/pheno.txt'],
+        'assoc': ['result/hwe/**', 'result/chi-test/**', 'result/fisher-test/**',
+                  'result/logistic-test/**', 'result/permutation/**'],
+        'report': ['report/Report.xlsx', 'report/HWE.xlsx', 'report/ChiSquare.xlsx',
+                   'report/Fisher-test.xlsx', 'report/Logistic*.xlsx',
+                   'report/PhenoLogistic*.xlsx', 'report/Raw_data/bsample.*'],
+        'mdr': ['result/mdr/**', 'report/mdr_result.xlsx'],
+        'hap': ['result/haplotype/**', 'report/haploview/**', 'report/LD_block.xlsx',
+                'report/haplotype*.xlsx', 'report/Raw_data/*.ped', 'report/Raw_data/*.info'],
+        }
+
+# config keys not affecting results.
+VOLATILE_KEYS = ('JOBS',)
+
+
+class StageManifest:
+    """Status of the stages of a batch run, kept in ROUTINE/tmp/stages.json.
+
+    A stage is recorded with the key of what it was run on, i.e. the config
+    and outputs of the stages it depends on, and the fingerprints of its own
+    outputs. On resume a stage is skipped if it completed with the same key
+    and its outputs are unchanged, so failed, interrupted or invalidated
+    stages, and the stages depending on them, are run again.
+
+    :param assoc_inst: an `AssocStudy` instance, formatted by `Formater`.
+    :param resume: skip stages completed in a previous run.
+    """
+    def __init__(self, assoc_inst, resume=False):
+        self.config = assoc_inst.config
+        self.root = self.config.get('ROUTINE')
+        self.filename = os.path.join(self.root, 'tmp/stages.json')
+        self.resume = resume
+        self.digest = assoc_inst.cache.digest
+        try:
+            with open(self.filename, 'rt') as fh:
+                self.records = json.load(fh)
+        except (IOError, ValueError):
+            self.records = {}
+
+    def outputs(self, name):
+        """Content hashes of the current outputs of a stage by path."""
+        prints = OrderedDict()
+        for pattern in STAGE_OUTPUTS.get(name, ()):
+            for filename in sorted(glob.glob(os.path.join(self.root, pattern), recursive=True)):
+                if os.path.isfile(filename):
+                    prints[os.path.relpath(filename, self.root)] = self.digest(filename)
+        return prints
+
+    def key(self, after=(), inputs=()):
+        """Fingerprint of the config, outputs of stages `after` and content
+        of extra `inputs` files."""
+        config = sorted((k, str(v)) for k, v in self.config.items()
+                        if k.isupper() and k not in VOLATILE_KEYS)
+        parts = [config]
+        for name in ('format',) + tuple(after):
+            parts.append([name, list(self.outputs(name).items())])
+        for filename in inputs:
+            if filename and os.path.isfile(filename):
+                parts.append([filename, self.digest(filename)])
+        return ArtifactManifest.fingerprint(*parts)
+
+    def completed(self, name, key):
+        record = self.records.get(name)
+        return (record is not None and record['status'] == 'done' and
+                record['key'] == key and record['outputs'] == self.outputs(name))
+
+    def record(self, name, **fields):
+        self.records[name] = fields
+        with open(self.filename + '.part', 'wt') as fh:
+            json.dump(self.records, fh, indent=1)
+        os.replace(self.filename + '.part', self.filename)
+
+    def run(self, name, func, after=(), inputs=()):
+        """Run a stage unless it is completed and `resume` is set.
+
+        :param name: name of the stage, one of `STAGE_OUTPUTS`.
+        :param func: a callable without arguments.
+        :param after: names of stages whose outputs the stage reads.
+        :param inputs: extra files the stage reads.
+        """
+        key = self.key(after, inputs)
+        if self.resume and self.completed(name, key):
+            print('[NOTE] stage %s completed in a previous run, skipped.' % name)
+            return
+        self.record(name, status='running', key=key, outputs={})
+        try:
+            func()
+        except BaseException as e:
+            self.record(name, status='failed', key=key, outputs={},
+                        error=''.join(traceback.format_exception_only(type(e), e)).strip())
+            raise
+        self.record(name, status='done', key=key, outputs=self.outputs(name))
@@ -0,0 +1,133 @@
+"""
+    chunks module
+    ~~~~~~~~~~~~~
+
+    Implements plink runs split into chunks of consecutive snvs by --extract
+    lists, and merging of the outputs of the chunks into those of one run.
+"""
+
+import os
+import glob
+
+import numpy as np
+
+from .utils import dir_check, to_float
+from .multitest import Adjustment, genomic_control
+from .contingency import plink_format
+
+
+# outputs of plink merged as text, and outputs the same for all chunks.
+LOGS = ('.log', '.job.log')
+SHARED = ('.nosex',)
+ADJUSTED_HEADER = ('CHR', 'SNP', 'UNADJ', 'GC', 'BONF', 'HOLM', 'SIDAK_SS',
+                   'SIDAK_SD', 'FDR_BH', 'FDR_BY')
+
+
+class SnvChunks:
+    """Snvs of a bim split into `n` chunks of consecutive snvs, each listed
+    in a file under `workdir` for plink --extract. Outputs of a chunked run
+    named `outname` are kept under `outname`'s directory in chunks/.
+
+    :param bimfile: bim of the fileset run by plink.
+    :param n: number of chunks, no more than the snvs.
+    :param workdir: directory of the --extract lists.
+    """
+    def __init__(self, bimfile, n, workdir):
+        with open(bimfile, 'rt') as fh:
+            snps = [line.split()[1] for line in fh if line.strip()]
+        dir_check(workdir)
+        self.lists = []
+        for i, part in enumerate(np.array_split(snps, min(int(n), len(snps)))):
+            listfile = os.path.join(workdir, 'chunk%d.snps' % i)
+            text = ''.join(snp + '\n' for snp in part)
+            if not os.path.isfile(listfile) or open(listfile, 'rt').read() != text:
+                with open(listfile, 'wt') as fh:
+                    fh.write(text)
+            self.lists.append(listfile)
+
+    def __len__(self):
+        return len(self.lists)
+
+    @staticmethod
+    def prefixes(outname, n):
+        chunkdir = os.path.join(os.path.dirname(outname), 'chunks')
+        dir_check(chunkdir)
+        return [os.path.join(chunkdir, '%s.chunk%d' % (os.path.basename(outname), i))
+                for i in range(n)]
+
+    def parts(self, outname):
+        """Pairs of --extract list and output prefix of each chunk."""
+        return list(zip(self.lists, self.prefixes(outname, len(self))))
+
+    def merge(self, outname):
+        """Merge outputs of the chunks of `outname` by their suffixes, e.g.
+        '.assoc.logistic', into files of `outname`. Tables are concatenated
+        in the order of snvs, and .adjusted files are computed again over
+        the tests of all chunks."""
+        prefixes = self.prefixes(outname, len(self))
+        suffixes = []
+        for filename in sorted(glob.glob(glob.escape(prefixes[0]) + '.*')):
+            suffixes.append(filename[len(prefixes[0]):])
+        notes = []
+        for suffix in suffixes:
+            filenames = [prefix + suffix for prefix in prefixes if os.path.isfile(prefix + suffix)]
+            target = outname + suffix
+            if suffix.endswith('.adjusted'):
+                notes.append('Genomic inflation est. lambda (based on median chisq) = %s, of %s.' % (
+                    plink_format(merge_adjusted(filenames, target)), os.path.basename(target)))
+            elif suffix in LOGS:
+                merge_logs(filenames, target)
+            elif suffix in SHARED:
+                merge_tables(filenames[:1], target)
+            else:
+                merge_tables(filenames, target)
+        if notes:
+            with open(outname + '.log', 'at') as fh:
+                fh.write('\n'.join(['', 'After merging %d chunks:' % len(self)] + notes) + '\n')
+
+
+def merge_tables(filenames, target):
+    """Concatenate tables with the header of the first one."""
+    with open(target + '.part', 'wt') as out:
+        for n, filename in enumerate(filenames):
+            with open(filename, 'rt') as fh:
+                for i, line in enumerate(fh):
+                    if i == 0 and n > 0:
+                        continue
+                    out.write(line)
+    os.replace(target + '.part', target)
+
+def merge_logs(filenames, target):
+    with open(target + '.part', 'wt') as out:
+        for filename in filenames:
+            out.write('### %s\n' % os.path.basename(filename))
+            with open(filename, 'rt') as fh:
+                out.write(fh.read())
+    os.replace(target + '.part', target)
+
+def merge_adjusted(filenames, target):
+    """Write a plink .adjusted file over unadjusted p-values of all chunks,
+    sorted by them as plink does, returns the inflation factor."""
+    rows = []
+    for filename in filenames:
+        with open(filename, 'rt') as fh:
+            next(fh, None)
+            for line in fh:
+                arr = line.split()
+                if len(arr) > 2 and not np.isnan(to_float(arr[2])):
+                    rows.append((arr[0], arr[1], to_float(arr[2])))
+    rows.sort(key=lambda row: row[2])
+    p = np.array([row[2] for row in rows], dtype=float)
+    adjustment = Adjustment(p)
+    lambda_, gc = genomic_control(p)
+    columns = [p, gc, adjustment.bonferroni(), adjustment.holm(), adjustment.sidak_ss(),
+               adjustment.sidak_sd(), adjustment.bh(), adjustment.by()]
+    width = max([len(row[1]) for row in rows] + [4])
+    with open(target + '.part', 'wt') as fh:
+        fh.write('%4s %*s ' % (ADJUSTED_HEADER[0], width, ADJUSTED_HEADER[1]) +
+                 ' '.join('%10s' % name for name in ADJUSTED_HEADER[2:]) + '\n')
+        for n, (chrom, snp, _) in enumerate(rows):
+            fh.write('%4s %*s ' % (chrom, width, snp) +
+                     ' '.join('%10s' % plink_format(column[n]) for column in columns) + '\n')
+    os.replace(target + '.part', target)
+    return lambda_
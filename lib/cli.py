@@ -10,6 +10,7 @@ import argparse
 
 from . import AssocStudy, Formater, MdrOperate, hap_analysis, reporter, PhenoIndepTest,\
         Stratify, LRanalysis, Chi_test
+from .checkpoint import StageManifest
 
 
 AP = argparse.ArgumentParser(
@@ -21,6 +22,11 @@ AP_subparsers = AP.add_subparsers(
         help="Sub-commands (use with -h for more info)"
         )
 
+def set_jobs(curr_case, args):
+    """`--jobs` takes precedence over `JOBS` of config file."""
+    if getattr(args, 'jobs', None):
+        curr_case.config['JOBS'] = args.jobs
+
 ##########################################################################
 ### Batch
 ##########################################################################
@@ -34,22 +40,29 @@ def _batch_command(args):
         - association of phenotype and genotype
         - mdr anasysis for gene X gene interaction
         - haplotype analysis.
+    Status of the stages is kept in ROUTINE/tmp/stages.json, with `--resume`
+    stages completed in a previous run on the same inputs are skipped.
     Usage:
-        ASkit.py batch -cfg config.ini
+        ASkit.py batch -cfg config.ini [--jobs 8] [--resume]
     """
     curr_case = AssocStudy(args.cfg)
+    set_jobs(curr_case, args)
     formater = Formater(curr_case)
     formater.make_bed()
-    curr_case.batch_run()
-    reporter(curr_case)
 
-    mdr = MdrOperate(curr_case)
-    mdr.go()
-    hap_analysis(curr_case)
+    stages = StageManifest(curr_case, resume=args.resume)
+    stages.run('assoc', curr_case.batch_run)
+    stages.run('report', lambda: reporter(curr_case), after=['assoc'])
+    stages.run('mdr', lambda: MdrOperate(curr_case).go())
+    stages.run('hap', lambda: hap_analysis(curr_case),
+               inputs=[curr_case.config.get('RAW_HAP', None)])
 
 
 P_batch = AP_subparsers.add_parser('batch', help=_batch_command.__doc__)
 P_batch.add_argument('-cfg', metavar='config file', required=True)
+P_batch.add_argument('--jobs', metavar='processes run at a time', type=int, default=None)
+P_batch.add_argument('--resume', action='store_true',
+                     help='skip stages completed in a previous run')
 P_batch.set_defaults(func=_batch_command)
 
 
@@ -62,9 +75,10 @@ def _plink_stage(args):
         - hwe analysis
         - plink association analysis
     Usage:
-        ASkit.py plink -cfg config.ini
+        ASkit.py plink -cfg config.ini [--jobs 8]
     """
     curr_case = AssocStudy(args.cfg)
+    set_jobs(curr_case, args)
     formater = Formater(curr_case)
     formater.make_bed()
     curr_case.batch_run()
@@ -72,6 +86,7 @@ def _plink_stage(args):
 
 P_plink = AP_subparsers.add_parser('plink', help=_plink_stage.__doc__)
 P_plink.add_argument('-cfg', metavar='config file',required=True)
+P_plink.add_argument('--jobs', metavar='processes run at a time', type=int, default=None)
 P_plink.set_defaults(func=_plink_stage)
 
 ##########################################################################
@@ -103,8 +118,8 @@ def _mdr_stage(args):
     formater = Formater(curr_case)
     formater.make_bed()
 
-    MdrOperate(curr_case)
-    MdrOperate.go()
+    mdr = MdrOperate(curr_case)
+    mdr.go()
 
 P_mdr = AP_subparsers.add_parser('mdr', help=_mdr_stage.__doc__)
 P_mdr.add_argument('-cfg', metavar='config file',required=True)
@@ -0,0 +1,335 @@
+"""
+    contingency module
+    ~~~~~~~~~~~~~~~~~~
+
+    Implements vectorized case/control association tests of all snvs from
+    genotype count tables.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from scipy.special import gammaln
+from scipy.stats import chi2, norm
+
+from .bedfile import BedReader
+
+
+GROUPS = ('ALL', 'AFF', 'UNAFF')
+# tests in the order of plink --model, ALLELIC is also that of plink --assoc.
+TESTS = ('GENO', 'TREND', 'ALLELIC', 'DOM', 'REC')
+DEGREES = {'GENO': 2, 'TREND': 1, 'ALLELIC': 1, 'DOM': 1, 'REC': 1}
+
+
+class GenoCounts:
+    """Genotype counts of each snv in ALL, AFF and UNAFF samples, each an
+    int64 array shaped (snps, 3) of A1A1, A1A2 and A2A2 counts, i.e. the
+    11/12/22 order of plink, A1 being the minor allele.
+
+    :param snps: snv names.
+    :param chrs: chromosome of each snv.
+    :param minor: minor allele (A1) of each snv.
+    :param major: major allele (A2) of each snv.
+    :param counts: a dict of count arrays by group.
+    :param sizes: optional number of samples of each group, missing calls
+                  included.
+    """
+    def __init__(self, snps, chrs, minor, major, counts, sizes=None):
+        self.snps = np.asarray(snps, dtype=object)
+        self.chrs = np.asarray(chrs, dtype=object)
+        self.minor = np.asarray(minor, dtype=object)
+        self.major = np.asarray(major, dtype=object)
+        self.counts = counts
+        self.sizes = sizes
+
+    @classmethod
+    def from_bed(cls, prefix, memory=None):
+        """Count genotypes from a bed in one pass, block by block of snvs.
+
+        :param prefix: path of the bed fileset without extension.
+        :param memory: optional memory ceiling in MB for a block.
+        """
+        bed = BedReader(prefix)
+        nsamples, nsnps = bed.shape
+        pheno = bed.pheno()
+        masks = OrderedDict([('ALL', np.ones(nsamples, dtype=bool)),
+                             ('AFF', pheno == 2), ('UNAFF', pheno == 1)])
+        counts = dict((g, np.zeros((nsnps, 3), dtype=np.int64)) for g in GROUPS)
+        # a block is decoded into int8 dosage and three boolean copies.
+        block = max(int(memory or 256) * 2 ** 20 // (4 * max(nsamples, 1)), 1)
+        for snps, dosage in bed.iter_dosage(block):
+            for k, d in enumerate((2, 1, 0)):
+                hit = dosage == d
+                for group, mask in masks.items():
+                    counts[group][snps, k] = hit[mask].sum(axis=0)
+        minor, major = bed.minor_major()
+        sizes = dict((group, int(mask.sum())) for group, mask in masks.items())
+        return cls(bed.snps, [r[0] for r in bed.bim], minor, major, counts, sizes)
+
+    def tables(self):
+        """Case/control contingency tables of each test, shaped (snps, 2, k),
+        the first row being AFF."""
+        aff, unaff = self.counts['AFF'], self.counts['UNAFF']
+        geno = np.stack([aff, unaff], axis=1)
+        allele = np.stack([geno[:, :, 0] * 2 + geno[:, :, 1],
+                           geno[:, :, 2] * 2 + geno[:, :, 1]], axis=2)
+        dom = np.stack([geno[:, :, 0] + geno[:, :, 1], geno[:, :, 2]], axis=2)
+        rec = np.stack([geno[:, :, 0], geno[:, :, 1] + geno[:, :, 2]], axis=2)
+        return OrderedDict([('GENO', geno), ('TREND', allele), ('ALLELIC', allele),
+                            ('DOM', dom), ('REC', rec)])
+
+
+def pearson(tables):
+    """Pearson chi-square of each (2, k) table, NaN if any expected count
+    is zero."""
+    tables = tables.astype(float)
+    total = tables.sum(axis=(1, 2))[:, None, None]
+    expected = tables.sum(axis=2, keepdims=True) * tables.sum(axis=1, keepdims=True) / total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stat = ((tables - expected) ** 2 / expected).sum(axis=(1, 2))
+    stat[~np.isfinite(stat)] = np.nan
+    return stat
+
+def armitage(geno):
+    """Cochran-Armitage trend chi-square of (2, 3) genotype tables, scored
+    by the count of A1 allele."""
+    geno = geno.astype(float)
+    score = np.array([2., 1., 0.])
+    aff, unaff = geno[:, 0], geno[:, 1]
+    R, S = aff.sum(axis=1), unaff.sum(axis=1)
+    N = R + S
+    n = aff + unaff
+    with np.errstate(divide='ignore', invalid='ignore'):
+        T = (score * (aff * S[:, None] - unaff * R[:, None])).sum(axis=1)
+        V = R * S / N * (N * (score ** 2 * n).sum(axis=1) - (score * n).sum(axis=1) ** 2)
+        stat = T ** 2 / V
+    stat[~np.isfinite(stat)] = np.nan
+    return stat
+
+def odds_ratio(tables, ci=0.95):
+    """Odds ratio of A1 in cases over controls and its Woolf confidence
+    interval, of each 2X2 table."""
+    a, b = tables[:, 0, 0].astype(float), tables[:, 0, 1].astype(float)
+    c, d = tables[:, 1, 0].astype(float), tables[:, 1, 1].astype(float)
+    z = norm.ppf(0.5 + ci / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        OR = a * d / (b * c)
+        se = np.sqrt(1 / a + 1 / b + 1 / c + 1 / d)
+        L95 = np.exp(np.log(OR) - z * se)
+        U95 = np.exp(np.log(OR) + z * se)
+    for arr in (OR, L95, U95):
+        arr[~np.isfinite(arr) | (arr == 0)] = np.nan
+    return OR, L95, U95
+
+def log_factorials(n):
+    """Lookup table of log(k!) for k from 0 to `n`."""
+    return gammaln(np.arange(n + 1) + 1.0)
+
+def fisher_exact(tables, logfact=None, cells=2 ** 22):
+    """Two-sided Fisher exact p-values of (2, 2) or (2, 3) tables, tables
+    as likely as the observed one or less are summed up, like plink does.
+
+    Tables of the same margins are enumerated at once for a block of
+    tables, padded to the widest one. For (2, 3) tables, values of a cell
+    whose marginal probability is below 1e-20 of the observed table are
+    left out, as any table of them is that unlikely.
+
+    :param tables: int array shaped (snps, 2, 2) or (snps, 2, 3).
+    :param logfact: optional `log_factorials` covering the table totals.
+    :param cells: number of enumerated tables held at a time.
+    """
+    tables = np.asarray(tables, dtype=np.int64)
+    k = tables.shape[2]
+    if tables.shape[1] != 2 or k not in (2, 3):
+        raise Exception('Fisher exact test supports only 2X2 and 2X3 tables.')
+    total = tables.sum(axis=(1, 2))
+    if logfact is None:
+        logfact = log_factorials(int(total.max()) if len(total) else 0)
+    p = np.full(len(tables), np.nan)
+    ok = np.flatnonzero(total > 0)
+    if not ok.size:
+        return p
+    if k == 2:
+        p[ok] = _fisher_2x2(tables[ok], logfact, cells)
+    else:
+        p[ok] = _fisher_2x3(tables[ok], logfact, cells)
+    return p
+
+def _hypergeom_log(x, row, col, n, lf):
+    """Log probability of `x` counts in the first row and a column."""
+    return (lf[row] + lf[n - row] + lf[col] + lf[n - col] - lf[n]
+            - lf[x] - lf[row - x] - lf[col - x] - lf[n - row - col + x])
+
+def _blocks(widths, cells, most=1024):
+    """Split snvs ordered by the size of their enumeration into blocks of
+    at most `most` snvs and about `cells` padded tables."""
+    order = np.argsort(widths, kind='mergesort')
+    start = 0
+    while start < len(order):
+        widest = int(widths[order[min(start + most, len(order)) - 1]])
+        size = min(max(cells // max(widest, 1), 1), most)
+        yield order[start:start + size]
+        start += size
+
+def _fisher_2x2(tables, lf, cells):
+    row = tables[:, 0].sum(axis=1)
+    col = tables[:, :, 0].sum(axis=1)
+    n = tables.sum(axis=(1, 2))
+    lo = np.maximum(0, row + col - n)
+    hi = np.minimum(row, col)
+    observed = _hypergeom_log(tables[:, 0, 0], row, col, n, lf)
+    p = np.empty(len(tables))
+    for block in _blocks(hi - lo + 1, cells):
+        x = lo[block, None] + np.arange((hi[block] - lo[block]).max() + 1)
+        valid = x <= hi[block, None]
+        x = np.minimum(x, hi[block, None])
+        logp = _hypergeom_log(x, row[block, None], col[block, None], n[block, None], lf)
+        p[block] = _tail(logp, valid, observed[block])
+    return p
+
+def _fisher_2x3(tables, lf, cells):
+    row = tables[:, 0].sum(axis=1)
+    n = tables.sum(axis=(1, 2))
+    observed = (lf[row] + lf[n - row] + lf[tables.sum(axis=1)].sum(axis=1) - lf[n]
+                - lf[tables].sum(axis=(1, 2)))
+    # most snvs are far from significant, the p-value of which is 1 less
+    # the few tables more likely than the observed one, near the mode.
+    p = np.empty(len(tables))
+    for block, logp, valid in _tables_2x3(tables, lf, observed, cells):
+        more = valid & (logp > observed[block, None] + 1e-7)
+        p[block] = 1 - np.where(more, np.exp(logp), 0).sum(axis=1)
+    small = np.flatnonzero(p < 1e-6)
+    if small.size:
+        for block, logp, valid in _tables_2x3(tables[small], lf, observed[small] + np.log(1e-20), cells):
+            p[small[block]] = _tail(logp, valid, observed[small][block])
+    return np.maximum(p, 0)
+
+def _tables_2x3(tables, lf, floor, cells):
+    """Yield (block, logp, valid) of (2, 3) tables of the same margins as
+    a block of `tables`, each flattened into a row. The first two cells of
+    row one are enumerated only through values of marginal probability
+    not below `floor`, as no table of other values is."""
+    row = tables[:, 0].sum(axis=1)
+    cols = tables.sum(axis=1)
+    n = tables.sum(axis=(1, 2))
+    ranges = []
+    for j in (0, 1):
+        lo = np.maximum(0, row + cols[:, j] - n)
+        hi = np.minimum(row, cols[:, j])
+        x = np.minimum(lo[:, None] + np.arange((hi - lo).max() + 1), hi[:, None])
+        keep = _hypergeom_log(x, row[:, None], cols[:, j, None], n[:, None], lf) >= floor[:, None] - 1e-7
+        keep[:, 0] |= ~keep.any(axis=1)
+        first = keep.argmax(axis=1)
+        last = keep.shape[1] - 1 - keep[:, ::-1].argmax(axis=1)
+        ranges.append((lo + first, lo + last))
+    (lo1, hi1), (lo2, hi2) = ranges
+    w1, w2 = hi1 - lo1 + 1, hi2 - lo2 + 1
+    const = lf[row] + lf[n - row] + lf[cols].sum(axis=1) - lf[n]
+    for block in _blocks(w1 * w2, cells):
+        c = cols[block, None, None, :]
+        i1 = np.arange(w1[block].max())[:, None]
+        i2 = np.arange(w2[block].max())
+        x1 = np.minimum(lo1[block, None, None] + i1, hi1[block, None, None])
+        x2 = np.minimum(lo2[block, None, None] + i2, hi2[block, None, None])
+        x3 = row[block, None, None] - x1 - x2
+        valid = ((i1 < w1[block, None, None]) & (i2 < w2[block, None, None])
+                 & (x3 >= 0) & (x3 <= c[..., 2]))
+        x3 = np.minimum(np.maximum(x3, 0), c[..., 2])
+        logp = (const[block, None, None] - lf[x1] - lf[c[..., 0] - x1] - lf[x2] - lf[c[..., 1] - x2]
+                - lf[x3] - lf[c[..., 2] - x3])
+        size = len(block)
+        yield block, logp.reshape(size, -1), valid.reshape(size, -1)
+
+def _tail(logp, valid, observed):
+    """Sum of probabilities not above the observed one, scaled by it."""
+    hit = valid & (logp <= observed[:, None] + 1e-7)
+    with np.errstate(under='ignore'):
+        scaled = np.where(hit, np.exp(np.minimum(logp - observed[:, None], 0)), 0).sum(axis=1)
+        return np.minimum(np.exp(observed) * scaled, 1.0)
+
+
+class ChiSquareTest:
+    """Allelic, genotypic, dominant, recessive and trend chi-square tests of
+    all snvs at once, what plink --assoc and --model --cell 0 give.
+
+    :param counts: a `GenoCounts` instance.
+    """
+    def __init__(self, counts):
+        self.counts = counts
+
+    def run(self):
+        """Statistics as arrays keyed like 'GENO_CHISQ' and 'GENO_P', with
+        'OR', 'L95' and 'U95' of the allelic test."""
+        result = OrderedDict()
+        tables = self.counts.tables()
+        for test in TESTS:
+            if test == 'TREND':
+                stat = armitage(tables['GENO'])
+            else:
+                stat = pearson(tables[test])
+            result[test + '_CHISQ'] = stat
+            result[test + '_P'] = chi2.sf(stat, DEGREES[test])
+        result['OR'], result['L95'], result['U95'] = odds_ratio(tables['ALLELIC'])
+        return result
+
+    def save(self, filename):
+        return save_result(filename, self.counts, self.run())
+
+
+class FisherTest:
+    """Fisher exact tests of genotype, allele, dominant and recessive
+    tables of all snvs at once, what plink --assoc fisher and --model
+    fisher give. OR of the allele table is the same as `ChiSquareTest`.
+
+    :param counts: a `GenoCounts` instance.
+    """
+    def __init__(self, counts):
+        self.counts = counts
+
+    def run(self):
+        """P-values keyed like 'GENO_P', with 'OR', 'L95' and 'U95' of the
+        allelic test."""
+        result = OrderedDict()
+        tables = self.counts.tables()
+        # allele counts are the largest totals of the tables.
+        logfact = log_factorials(int(tables['ALLELIC'].sum(axis=(1, 2)).max()))
+        for test in TESTS:
+            if test == 'TREND':
+                continue
+            result[test + '_P'] = fisher_exact(tables[test], logfact)
+        result['OR'], result['L95'], result['U95'] = odds_ratio(tables['ALLELIC'])
+        return result
+
+    def save(self, filename):
+        return save_result(filename, self.counts, self.run())
+
+
+def save_result(filename, counts, result):
+    """Save genotype counts and statistics into a npz file.
+
+    :param counts: a `GenoCounts` instance.
+    :param result: a dict of arrays, one value for each snv.
+    """
+    arrays = dict(snps=counts.snps.astype(str), chrs=counts.chrs.astype(str),
+                  minor=counts.minor.astype(str), major=counts.major.astype(str))
+    for group in GROUPS:
+        arrays['COUNTS_' + group] = counts.counts[group]
+    arrays.update(result)
+    np.savez(filename, **arrays)
+    return filename
+
+def load_result(filename):
+    """Load a npz saved by `save_result`, returns the `GenoCounts` and a
+    dict of statistics."""
+    with np.load(filename) as data:
+        counts = GenoCounts(data['snps'], data['chrs'], data['minor'], data['major'],
+                            dict((g, data['COUNTS_' + g]) for g in GROUPS))
+        result = dict((key, data[key]) for key in data.files
+                      if key not in ('snps', 'chrs', 'minor', 'major') and not key.startswith('COUNTS_'))
+    return counts, result
+
+def plink_format(value):
+    """Render a number like plink does, 'NA' for NaN."""
+    if value is None or np.isnan(value):
+        return 'NA'
+    return '%.4g' % value
@@ -0,0 +1,59 @@
+"""
+    frequency module
+    ~~~~~~~~~~~~~~~~
+
+    Implements allele frequencies and missingness of all snvs in ALL, AFF
+    and UNAFF samples, the in-process counterpart of plink --freq and
+    --freq case-control.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .contingency import GROUPS
+
+
+class AlleleFrequency:
+    """Allele counts, frequency of the minor allele (A1) and missing rate of
+    each snv by group, from genotype counts in one vectorized pass.
+
+    :param counts: a `GenoCounts` instance, with `sizes` for missingness.
+    """
+    def __init__(self, counts):
+        self.counts = counts
+        self.snps = counts.snps
+        self.result = self.run()
+        self.positions = dict((snp, n) for n, snp in enumerate(self.snps))
+
+    def run(self):
+        """Arrays keyed like 'ALL_A1', 'ALL_A2', 'ALL_NCHROBS', 'ALL_MAF'
+        and 'ALL_MISS', MAF being NaN where no genotype is called."""
+        result = OrderedDict()
+        sizes = self.counts.sizes or {}
+        for group in GROUPS:
+            geno = self.counts.counts[group]
+            a1 = geno[:, 0] * 2 + geno[:, 1]
+            a2 = geno[:, 2] * 2 + geno[:, 1]
+            nchrobs = a1 + a2
+            with np.errstate(divide='ignore', invalid='ignore'):
+                maf = a1 / nchrobs.astype(float)
+            size = sizes.get(group, None)
+            if size:
+                miss = 1.0 - geno.sum(axis=1) / float(size)
+            else:
+                miss = np.full(len(geno), np.nan)
+            result[group + '_A1'] = a1
+            result[group + '_A2'] = a2
+            result[group + '_NCHROBS'] = nchrobs
+            result[group + '_MAF'] = maf
+            result[group + '_MISS'] = miss
+        return result
+
+    def get(self, snp, key):
+        """Value of `key` of a snv, e.g. get('rs123', 'AFF_MAF'), None if
+        the snv is unknown."""
+        n = self.positions.get(snp, None)
+        if n is None:
+            return None
+        return self.result[key][n]
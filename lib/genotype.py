@@ -0,0 +1,263 @@
+"""
+    genotype module
+    ~~~~~~~~~~~~~~~
+
+    Implements compact encoding of 'A/G' like genotype calls.
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+MISSING = -1
+# table-wide allele ids are kept as int16, per snv allele indexes as int8.
+MAX_ALLELE_IDS = np.iinfo(np.int16).max
+MAX_ALLELES = np.iinfo(np.int8).max
+
+# rough bytes held for one call while a chunk of text is parsed, i.e. the
+# python string, its pointer in the DataFrame and the allele id pairs.
+CELL_BYTES = 100
+
+
+class GenoMatrix:
+    """Genotype calls of all samples encoded as allele index pairs.
+
+    :param samples: sample names, one for each row of `codes`.
+    :param snps: snv names, one for each column of `codes`.
+    :param codes: an int8 array shaped (samples, snps, 2), each item is the
+                  index of an allele in `alleles` of the snv, -1 for missing.
+    :param alleles: a list of allele tuples, one for each snv, ordered by
+                  allele count, i.e. major allele first and minor allele second.
+    """
+    def __init__(self, samples, snps, codes, alleles):
+        self.samples = pd.Index(samples)
+        self.snps = pd.Index(snps)
+        self.codes = codes
+        self.alleles = alleles
+
+    @property
+    def shape(self):
+        return self.codes.shape[:2]
+
+    def dosage(self, cols=None):
+        """Count of minor allele for each sample and snv, -1 for missing.
+        Calls carrying a third allele are taken as missing, since plink
+        accepts only biallelic snvs.
+
+        :param cols: optional positions of snvs to be taken.
+        """
+        codes = self.codes if cols is None else self.codes[:, cols]
+        dosage = (codes == 1).sum(axis=2).astype(np.int8)
+        dosage[((codes == MISSING) | (codes > 1)).any(axis=2)] = MISSING
+        return dosage
+
+    def iter_dosage(self, nsnps):
+        """Yield dosage of consecutive blocks of `nsnps` snvs.
+
+        :param nsnps: number of snvs in a block.
+        """
+        for start in range(0, self.shape[1], nsnps):
+            yield self.dosage(np.arange(start, min(start + nsnps, self.shape[1])))
+
+    def minor_major(self):
+        """Minor (A1) and major (A2) allele of each snv, '0' if not observed."""
+        minor = [a[1] if len(a) > 1 else '0' for a in self.alleles]
+        major = [a[0] if len(a) > 0 else '0' for a in self.alleles]
+        return minor, major
+
+    def multiallelic(self):
+        """Names of snvs with more than two alleles."""
+        return [snp for snp, a in zip(self.snps, self.alleles) if len(a) > 2]
+
+    def calls(self, sep=' ', missing='0 0', cols=None):
+        """Render genotype calls back into strings, e.g. 'A G', in a vectorized
+        way through a lookup table of all allele pairs of each snv.
+
+        :param sep: separator between two alleles.
+        :param missing: string for missing calls.
+        :param cols: optional positions of snvs to be rendered.
+        """
+        if cols is None:
+            cols = np.arange(self.shape[1])
+        cols = np.asarray(cols)
+        alleles = [self.alleles[c] for c in cols]
+        width = max([len(a) for a in alleles] + [1]) + 1
+
+        lookup = np.full((len(cols), width * width), missing, dtype=object)
+        for n, pair in enumerate(alleles):
+            for i, a in enumerate(pair):
+                for j, b in enumerate(pair):
+                    lookup[n, (i + 1) * width + j + 1] = a + sep + b
+
+        codes = self.codes[:, cols].astype(np.int16) + 1
+        keys = codes[:, :, 0] * width + codes[:, :, 1]
+        keys[(codes == 0).any(axis=2)] = 0
+        return lookup[np.arange(len(cols)), keys]
+
+    def to_frame(self, sep=' ', missing='0 0'):
+        """Genotype calls as a sample X snv DataFrame of strings."""
+        return pd.DataFrame(self.calls(sep, missing), index=self.samples, columns=self.snps)
+
+
+class GenoEncoder:
+    """Turn tables of 'A/G' like calls into allele index pairs.
+
+    Distinct call strings are parsed only once, and alleles are first given
+    table-wide ids. After all tables are fed, alleles of each snv are ranked
+    by their counts so that the major allele gets index 0.
+
+    :param nsnps: number of snvs, i.e. columns of the tables to be fed.
+    """
+    def __init__(self, nsnps):
+        self.nsnps = nsnps
+        self.vocab = {}
+        self.counts = np.zeros((nsnps, 0), dtype=np.int64)
+        self.incomplete = set()
+
+    def allele_id(self, allele):
+        if allele not in self.vocab:
+            self.vocab[allele] = len(self.vocab)
+        return self.vocab[allele]
+
+    def parse_call(self, call):
+        """Split a call into allele ids, (-1, -1) for missing or blank calls.
+        Calls of one allele, e.g. 'C/' or 'C', are taken as missing too and
+        kept in `incomplete`."""
+        if not isinstance(call, str) or re.search(r'\s', call):
+            return MISSING, MISSING
+        pair = call.split('/')
+        if len(pair) > 2:
+            raise Exception('Malformed genotype <%s>' % call)
+        if '0' in pair or pair == [''] * len(pair):
+            return MISSING, MISSING
+        if len(pair) == 1 or '' in pair:
+            self.incomplete.add(call)
+            return MISSING, MISSING
+        return self.allele_id(pair[0]), self.allele_id(pair[1])
+
+    def feed(self, values):
+        """Encode an array of calls shaped (samples, snps) into table-wide
+        allele ids, and count alleles for each snv.
+
+        :param values: a 2-d array like object of genotype calls.
+        """
+        values = np.asarray(values, dtype=object)
+        keys, uniques = pd.factorize(values.ravel())
+        seen = set(self.incomplete)
+        pairs = np.array([self.parse_call(u) for u in uniques] + [(MISSING, MISSING)],
+                         dtype=np.int32).reshape(-1, 2)
+        if self.incomplete - seen:
+            print('[NOTE] Genotype calls of one allele taken as missing: %s' %
+                  ', '.join(sorted(self.incomplete - seen)[:10]))
+        # factorize gives -1 to NaN, which picks the trailing missing pair.
+        ids = pairs[keys].reshape(values.shape + (2,))
+
+        nalleles = len(self.vocab)
+        if nalleles > MAX_ALLELE_IDS:
+            raise Exception('Too many distinct alleles in genotype file, more than <%d>' % MAX_ALLELE_IDS)
+        if self.counts.shape[1] < nalleles:
+            grown = np.zeros((self.nsnps, nalleles), dtype=np.int64)
+            grown[:, :self.counts.shape[1]] = self.counts
+            self.counts = grown
+        snp_idx = np.broadcast_to(np.arange(self.nsnps)[:, None], ids.shape)
+        called = ids != MISSING
+        flat = snp_idx[called] * nalleles + ids[called]
+        self.counts += np.bincount(flat, minlength=self.nsnps * nalleles).reshape(self.nsnps, nalleles)
+        return ids
+
+    def ranking(self):
+        """Rank alleles of each snv by count, returns a (snps, alleles) table
+        mapping table-wide allele ids to per snv indexes, and the allele tuples.
+        """
+        nalleles = self.counts.shape[1]
+        order = np.argsort(-self.counts, axis=1, kind='mergesort')
+        rank = np.empty_like(order)
+        rank[np.arange(self.nsnps)[:, None], order] = np.arange(nalleles)
+
+        names = np.array(sorted(self.vocab, key=self.vocab.get) or [''], dtype=object)
+        present = (self.counts > 0).sum(axis=1)
+        alleles = [tuple(names[order[j, :present[j]]]) for j in range(self.nsnps)]
+        return rank, alleles
+
+    def localize(self, ids, rank):
+        """Turn table-wide allele ids into int8 per snv allele indexes."""
+        snp_idx = np.broadcast_to(np.arange(self.nsnps)[:, None], ids.shape)
+        called = ids != MISSING
+        codes = np.full(ids.shape, MISSING, dtype=np.int8)
+        codes[called] = rank[snp_idx[called], ids[called]]
+        return codes
+
+
+def check_alleles(snps, alleles):
+    """Raise on a snv of more alleles than int8 codes hold."""
+    for snp, names in zip(snps, alleles):
+        if len(names) > MAX_ALLELES:
+            raise Exception('Too many alleles of snv, more than %d <%s>' % (MAX_ALLELES, snp))
+
+
+class GenoReader:
+    """Stream a tab separated genotype file in bounded chunks of samples.
+
+    Calls of a chunk are encoded and written into a disk backed matrix under
+    `tmpdir`, so that only one chunk of text lives in memory at a time.
+    Without `memory` the whole file is taken as one chunk and kept in memory.
+
+    :param filename: genotype file, samples in rows and snvs in columns.
+    :param memory: optional memory ceiling in MB for a chunk of calls.
+    :param tmpdir: directory for the disk backed matrix, required by `memory`.
+    """
+    def __init__(self, filename, memory=None, tmpdir=None):
+        self.filename = filename
+        self.memory = memory
+        self.tmpdir = tmpdir
+
+        with open(self.filename, 'rt') as fh:
+            header = fh.readline().rstrip('\r\n').split('\t')
+            self.nsamples = sum(1 for line in fh if line.strip())
+        self.snps = header[1:]
+
+    def chunksize(self):
+        """Rows of a chunk that fit into the memory ceiling."""
+        if not self.memory:
+            return max(self.nsamples, 1)
+        cells = int(self.memory) * 2 ** 20 // CELL_BYTES
+        return max(cells // max(len(self.snps), 1), 1)
+
+    def allocate(self, name, dtype):
+        shape = (self.nsamples, len(self.snps), 2)
+        if not self.memory:
+            return np.empty(shape, dtype=dtype)
+        filename = os.path.join(self.tmpdir, name)
+        return np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+
+    def iter_chunks(self):
+        """Yield DataFrames of consecutive samples."""
+        return pd.read_table(self.filename, header=0, index_col=0, sep='\t',
+                             dtype=object, chunksize=self.chunksize())
+
+    def encode(self):
+        """Encode the whole file into a `GenoMatrix` chunk by chunk."""
+        encoder = GenoEncoder(len(self.snps))
+        ids = self.allocate('geno_ids.npy', np.int16)
+        samples = []
+        row = 0
+        for chunk in self.iter_chunks():
+            ids[row: row + chunk.shape[0]] = encoder.feed(chunk.values)
+            samples.extend(chunk.index)
+            row += chunk.shape[0]
+
+        rank, alleles = encoder.ranking()
+        check_alleles(self.snps, alleles)
+        codes = self.allocate('geno_codes.npy', np.int8)
+        step = self.chunksize()
+        for start in range(0, self.nsamples, step):
+            codes[start: start + step] = encoder.localize(ids[start: start + step], rank)
+
+        if self.memory:
+            del ids
+            os.remove(os.path.join(self.tmpdir, 'geno_ids.npy'))
+            codes.flush()
+        return GenoMatrix(samples, self.snps, codes, alleles)
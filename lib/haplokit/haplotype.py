@@ -7,7 +7,6 @@
 
 import os
 import re
-import subprocess
 import random
 from copy import deepcopy
 
@@ -17,9 +16,13 @@ import xlsxwriter
 import patsy
 from collections import defaultdict, UserDict
 
-from ..utils import dir_check, file_check, parse_column, formater_type, print_readme
+from ..utils import dir_check, file_check, parse_column, formater_type, print_readme, to_float
 from ..mathematics import LogitRegression
+from ..regression import NullLogistic, wald
+from ..multitest import METHODS, adjust, config_method
+from ..contingency import plink_format
 from ..xlsx_formater import Formater
+from ..bedfile import BedReader
 from .block_read import BlockIdentifier
 
 def hap_analysis(assoc_inst):
@@ -35,7 +38,7 @@ def hap_analysis(assoc_inst):
 
 
 class SplitPed:
-    """Split sample.ped into pieces according to genes, i.e. one
+    """Split genotypes into ped pieces according to genes, i.e. one
     gene, one ped file. These ped files will be submmited to haloview.
     """
     def __init__(self, assoc_inst):
@@ -46,26 +49,24 @@ class SplitPed:
                 os.path.join(self.path, 'data/raw_hap.txt')
         self.tmpdir = self.config.get('TMPDIR', None)\
                 or os.path.join(self.path, 'tmp')
-        self.pedfile = os.path.join(self.tmpdir, 'sample.ped')
-        self.mapfile = os.path.join(self.tmpdir, 'sample.map')
+        self.bedfile = self.config.get('BED', None) or \
+                os.path.join(self.tmpdir, 'bsample')
 
         self.header = ['FID', 'IID', 'PAT', 'MAT', 'SEX', 'PHENO']
 
     def go(self):
-        ped, map_ = self.load_table()
+        fam, map_ = self.load_table()
         hap = self.parse_hap()
-        self.gene_ped(hap, ped, map_)
+        self.gene_ped(hap, fam, map_)
         genes = hap.keys()
         return genes
 
     def load_table(self):
-        ped = pd.read_table(self.pedfile, header=None, index_col=None, sep='\t')
-        map_= pd.read_table(self.mapfile, header=None, index_col=None, sep='\t')
-
-        snps = map_.iloc[:, 1].values
-        header = self.header + list(snps)
-        ped.columns = header
-        return ped, map_.iloc[:, [1,3]]
+        """Map the bed fileset, genotypes of each gene are decoded later."""
+        self.bed = BedReader(self.bedfile)
+        fam = pd.DataFrame([r[:6] for r in self.bed.fam], columns=self.header)
+        map_ = pd.DataFrame([[r[1], int(r[3])] for r in self.bed.bim])
+        return fam, map_
 
     def parse_hap(self):
         hap = {}
@@ -76,8 +77,8 @@ class SplitPed:
         return hap
 
     def gene_ped(self, hap, ped, map_):
-        """select corresponding columns from sample.ped
-        file by snvs of a gene.
+        """decode corresponding columns from the bed
+        by snvs of a gene.
         """
         dirname = os.path.join(self.path, 'report/Raw_data')
         dir_check(dirname)
@@ -85,8 +86,8 @@ class SplitPed:
             tmpped = os.path.join(dirname, '{0}.ped'.format(gene))
             tmpinfo = os.path.join(dirname, '{0}.info'.format(gene))
             snps = hap[gene]
-            header = self.header + snps
-            geneped = ped[header]
+            calls = pd.DataFrame(self.bed.calls(self.bed.index(snps)), columns=snps)
+            geneped = pd.concat([ped, calls], axis=1)
             genemap = map_.loc[map_.iloc[:, 0].isin(snps)]
             genemap.to_csv(tmpinfo, header=False, index=False, sep='\t')
 
@@ -127,8 +128,10 @@ class Haploview:
     """Haploview plot and LD calculation."""
     def __init__(self, assoc_inst, genes):
         self.config = assoc_inst.config
+        self.runner = assoc_inst.runner
         self.path = self.config.get('ROUTINE', None)
         self.reportdir = os.path.join(self.path, 'report')
+        self.logdir = os.path.join(self.path, 'result/haplotype')
         self.genes = genes
 
     def go(self):
@@ -151,19 +154,28 @@ class Haploview:
     def haploview(self, pedlist):
         hap_jar = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Haploview.jar')
         D, R2 = self.outpath()
+        dir_check(self.logdir)
+        jobs = self.runner.jobs()
         for fped in pedlist:
             finfo = re.sub(r'ped', 'info', fped)
             gene = re.sub(r'\.ped', '', os.path.basename(fped))
             for to_dir, ldvalues in ((R2, 'RSQ'), (D, 'DPRIME')):
                 out_item = os.path.join(to_dir, gene + '_' + ldvalues)
-                subprocess.run(["java", "-jar", hap_jar, "-n", "-out", out_item,
+                self.add_job(jobs, ["java", "-jar", hap_jar, "-n", "-out", out_item,
+                                    "-pedfile", fped, "-info", finfo,
+                                    "-png", "-ldcolorscheme", "GOLD", "-ldvalues",
+                                    ldvalues, "-blockoutput", "GAB"], [hap_jar, fped, finfo], out_item)
+            out_item = os.path.join(self.reportdir, 'haploview/%s' %gene)
+            self.add_job(jobs, ["java", "-jar", hap_jar, "-n", "-out", out_item,
                                 "-pedfile", fped, "-info", finfo,
-                                "-png", "-ldcolorscheme", "GOLD", "-ldvalues",
-                                ldvalues, "-blockoutput", "GAB"])
-            subprocess.run(["java", "-jar", hap_jar, "-n", "-out",
-                            os.path.join(self.reportdir, 'haploview/%s' %gene),
-                            "-pedfile", fped, "-info", finfo,
-                            "-dprime", "-blockoutput", "GAB"])
+                                "-dprime", "-blockoutput", "GAB"], [hap_jar, fped, finfo], out_item)
+        jobs.run()
+
+    def add_job(self, jobs, commands, inputs, out_item):
+        """Add a haploview run, whose outputs are named after `out_item`,
+        logged under result/haplotype to keep the report clean."""
+        log = os.path.join(self.logdir, os.path.basename(out_item) + '.job.log')
+        jobs.add(out_item, commands, log, inputs, [out_item + '.*'])
 
     def LD_block_xlsx(self):
         workbook = xlsxwriter.Workbook(os.path.join(self.reportdir, 'LD_block.xlsx'))
@@ -196,6 +208,7 @@ class Haploview:
 class HapAssocAnalysis:
     def __init__(self, assoc_inst):
         self.config = assoc_inst.config
+        self.runner = assoc_inst.runner
         self.plink = '/home/wuj/.local/bin/plink'
         self.path = self.config.get('ROUTINE', None)
         self.basepath = self.config.get('basepath')
@@ -208,8 +221,10 @@ class HapAssocAnalysis:
         self.cov_num = self.config.get('HAP_COV', None) or self.config.get('CORRECTION', None)
         self.bedfile = self.config.get('BED', None) or \
                 os.path.join(self.path, 'tmp/bsample')
-        self.snp_file = self.config.get('SNPFILE', None)
-        self.chrinfo = self.load_chrinfo()
+        self.snp_index = assoc_inst.snp_index
+        self.score_cutoff = self.config.get('SCORE_CUTOFF', None)
+        self.null_model = None
+        self.adjust = config_method(self.config)
         self.sampleshaps = pd.DataFrame()
         self.result_wrapper = []
 
@@ -225,8 +240,10 @@ class HapAssocAnalysis:
             self.covar_result_wrapper = []
 
     def hap_go(self):
-        phasebase = self.hap_phase()
-        freqfile = self.hap_freq()
+        jobs = self.runner.jobs()
+        phasebase = self.hap_phase(jobs)
+        freqfile = self.hap_freq(jobs)
+        jobs.run()
 
         sample_pheno = self.load_sampleinfo()
 
@@ -267,23 +284,20 @@ class HapAssocAnalysis:
         readmefile = os.path.join(self.basepath, 'ReadMetxt/readme_hap.txt')
         print_readme(sheet_readme, readmefile, formater)
 
-        header = ('Hap', 'CHR', 'SNPS', 'HAPLOTYPE', 'case_F', 'control_F', 'OR', '95%CI', 'P-value')
+        header = ('Hap', 'CHR', 'SNPS', 'HAPLOTYPE', 'case_F', 'control_F', 'OR', '95%CI', 'P-value',
+                  METHODS[self.adjust] + ' adjusted')
         row = 0
         for i, j in enumerate(header):
             sheet.write(row, i, j, formater.header)
         row += 1
-        for result in self.result_wrapper:
-            block = result.block
-            snps = self.block_sites[block]
-            Chr= self.chrinfo[snps[0]]
-            for hap in result.data:
-                line = self.parse_result(block, Chr, ','.join(snps), hap, result[hap])
-                fmt = formater_type(line, [8], formater)
-                for n, v in enumerate(line):
-                    sheet.write(row, n, v, fmt[n])
-                row += 1
+        for line in self.result_lines(self.result_wrapper):
+            fmt = formater_type(line, [8, 9], formater)
+            for n, v in enumerate(line):
+                sheet.write(row, n, v, fmt[n])
+            row += 1
 
         if self.cov_num and self.covar_result_wrapper:
+            workbook.close()
             workbook = xlsxwriter.Workbook(os.path.join(self.reportdir, 'haplotype_correction.xlsx'))
             formater = Formater(workbook)
             sheet = workbook.add_worksheet('单倍型分析')
@@ -299,18 +313,28 @@ class HapAssocAnalysis:
             for i, j in enumerate(header):
                 sheet.write(row, i, j, formater.header)
             row += 1
-            for result in self.covar_result_wrapper:
-                block = result.block
-                snps = self.block_sites[block]
-                Chr= self.chrinfo[snps[0]]
-                for hap in result:
-                    line = self.parse_result(block, Chr, ','.join(snps), hap, result[hap])
-                    fmt = formater_type(line, [8], formater)
-                    for n, v in enumerate(line):
-                        sheet.write(row, n, v, fmt[n])
-                    row += 1
+            for line in self.result_lines(self.covar_result_wrapper):
+                fmt = formater_type(line, [8, 9], formater)
+                for n, v in enumerate(line):
+                    sheet.write(row, n, v, fmt[n])
+                row += 1
         workbook.close()
 
+    def result_lines(self, wrappers):
+        """Lines of haplotypes of all blocks, with p-values adjusted over
+        them all by `ADJUST`."""
+        lines = []
+        for result in wrappers:
+            block = result.block
+            snps = self.block_sites[block]
+            Chr= self.snp_index.get(snps[0], 'chrs')
+            for hap in result.data:
+                lines.append(self.parse_result(block, Chr, ','.join(snps), hap, result[hap]))
+        values = adjust([to_float(line[8]) for line in lines], self.adjust)
+        for line, value in zip(lines, values):
+            line.append(plink_format(value))
+        return lines
+
     def sampleshap_to_excel(self, sheet, formater):
         header = list(self.sampleshaps.columns)
         header.insert(0, 'Sample')
@@ -325,39 +349,28 @@ class HapAssocAnalysis:
                 sheet.write(row, n+1, str(v), formater.normal)
             row += 1
 
-    def hap_phase(self):
+    def hap_phase(self, jobs):
         output = os.path.join(self.resultdir, 'phase')
-        subprocess.run([self.plink,
-                        '--bfile', self.bedfile,
-                        '--hap', self.hapfile,
-                        '--hap-phase', '--allow-no-sex',
-                        '--out', output,
-                        '--noweb'])
+        jobs.add(output, [self.plink,
+                          '--bfile', self.bedfile,
+                          '--hap', self.hapfile,
+                          '--hap-phase', '--allow-no-sex',
+                          '--out', output,
+                          '--noweb'], output + '.job.log', self.plink_inputs(), [output + '.*'])
         return output + '.phase-'
 
-    def hap_freq(self):
+    def hap_freq(self, jobs):
         output = os.path.join(self.resultdir, 'freq')
-        subprocess.run([self.plink,
-                        '--bfile', self.bedfile,
-                        '--hap', self.hapfile,
-                        '--hap-freq', '--allow-no-sex',
-                        '--out', output,
-                        '--noweb'])
+        jobs.add(output, [self.plink,
+                          '--bfile', self.bedfile,
+                          '--hap', self.hapfile,
+                          '--hap-freq', '--allow-no-sex',
+                          '--out', output,
+                          '--noweb'], output + '.job.log', self.plink_inputs(), [output + '.*'])
         return output + '.frq.hap'
 
-    def load_chrinfo(self):
-        dic = {}
-        count = 0
-        with open(self.snp_file, 'rt') as fh:
-            for line in fh:
-                count += 1
-                if re.match(r'^\s$', line):
-                    continue
-                if count == 1:
-                    continue
-                arr = line.split()
-                dic[arr[0]] = arr[1]
-        return dic
+    def plink_inputs(self):
+        return [self.bedfile + ext for ext in ('.bed', '.bim', '.fam')] + [self.hapfile]
 
     def filter_low_freq_hap(self, freqfile):
         """Keep blocks that need to be handled, drop those with
@@ -452,6 +465,10 @@ class HapAssocAnalysis:
             col_names.append('ind_var')
             formula = 'grp ~ ' + '+'.join(col_names)
             y, X = patsy.dmatrices(formula, merged_table)
+            if self.score_cutoff is not None:
+                res = self.score_LR(np.asarray(y)[:, 0], np.asarray(X), output)
+                if res is not None:
+                    return res
             logit = LogitRegression(y, X)
             result = logit.gofit()
             # with open(output, 'wt') as fh:
@@ -479,6 +496,30 @@ class HapAssocAnalysis:
         else:
             return None
 
+    def score_LR(self, y, X, output):
+        """Score test of the haplotype, i.e. the last column of `X`, against
+        the covariates model, which is fitted once as it is the same for all
+        haplotypes. Returns None if the haplotype is to be refitted, i.e. of
+        p-value below SCORE_CUTOFF.
+        """
+        C = X[:, :-1]
+        null = self.null_model
+        if null is None or not (np.array_equal(null.y, y) and np.array_equal(null.C, C)):
+            try:
+                null = self.null_model = NullLogistic(y, C)
+            except Exception:
+                return None
+        beta, cov = null.score(X[None, None, :, -1], np.ones((1, len(y)), dtype=bool))
+        stats, p = wald(beta, cov, 1)
+        if not p[0] >= float(self.score_cutoff):
+            return None
+        with open(output, 'wt') as fh:
+            fh.write('Score test of ind_var against covariates model\n')
+            fh.write('OR\t%s\nSE\t%s\nz\t%s\nP\t%s\n' % (
+                stats['OR'][0, 0], stats['SE'][0, 0], stats['STAT'][0, 0], p[0]))
+        return dict(OR=stats['OR'][0, 0], L95=stats['L95'][0, 0],
+                    U95=stats['U95'][0, 0], pvalue=p[0])
+
     @staticmethod
     def hap_numeralization(series, hap):
         return list(series).count(hap)
@@ -0,0 +1,97 @@
+"""
+    hwe module
+    ~~~~~~~~~~
+
+    Implements exact test of Hardy-Weinberg equilibrium for all snvs.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .contingency import GROUPS, save_result, log_factorials, _blocks, _tail
+
+
+def exact_hwe(counts, cells=2 ** 22):
+    """Exact HWE p-values of genotype counts shaped (snps, 3), those of
+    Wigginton, Cutler and Abecasis (2005).
+
+    Probabilities of het counts are computed in closed form from a
+    log-factorial table, for a block of snvs at once, and those not above
+    the probability of the observed count are summed up. The distribution
+    is log-concave, so het counts of probability below 1e-20 of the
+    observed one lie beyond two bounds found by bisection, and are left
+    out. Snvs of the same genotype counts are tested once.
+
+    :param cells: number of het counts held at a time.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    p = np.full(len(counts), np.nan)
+    ok = np.flatnonzero(counts.sum(axis=1) > 0)
+    if not ok.size:
+        return p
+    tables, inverse = np.unique(counts[ok], axis=0, return_inverse=True)
+    n = tables.sum(axis=1)
+    rare = np.minimum(tables[:, 0], tables[:, 2]) * 2 + tables[:, 1]
+    lf = log_factorials(int(2 * n.max()))
+    const = lf[n] + lf[rare] + lf[2 * n - rare] - lf[2 * n]
+
+    # het counts have the parity of rare allele count, the j-th is 2j + parity.
+    def log_prob(j, rows):
+        h = rare[rows] % 2 + 2 * j
+        homr = (rare[rows] - h) // 2
+        return const[rows] + h * np.log(2.0) - lf[homr] - lf[h] - lf[n[rows] - h - homr]
+
+    rows = np.arange(len(tables))
+    at = tables[:, 1] // 2
+    observed = log_prob(at, rows)
+    floor = observed + np.log(1e-20)
+    lo = bisect(lambda j: log_prob(j, rows) >= floor, np.zeros_like(at), at)
+    hi = bisect(lambda j: log_prob(np.minimum(j, rare // 2), rows) < floor, at, rare // 2 + 1) - 1
+
+    tested = np.empty(len(tables))
+    for block in _blocks(hi - lo + 1, cells):
+        b = block[:, None]
+        j = lo[b] + np.arange((hi[block] - lo[block]).max() + 1)
+        valid = j <= hi[b]
+        logp = log_prob(np.minimum(j, hi[b]), b)
+        tested[block] = _tail(logp, valid, observed[block])
+    p[ok] = tested[inverse.reshape(-1)]
+    return p
+
+def bisect(test, lo, hi):
+    """First item within [lo, hi] of each row passing `test`, which fails
+    then passes along each row; `hi` if none passes before it."""
+    lo, hi = lo.copy(), hi.copy()
+    while (lo < hi).any():
+        mid = (lo + hi) // 2
+        passed = test(mid)
+        hi = np.where(passed & (lo < hi), mid, hi)
+        lo = np.where(~passed & (lo < hi), mid + 1, lo)
+    return lo
+
+
+class HweTest:
+    """Exact HWE test of all snvs in ALL, AFF and UNAFF samples, what plink
+    --hardy gives.
+
+    :param counts: a `GenoCounts` instance.
+    """
+    def __init__(self, counts):
+        self.counts = counts
+
+    def run(self):
+        """Arrays keyed like 'ALL_P', 'ALL_OHET' and 'ALL_EHET'."""
+        result = OrderedDict()
+        for group in GROUPS:
+            counts = self.counts.counts[group].astype(float)
+            n = counts.sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                freq = (counts[:, 0] * 2 + counts[:, 1]) / (2 * n)
+                result[group + '_OHET'] = counts[:, 1] / n
+            result[group + '_EHET'] = 2 * freq * (1 - freq)
+            result[group + '_P'] = exact_hwe(self.counts.counts[group])
+        return result
+
+    def save(self, filename):
+        return save_result(filename, self.counts, self.run())
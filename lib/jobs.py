@@ -0,0 +1,189 @@
+"""
+    jobs module
+    ~~~~~~~~~~~
+
+    Implements external commands run concurrently on an asyncio event loop,
+    with their own logs, timeouts and a timeline of the run.
+"""
+
+import os
+import time
+import signal
+import asyncio
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import dir_check
+
+
+Job = namedtuple('Job', 'name commands log inputs outputs')
+
+
+def exit_code(status):
+    """Exit code of a wait status, the negative signal number if killed,
+    as `subprocess` gives."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class Timeline:
+    """Start, end, wall and CPU time of each job of a run, kept in a tab
+    separated file. Status of a job is its exit code, 'timeout', or
+    'cached' if its outputs were restored from `RunCache`.
+
+    :param filename: the timeline file, rewritten for each run.
+    """
+    header = ('job', 'start', 'end', 'wall', 'user', 'system', 'status')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        dir_check(os.path.dirname(filename))
+        with open(filename, 'wt') as fh:
+            fh.write('\t'.join(self.header) + '\n')
+
+    def record(self, name, start, end, status, user=0.0, system=0.0):
+        stamp = lambda t: time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+        row = [name, stamp(start), stamp(end), '%.2f' % (end - start),
+               '%.2f' % user, '%.2f' % system, str(status)]
+        with self.lock:
+            with open(self.filename, 'at') as fh:
+                fh.write('\t'.join(row) + '\n')
+
+
+class ToolRunner:
+    """Runner of external tools shared by all stages: processes are bounded
+    by `ProcessSlots`, outputs are cached by `RunCache`, and each job is
+    recorded into a `Timeline` and killed after `timeout` seconds.
+
+    :param slots: a `ProcessSlots` instance.
+    :param runcache: optional `RunCache`, outputs of jobs with inputs and
+                     outputs declared are restored from it when unchanged.
+    :param timeline: optional `Timeline`.
+    :param timeout: optional seconds a job may run.
+    """
+    def __init__(self, slots, runcache=None, timeline=None, timeout=None):
+        self.slots = slots
+        self.runcache = runcache
+        self.timeline = timeline
+        self.timeout = float(timeout) if timeout else None
+
+    def jobs(self):
+        """An empty `JobSet` run by this runner."""
+        return JobSet(self)
+
+    def run(self, name, commands, log, inputs=None, outputs=None):
+        """Run a single command, see `JobSet.add`."""
+        jobs = JobSet(self)
+        jobs.add(name, commands, log, inputs, outputs)
+        return jobs.run()[0]
+
+    def record(self, name, start, end, status, usage=None):
+        if self.timeline is not None:
+            user, system = (usage.ru_utime, usage.ru_stime) if usage else (0.0, 0.0)
+            self.timeline.record(name, start, end, status, user, system)
+
+
+class JobSet:
+    """Independent commands launched together on an asyncio event loop. At
+    most `JOBS` of them run at a time, each within a slot of `ProcessSlots`
+    shared with other stages. Output of each command streams into its own
+    log, and exit status of all commands is checked once they are done.
+
+    :param runner: a `ToolRunner` instance.
+    """
+    def __init__(self, runner):
+        self.runner = runner
+        self.jobs = []
+
+    def add(self, name, commands, log, inputs=None, outputs=None):
+        """Add a command.
+
+        :param name: name of the job, e.g. output prefix of plink.
+        :param log: file keeping stdout and stderr of the command.
+        :param inputs: optional files the command reads.
+        :param outputs: optional glob patterns of files the command writes,
+                        which should cover `log`.
+        """
+        self.jobs.append(Job(name, list(commands), log, inputs, outputs))
+
+    def run(self):
+        """Run all jobs, raise if any of them exits with non-zero status or
+        times out. Returns exit codes of the jobs."""
+        if not self.jobs:
+            return []
+        workers = min(self.runner.slots.jobs, len(self.jobs))
+        loop = asyncio.new_event_loop()
+        # threads wait for slots and reap processes, so the loop never blocks.
+        pool = ThreadPoolExecutor(max_workers=2 * workers)
+        try:
+            results = loop.run_until_complete(self.gather(loop, pool, workers))
+        finally:
+            pool.shutdown()
+            loop.close()
+        failed = []
+        for job, (code, timedout) in zip(self.jobs, results):
+            if timedout:
+                failed.append('%s (timed out after %ss, see %s)' % (job.name, self.runner.timeout, job.log))
+            elif code != 0:
+                failed.append('%s (exit %s, see %s)' % (job.name, code, job.log))
+        if failed:
+            raise Exception('Jobs failed: <%s>' % '; '.join(failed))
+        return [code for code, _ in results]
+
+    async def gather(self, loop, pool, workers):
+        semaphore = asyncio.Semaphore(workers)
+        return await asyncio.gather(*[self.launch(loop, pool, semaphore, job) for job in self.jobs])
+
+    async def launch(self, loop, pool, semaphore, job):
+        """Run a job, or restore its outputs from `RunCache`, returns its
+        exit code and whether it timed out."""
+        runcache = self.runner.runcache
+        if job.inputs is None or job.outputs is None:
+            runcache = None
+        async with semaphore:
+            pending = None
+            if runcache is not None:
+                pending = await loop.run_in_executor(pool, runcache.prepare,
+                                                     job.commands, job.inputs, job.outputs)
+                if pending is None:
+                    now = time.time()
+                    self.runner.record(job.name, now, now, 'cached')
+                    return 0, False
+            slots = self.runner.slots.semaphore
+            await loop.run_in_executor(pool, slots.acquire)
+            try:
+                code, timedout = await self.spawn(loop, pool, job)
+            finally:
+                slots.release()
+            if pending is not None:
+                await loop.run_in_executor(pool, runcache.keep, pending, job.outputs, code)
+            return code, timedout
+
+    async def spawn(self, loop, pool, job):
+        """Start a command with its output streamed into its log, and reap
+        it by os.wait4 in a thread, which gives the CPU time it took."""
+        with open(job.log, 'wb') as fh:
+            start = time.time()
+            try:
+                proc = subprocess.Popen(job.commands, stdout=fh, stderr=subprocess.STDOUT)
+            except OSError as e:
+                fh.write(('Unable to run <%s>: %s\n' % (job.commands[0], e)).encode())
+                self.runner.record(job.name, start, time.time(), 127)
+                return 127, False
+            reaping = loop.run_in_executor(pool, os.wait4, proc.pid, 0)
+            done, _ = await asyncio.wait([reaping], timeout=self.runner.timeout)
+            if not done:
+                try:
+                    os.kill(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            _, status, usage = await reaping
+            # reaped here, so `Popen` must not wait for it again.
+            proc.returncode = exit_code(status)
+        self.runner.record(job.name, start, time.time(),
+                           proc.returncode if done else 'timeout', usage)
+        return proc.returncode, not done
@@ -14,6 +14,8 @@ import patsy
 import statsmodels.api as sm
 from scipy.stats import chi2_contingency, ttest_ind
 
+from .contingency import fisher_exact, odds_ratio
+
 
 class LogitRegression:
     """Logistic regression model.
@@ -121,18 +123,40 @@ def contain_item(header, items):
     return i & h == i
 
 def odd_ratio(dataset):
-    try:
-        if dataset.size > 4:
-            return 'NA', 'NA', 'NA'
-        darray = np.array(dataset).reshape(2,2)
-        OR = darray[0][0] * darray[1][1] / (darray[0][1] * darray[1][0])
-        L = np.log(OR)
-        SE = np.sqrt(sum(1/darray.reshape(4,1)))[0]
-        L95 = np.exp(L - 1.96 * SE)
-        U95 = np.exp(L + 1.96 * SE)
-        return OR, L95, U95
-    except ZeroDivisionError:
-        pass
+    """OR and 95% CI of a 2X2 table, or arrays of them of tables stacked
+    as (n, 2, 2), the same as snv tests by `contingency.odds_ratio`."""
+    darray = np.array(dataset)
+    if darray.ndim == 3:
+        return odds_ratio(darray)
+    if darray.size > 4:
+        return 'NA', 'NA', 'NA'
+    OR, L95, U95 = odds_ratio(darray.reshape(1, 2, 2))
+    return OR[0], L95[0], U95[0]
+
+
+class FisherExact(ChiSquare):
+    """Fisher exact test of a 2X2 or 2X3 table, takes the same input as
+    `ChiSquare`.
+    """
+
+    def calculator(self):
+        from collections import namedtuple
+        Result = namedtuple('Result', 'p OR L95 U95')
+        table = np.nan_to_num(np.array(self.dataset, dtype=float)).astype(np.int64)
+        if table.shape[0] != 2:
+            table = table.T
+        p = fisher_exact(table[None])[0]
+        OR, L95, U95 = odd_ratio(table)
+        return Result(p=p, OR=OR, L95=L95, U95=U95)
+
+    def put_down(self, path, var):
+        filename = os.path.join(path, '%s_fisher.txt' % var)
+        result = self.calculator()
+        with open(filename ,'wt') as fh:
+            fh.write('p-value\tOR\tL95\tU95\n')
+            fh.write('\t'.join(map(lambda x: str(x), result)) + '\n')
+            fh.write(str(self.dataset))
+        return result
 
 
 class Ttest:
@@ -0,0 +1,118 @@
+"""
+    multitest module
+    ~~~~~~~~~~~~~~~~
+
+    Implements multiple testing correction of p-values: Bonferroni, Holm,
+    Sidak, Benjamini-Hochberg, Benjamini-Yekutieli, Storey q-values and
+    genomic control.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from scipy.stats import chi2
+
+
+# methods of `ADJUST` and labels of their columns in reports.
+METHODS = OrderedDict([
+        ('BH', 'FDR_BH'),
+        ('BY', 'FDR_BY'),
+        ('HOLM', 'Holm'),
+        ('BONFERRONI', 'Bonferroni'),
+        ('QVALUE', 'q-value'),
+        ])
+
+
+class Adjustment:
+    """Adjusted p-values of a family of tests, sorted once for all methods.
+    NaN are left out of the family and stay NaN.
+
+    :param p: an array of p-values of any shape, which is the family.
+    """
+    def __init__(self, p):
+        p = np.asarray(p, dtype=float)
+        self.shape = p.shape
+        p = p.ravel()
+        valid = np.flatnonzero(~np.isnan(p))
+        self.order = valid[np.argsort(p[valid], kind='mergesort')]
+        self.sorted = p[self.order]
+        self.m = len(self.order)
+        self.ranks = np.arange(1, self.m + 1)
+
+    def unsort(self, ranked):
+        adjusted = np.full(int(np.prod(self.shape)), np.nan)
+        adjusted[self.order] = np.minimum(ranked, 1)
+        return adjusted.reshape(self.shape)
+
+    def step_up(self, factor):
+        """Running min from the largest p-value of p * factor, as of BH."""
+        if not self.m:
+            return self.unsort(self.sorted)
+        return self.unsort(np.minimum.accumulate((self.sorted * factor)[::-1])[::-1])
+
+    def bonferroni(self):
+        return self.unsort(self.sorted * self.m)
+
+    def holm(self):
+        if not self.m:
+            return self.unsort(self.sorted)
+        return self.unsort(np.maximum.accumulate(self.sorted * (self.m - self.ranks + 1)))
+
+    def sidak_ss(self):
+        """Single-step Sidak."""
+        return self.unsort(1 - (1 - self.sorted) ** self.m)
+
+    def sidak_sd(self):
+        """Step-down Sidak."""
+        if not self.m:
+            return self.unsort(self.sorted)
+        return self.unsort(np.maximum.accumulate(1 - (1 - self.sorted) ** (self.m - self.ranks + 1)))
+
+    def bh(self):
+        return self.step_up(self.m / self.ranks.astype(float))
+
+    def by(self):
+        harmonic = (1.0 / self.ranks).sum()
+        return self.step_up(self.m * harmonic / self.ranks)
+
+    def pi0(self, lam=0.5):
+        """Storey's estimate of the proportion of true null hypotheses, 1 if
+        no p-value is above `lam`, as the estimate of 0 is degenerate in
+        small families."""
+        above = (self.sorted > lam).sum()
+        if not above:
+            return 1.0
+        return min(above / (self.m * (1.0 - lam)), 1.0)
+
+    def qvalue(self, lam=0.5):
+        return self.step_up(self.pi0(lam) * self.m / self.ranks.astype(float))
+
+    def adjust(self, method='BH'):
+        """Adjusted p-values by one of `METHODS`."""
+        method = method.upper()
+        if method not in METHODS:
+            raise Exception('Unknown multiple testing correction <%s>, one of <%s>.'
+                            % (method, ','.join(METHODS)))
+        return getattr(self, method.lower())()
+
+
+def config_method(config):
+    """Method of `ADJUST` in a config, BH by default."""
+    method = str(config.get('ADJUST', None) or 'BH').upper()
+    if method not in METHODS:
+        raise Exception('Unknown multiple testing correction <%s>, one of <%s>.'
+                        % (method, ','.join(METHODS)))
+    return method
+
+def adjust(p, method='BH'):
+    """Adjusted p-values of a family by `method`, one of `METHODS`."""
+    return Adjustment(p).adjust(method)
+
+def genomic_control(p):
+    """Inflation factor of the 1 df chi-square statistics of p-values, the
+    median over 0.456 floored at 1 as plink --adjust, and the p-values
+    deflated by it."""
+    stat = chi2.isf(np.asarray(p, dtype=float), 1)
+    valid = stat[~np.isnan(stat)]
+    lambda_ = max(np.median(valid) / 0.456, 1.0) if valid.size else 1.0
+    return lambda_, chi2.sf(stat / lambda_, 1)
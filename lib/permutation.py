@@ -0,0 +1,249 @@
+"""
+    permutation module
+    ~~~~~~~~~~~~~~~~~~
+
+    Implements empirical p-values of snv tests by permutation of case/control
+    labels, pointwise (EMP1) and family-wise by max(T) (EMP2).
+"""
+
+import multiprocessing
+from collections import OrderedDict
+
+import numpy as np
+from scipy.stats import norm
+
+from .bedfile import BedReader
+from .contingency import pearson, armitage
+
+
+# the allelic test is that of ChiSquare.xlsx, the trend test is the score
+# test of the additive model of Logistic.xlsx without covariates.
+TESTS = ('ALLELIC', 'TREND')
+
+# state of worker processes, set by `init_worker`.
+_worker = {}
+
+
+def statistics(case, total):
+    """Allelic and trend chi-square of genotype counts of cases shaped
+    (perms, snps, 3), given counts of all samples shaped (snps, 3), both in
+    the 11/12/22 order."""
+    shape = case.shape[:2]
+    geno = np.stack([case, total - case], axis=2).reshape(-1, 2, 3)
+    allele = np.stack([geno[:, :, 0] * 2 + geno[:, :, 1],
+                       geno[:, :, 2] * 2 + geno[:, :, 1]], axis=2)
+    return OrderedDict([('ALLELIC', pearson(allele).reshape(shape)),
+                        ('TREND', armitage(geno).reshape(shape))])
+
+def case_counts(Y, dosage):
+    """Genotype counts of cases of each permutation, shaped (perms, snps, 3).
+
+    :param Y: 0/1 float32 case labels shaped (perms, samples).
+    :param dosage: A1 dosage shaped (samples, snps), -1 for missing.
+    """
+    return np.stack([Y.dot((dosage == d).astype(np.float32)) for d in (2, 1, 0)], axis=2)
+
+def init_worker(prefix, labels, valid, total, observed, block):
+    # workers map the bed themselves, only small arrays are sent to them.
+    _worker.update(bed=BedReader(prefix), labels=labels, valid=valid, total=total,
+                   observed=observed, block=block)
+
+def run_batch(task):
+    """Permute labels `nperm` times, count snvs of each test whose statistic
+    is not below the observed one, and the max statistic of each permutation.
+
+    :param task: (seed, nperm, snps), snps being positions of snvs to be
+                 tested, None for all, which also gives the max statistics.
+    """
+    seed, nperm, snps = task
+    bed, labels, valid = _worker['bed'], _worker['labels'], _worker['valid']
+    state = np.random.RandomState(seed)
+    Y = np.zeros((nperm, len(labels)), dtype=np.float32)
+    for i in range(nperm):
+        Y[i, valid] = state.permutation(labels[valid])
+    total = _worker['total']
+
+    positions = np.arange(bed.shape[1]) if snps is None else snps
+    exceed = dict((test, np.zeros(len(positions), dtype=np.int64)) for test in TESTS)
+    maxstat = dict((test, np.full(nperm, -np.inf)) for test in TESTS)
+    for start in range(0, len(positions), _worker['block']):
+        part = positions[start:start + _worker['block']]
+        stats = statistics(case_counts(Y, bed.dosage(part)), total[part])
+        for test, stat in stats.items():
+            with np.errstate(invalid='ignore'):
+                exceed[test][start:start + len(part)] = (
+                        stat >= _worker['observed'][test][part] - 1e-8).sum(axis=0)
+            stat = np.where(np.isnan(stat), -np.inf, stat)
+            maxstat[test] = np.maximum(maxstat[test], stat.max(axis=1))
+    return exceed, (maxstat if snps is None else None)
+
+
+class MaxTPermutation:
+    """Empirical p-values of the allelic and trend tests of all snvs.
+
+    The first `nperm` permutations test all snvs, giving EMP1, and EMP2 by
+    the max statistic of each permutation. Permutations go on up to
+    `maxperm` for EMP1 of snvs not yet clearly non-significant, i.e. those
+    of which the lower confidence bound of EMP1 is below `alpha`.
+
+    Permutations are run in batches, each with its own random stream seeded
+    by `seed` and the batch number. Snvs are decoded from the bed block by
+    block, by worker processes taking the free slots of `slots`.
+
+    :param prefix: path of the bed fileset without extension.
+    :param nperm: number of max(T) permutations.
+    :param maxperm: optional limit of adaptive permutations for EMP1.
+    :param slots: optional `ProcessSlots` shared with other stages, without
+                  it permutations run in this process.
+    :param memory: optional memory ceiling in MB for a block of snvs.
+    """
+    def __init__(self, prefix, nperm, maxperm=None, slots=None, seed=0, memory=None,
+                 batch=100, alpha=0.05, beta=1e-4):
+        self.prefix = prefix
+        self.bed = BedReader(prefix)
+        self.nperm = int(nperm)
+        self.maxperm = max(int(maxperm or 0), self.nperm)
+        self.slots = slots
+        self.seed = int(seed or 0)
+        self.memory = memory
+        self.batch = max(min(batch, self.nperm), 1)
+        self.alpha = alpha
+        self.z = norm.isf(beta / 2)
+
+        pheno = self.bed.pheno()
+        self.labels = (pheno == 2).astype(np.float32)
+        self.valid = (pheno == 1) | (pheno == 2)
+
+    def block(self):
+        """Snvs tested at a time, each taking float copies of (batch,
+        samples) and (batch, 3) arrays."""
+        nsamples = self.bed.shape[0]
+        return max(int(self.memory or 256) * 2 ** 20 // (4 * (nsamples + 3 * self.batch) * 4), 1)
+
+    def tasks(self, start, nperm, snps):
+        """Tasks of `nperm` permutations in batches numbered from `start`,
+        the last batch cut short so that exactly `nperm` are run."""
+        return [([self.seed, start + n], min(self.batch, nperm - offset), snps)
+                for n, offset in enumerate(range(0, nperm, self.batch))]
+
+    def observe(self):
+        """Observed statistics of each test, and genotype counts of all
+        samples, computed block by block."""
+        observed = dict((test, np.empty(self.bed.shape[1])) for test in TESTS)
+        total = np.empty((self.bed.shape[1], 3), dtype=np.float32)
+        valid = self.valid[None].astype(np.float32)
+        for block, dosage in self.bed.iter_dosage(self.block()):
+            total[block] = case_counts(valid, dosage)[0]
+            stats = statistics(case_counts(self.labels[None] * self.valid, dosage), total[block])
+            for test, stat in stats.items():
+                observed[test][block] = stat[0]
+        return observed, total
+
+    def acquire(self):
+        """Take a slot of `slots`, waiting for it, and the other free ones,
+        returns the number of slots taken."""
+        if self.slots is None:
+            return 1
+        self.slots.semaphore.acquire()
+        taken = 1
+        while taken < self.slots.jobs and self.slots.semaphore.acquire(blocking=False):
+            taken += 1
+        return taken
+
+    def release(self, taken):
+        if self.slots is not None:
+            for _ in range(taken):
+                self.slots.semaphore.release()
+
+    def run(self):
+        """Arrays keyed like 'ALLELIC_EMP1' and 'ALLELIC_EMP2', with 'NPERM'
+        the number of permutations of each snv for EMP1."""
+        observed, total = self.observe()
+        self.observed = observed
+        nsnps = self.bed.shape[1]
+        exceed = dict((test, np.zeros(nsnps, dtype=np.int64)) for test in TESTS)
+        maxstat = dict((test, []) for test in TESTS)
+        counted = np.zeros(nsnps, dtype=np.int64)
+
+        initargs = (self.prefix, self.labels, self.valid, total, observed, self.block())
+        taken = self.acquire()
+        pool = None
+        try:
+            if taken > 1:
+                # workers are started afresh, not forked from a process
+                # running threads of other stages.
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                pool = context.Pool(taken, init_worker, initargs)
+            else:
+                init_worker(*initargs)
+            mapper = pool.map if pool is not None else lambda func, tasks: list(map(func, tasks))
+
+            tasks = self.tasks(0, self.nperm, None)
+            for (hits, maxes) in mapper(run_batch, tasks):
+                for test in TESTS:
+                    exceed[test] += hits[test]
+                    maxstat[test].append(maxes[test])
+            counted += self.nperm
+            nbatch = len(tasks)
+
+            # rounds of a fixed number of batches keep results the same
+            # whatever the number of jobs.
+            rounds = 8
+            while counted.max() < self.maxperm:
+                active = np.flatnonzero(self.undecided(exceed, counted))
+                if not active.size:
+                    break
+                # active snvs are those of the last round, all counted alike.
+                nperm = min(rounds * self.batch, self.maxperm - counted[active].max())
+                tasks = self.tasks(nbatch, nperm, active)
+                for hits, _ in mapper(run_batch, tasks):
+                    for test in TESTS:
+                        exceed[test][active] += hits[test]
+                counted[active] += nperm
+                nbatch += len(tasks)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            self.release(taken)
+
+        result = OrderedDict()
+        for test in TESTS:
+            maxes = np.sort(np.concatenate(maxstat[test]))
+            nmax = len(maxes)
+            missing = np.isnan(observed[test])
+            emp1 = (exceed[test] + 1.0) / (counted + 1)
+            higher = nmax - np.searchsorted(maxes, observed[test] - 1e-8)
+            emp2 = (higher + 1.0) / (nmax + 1)
+            emp1[missing] = np.nan
+            emp2[missing] = np.nan
+            result[test + '_EMP1'] = emp1
+            result[test + '_EMP2'] = emp2
+        result['NPERM'] = counted
+        return result
+
+    def undecided(self, exceed, counted):
+        """Snvs of which EMP1 of any test may still be below `alpha`."""
+        keep = np.zeros(len(counted), dtype=bool)
+        for test in TESTS:
+            p = (exceed[test] + 1.0) / (counted + 1)
+            bound = p - self.z * np.sqrt(p * (1 - p) / counted)
+            keep |= (bound <= self.alpha) & ~np.isnan(self.observed[test])
+        return keep
+
+    def save(self, filename):
+        """Save empirical p-values into a npz file along with snv names."""
+        arrays = dict(snps=np.array(self.bed.snps))
+        arrays.update(self.run())
+        np.savez(filename, **arrays)
+        return filename
+
+
+def load_permutation(filename):
+    """Load a npz saved by `MaxTPermutation.save` into a dict of empirical
+    p-values of each snv, e.g. {'rs123': {'ALLELIC_EMP1': 0.01, ...}}."""
+    with np.load(filename) as data:
+        keys = [key for key in data.files if key != 'snps']
+        return dict((snp, dict((key, data[key][n]) for key in keys))
+                    for n, snp in enumerate(data['snps']))
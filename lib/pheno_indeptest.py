@@ -14,6 +14,8 @@ import pandas as pd
 
 from . import ChiSquare, Ttest
 from .utils import dir_check, parse_column, formater_type
+from .multitest import METHODS, adjust, config_method
+from .contingency import plink_format
 from .xlsx_formater import Formater
 
 
@@ -26,6 +28,7 @@ class PhenoIndepTest:
         self.pheno_chi = self.config.get('CHI_TEST', None)
         self.pheno_ttest = self.config.get('TTEST', None)
         self.path = self.config.get('ROUTINE', None)
+        self.adjust = config_method(self.config)
 
         self.resultdir = os.path.join(self.path, 'result/pheno_test')
         self.reportdir = os.path.join(self.path, 'report')
@@ -78,7 +81,15 @@ class PhenoIndepTest:
         tvalue, p, sum_one, sum_two = t_test.put_down(self.resultdir, var_name)
         return tvalue, p, sum_one, sum_two
 
+    def record_adjusted(self, results):
+        """Adjust p-values of the tests of a sheet by `ADJUST`."""
+        values = adjust([float(result.p) for result in results], self.adjust)
+        for result, value in zip(results, values):
+            result.adjusted = value
+
     def to_excel(self):
+        self.record_adjusted(self.t_result_container)
+        self.record_adjusted(self.chi_result_container)
         workbook = xlsxwriter.Workbook(os.path.join(self.reportdir, 'PhenoTest.xlsx'))
         formater = Formater(workbook)
         sheet_chi = workbook.add_worksheet('Chi-test')
@@ -118,6 +129,16 @@ class PhenoIndepTest:
             fmt = formater.remarkable
         sheet.write(row, 1, str(result.p), fmt)
         row += 1
+        row = self.adjusted_printer(result, sheet, row, formater)
+        return row
+
+    def adjusted_printer(self, result, sheet, row, formater):
+        sheet.write(row, 0, '%s adjusted p' % METHODS[self.adjust], formater.normal)
+        fmt = formater.normal
+        if result.adjusted <= 0.05:
+            fmt = formater.remarkable
+        sheet.write(row, 1, plink_format(result.adjusted), fmt)
+        row += 1
         return row
 
     @staticmethod
@@ -152,6 +173,7 @@ class PhenoIndepTest:
             fmt = formater.remarkable
         sheet.write(row, 1, result.p, fmt)
         row += 1
+        row = self.adjusted_printer(result, sheet, row, formater)
         return row
 
 
@@ -162,6 +184,7 @@ class TtestHandler:
         self.p = p
         self.summary_one = summary_one
         self.summary_two = summary_two
+        self.adjusted = None
 
 class ChitestHandler:
     def __init__(self, item_name, dataset, chi, p, cata):
@@ -170,6 +193,7 @@ class ChitestHandler:
         self.chi = chi
         self.p = p
         self.cata = cata
+        self.adjusted = None
 
 
 def contain_item(header, items):
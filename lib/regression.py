@@ -0,0 +1,544 @@
+"""
+    regression module
+    ~~~~~~~~~~~~~~~~~
+
+    Implements logistic regression of case/control status, and linear
+    regression of quantitative phenotypes, on all snvs, fitted in batches of
+    snvs sharing the same covariates.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from scipy.stats import chi2, norm, t as student_t
+
+from .bedfile import BedReader
+
+
+# terms of each genetic model as plink names them, coded from A1 dosage.
+MODELS = OrderedDict([
+    ('ADD', ('ADD',)),
+    ('DOM', ('DOM',)),
+    ('REC', ('REC',)),
+    ('HETHOM', ('HET', 'HOM')),
+    ])
+FIELDS = ('NMISS', 'BETA', 'SE', 'OR', 'L95', 'U95', 'STAT', 'P')
+LINEAR_FIELDS = ('NMISS', 'BETA', 'SE', 'L95', 'U95', 'STAT', 'P')
+
+
+def encode(dosage, model):
+    """Design columns of a genetic model from A1 dosage shaped (samples,
+    snps), returns an array shaped (snps, terms, samples).
+
+    :param dosage: A1 counts, missing calls can be any value as they are
+                   masked out in fitting.
+    :param model: one of `MODELS`.
+    """
+    d = dosage.T.astype(float)
+    if model == 'ADD':
+        columns = [d]
+    elif model == 'DOM':
+        columns = [d >= 1]
+    elif model == 'REC':
+        columns = [d == 2]
+    elif model == 'HETHOM':
+        columns = [d == 1, d == 2]
+    else:
+        raise Exception('Unknown genetic model <%s>' % model)
+    return np.stack(columns, axis=1).astype(float)
+
+def logistic_irls(y, G, C, mask, maxiter=25, tol=1e-6):
+    """Newton/IRLS fits of logistic models of a stack of snvs sharing `y`
+    and covariates, each snv using the samples of its `mask`.
+
+    Covariates are the same for all snvs, so blocks of the information
+    matrix involving them are matrix products over samples, and the design
+    of each snv is never built. Snvs drop out of the update once converged.
+    Snvs with a singular information matrix or not converged, e.g. under
+    complete separation, get NaN.
+
+    :param y: 0/1 response shaped (samples,).
+    :param G: genotype terms shaped (snps, k, samples).
+    :param C: intercept and covariates shaped (samples, c).
+    :param mask: samples used by each snv, shaped (snps, samples).
+    :returns: coefficients (snps, k + c) with genotype terms first, and
+              their covariance matrices (snps, k + c, k + c).
+    """
+    m, k, n = G.shape
+    c = C.shape[1]
+    p = k + c
+    CC = (C[:, :, None] * C[:, None, :]).reshape(n, c * c)
+    beta = np.zeros((m, p))
+    info = np.zeros((m, p, p))
+    active = np.arange(m)
+    converged = np.zeros(m, dtype=bool)
+    singular = np.zeros(m, dtype=bool)
+    for _ in range(maxiter):
+        Ga, Ma, Ba = G[active], mask[active], beta[active]
+        eta = np.matmul(Ba[:, None, :k], Ga)[:, 0] + Ba[:, k:].dot(C.T)
+        mu = expit(eta)
+        weight = mu * (1 - mu) * Ma
+        resid = (y - mu) * Ma
+
+        Ia = np.empty((len(active), p, p))
+        WG = Ga * weight[:, None, :]
+        Ia[:, :k, :k] = np.matmul(WG, Ga.transpose(0, 2, 1))
+        Ia[:, :k, k:] = WG.reshape(-1, n).dot(C).reshape(-1, k, c)
+        Ia[:, k:, :k] = Ia[:, :k, k:].transpose(0, 2, 1)
+        Ia[:, k:, k:] = weight.dot(CC).reshape(-1, c, c)
+        info[active] = Ia
+        score = np.concatenate([np.matmul(Ga, resid[:, :, None])[:, :, 0], resid.dot(C)], axis=1)
+
+        eig = np.linalg.eigvalsh(Ia)
+        bad = eig[:, 0] <= 1e-10 * np.maximum(eig[:, -1], 1e-300)
+        singular[active[bad]] = True
+        Ia[bad] = np.eye(p)
+        delta = np.linalg.solve(Ia, score[:, :, None])[:, :, 0]
+        delta[bad] = 0
+        beta[active] += delta
+
+        done = bad | (np.abs(delta).max(axis=1) < tol)
+        converged[active[done & ~bad]] = True
+        active = active[~done]
+        if not active.size:
+            break
+
+    failed = singular | ~converged | (np.abs(beta) > 30).any(axis=1)
+    info[failed] = np.eye(p)
+    cov = np.linalg.inv(info)
+    beta[failed] = np.nan
+    cov[failed] = np.nan
+    return beta, cov
+
+def wald(beta, cov, k, ci=0.95):
+    """Wald statistics of the first `k` coefficients, and the joint chi-square
+    p-value of them."""
+    result = OrderedDict()
+    z = norm.ppf(0.5 + ci / 2)
+    b = beta[:, :k]
+    se = np.sqrt(np.diagonal(cov, axis1=1, axis2=2)[:, :k])
+    with np.errstate(invalid='ignore', over='ignore'):
+        result['BETA'] = b
+        result['SE'] = se
+        result['OR'] = np.exp(b)
+        result['L95'] = np.exp(b - z * se)
+        result['U95'] = np.exp(b + z * se)
+        result['STAT'] = b / se
+        result['P'] = 2 * norm.sf(np.abs(b / se))
+    joint = np.full(len(beta), np.nan)
+    ok = ~np.isnan(b).any(axis=1)
+    if ok.any():
+        sub = np.linalg.inv(cov[ok][:, :k, :k])
+        joint[ok] = chi2.sf(np.einsum('mi,mij,mj->m', b[ok], sub, b[ok]), k)
+    return result, joint
+
+class NullLogistic:
+    """Logistic model of case/control status on covariates only, fitted
+    once, to score test any genotype terms added to it.
+
+    :param y: 0/1 response shaped (samples,).
+    :param C: intercept and covariates shaped (samples, c).
+    :param valid: optional samples to fit with, default all.
+    """
+    def __init__(self, y, C, valid=None, maxiter=25, tol=1e-6):
+        self.y = np.asarray(y, dtype=float)
+        self.C = np.asarray(C, dtype=float)
+        self.valid = np.ones(len(self.y), dtype=bool) if valid is None else valid
+        Cv, yv = self.C[self.valid], self.y[self.valid]
+        beta = np.zeros(self.C.shape[1])
+        for _ in range(maxiter):
+            mu = expit(Cv.dot(beta))
+            try:
+                delta = np.linalg.solve((Cv.T * (mu * (1 - mu))).dot(Cv), Cv.T.dot(yv - mu))
+            except np.linalg.LinAlgError:
+                raise Exception('Null logistic model of covariates singular.')
+            beta += delta
+            if np.abs(delta).max() < tol:
+                break
+        else:
+            raise Exception('Null logistic model of covariates not converged.')
+        self.beta = beta
+        self.mu = expit(self.C.dot(beta))
+
+    def score(self, G, mask):
+        """Efficient score test of genotype terms of a stack of snvs.
+
+        The null fit is of all samples, so statistics are those of the
+        score test only for snvs called on all of them.
+
+        :param G: genotype terms shaped (snps, k, samples).
+        :param mask: samples used by each snv, shaped (snps, samples).
+        :returns: one-step estimates of the coefficients (snps, k) and
+                  their covariance matrices (snps, k, k), with which the
+                  Wald statistics are the score statistics.
+        """
+        m, k, n = G.shape
+        c = self.C.shape[1]
+        mask = mask & self.valid
+        weight = self.mu * (1 - self.mu) * mask
+        resid = (self.y - self.mu) * mask
+
+        WG = G * weight[:, None, :]
+        I_GG = np.matmul(WG, G.transpose(0, 2, 1))
+        I_GC = WG.reshape(-1, n).dot(self.C).reshape(m, k, c)
+        I_CC = weight.dot((self.C[:, :, None] * self.C[:, None, :]).reshape(n, c * c)).reshape(m, c, c)
+        U_G = np.matmul(G, resid[:, :, None])[:, :, 0]
+        U_C = resid.dot(self.C)
+
+        eig = np.linalg.eigvalsh(I_CC)
+        bad = eig[:, 0] <= 1e-10 * np.maximum(eig[:, -1], 1e-300)
+        I_CC[bad] = np.eye(c)
+        proj = np.linalg.solve(I_CC, I_GC.transpose(0, 2, 1)).transpose(0, 2, 1)
+        V = I_GG - np.matmul(proj, I_GC.transpose(0, 2, 1))
+        U = U_G - np.matmul(proj, U_C[:, :, None])[:, :, 0]
+
+        eig = np.linalg.eigvalsh(V)
+        bad |= eig[:, 0] <= 1e-10 * np.maximum(eig[:, -1], 1e-300)
+        V[bad] = np.eye(k)
+        cov = np.linalg.inv(V)
+        beta = np.matmul(cov, U[:, :, None])[:, :, 0]
+        beta[bad] = np.nan
+        cov[bad] = np.nan
+        return beta, cov
+
+
+def least_squares(V, U, rss, df, scale):
+    """Coefficients of genotype terms of a stack of snvs on several
+    phenotypes, with covariates projected out of terms and phenotypes.
+    Snvs whose terms are collinear with the covariates, without residual
+    degrees of freedom, or fitting a phenotype exactly, get NaN.
+
+    :param V: cross products of projected terms shaped (snps, k, k).
+    :param U: cross products of projected terms and phenotypes shaped
+              (snps, k, phenos).
+    :param rss: residual sum of squares of phenotypes on covariates only,
+                shaped (snps, phenos).
+    :param df: residual degrees of freedom of the full models shaped (snps,).
+    :param scale: largest sum of squares of a term before projection, to
+                  which collinearity is relative.
+    :returns: coefficients (snps, phenos, k) and their covariance matrices
+              (snps, phenos, k, k).
+    """
+    k = V.shape[1]
+    eig = np.linalg.eigvalsh(V)
+    bad = (eig[:, 0] <= 1e-10 * np.maximum(scale, 1e-300)) | (df < 1)
+    V[bad] = np.eye(k)
+    inv = np.linalg.inv(V)
+    beta = np.matmul(inv, U)
+    sigma2 = (rss - (beta * U).sum(axis=1)) / np.maximum(df, 1)[:, None]
+    # no residual variance left, up to rounding of the sums of squares.
+    exact = sigma2 <= 1e-12 * np.maximum(rss / np.maximum(df, 1)[:, None], 1e-300)
+    sigma2[exact] = np.nan
+    cov = sigma2[:, :, None, None] * inv[:, None]
+    beta = beta.transpose(0, 2, 1).copy()
+    beta[exact] = np.nan
+    beta[bad] = np.nan
+    cov[bad] = np.nan
+    return beta, cov
+
+def t_stats(beta, cov, df, ci=0.95):
+    """t statistics of coefficients shaped (snps, phenos, k) with `df`
+    residual degrees of freedom of each snv, and the joint chi-square
+    p-value of the k terms."""
+    result = OrderedDict()
+    k = beta.shape[-1]
+    se = np.sqrt(np.diagonal(cov, axis1=2, axis2=3))
+    df = np.maximum(df, 1)[:, None, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        q = student_t.ppf(0.5 + ci / 2, df)
+        result['BETA'] = beta
+        result['SE'] = se
+        result['L95'] = beta - q * se
+        result['U95'] = beta + q * se
+        result['STAT'] = beta / se
+        result['P'] = 2 * student_t.sf(np.abs(beta / se), df)
+    joint = np.full(beta.shape[:2], np.nan)
+    ok = ~np.isnan(beta).any(axis=2)
+    if ok.any():
+        sub = np.linalg.inv(cov[ok])
+        joint[ok] = chi2.sf(np.einsum('xi,xij,xj->x', beta[ok], sub, beta[ok]), k)
+    return result, joint
+
+
+def read_covar(filename, samples):
+    """Covariates of plink covar file aligned to `samples`, NaN for -9."""
+    table = pd.read_table(filename, header=0, sep='\t', dtype={'IID': str})
+    table = table.set_index('IID').drop('FID', axis=1)
+    table = table.apply(pd.to_numeric, errors='coerce').replace(-9, np.nan)
+    return table.reindex([str(s) for s in samples])
+
+
+class LogisticScan:
+    """Logistic regression of case/control status on every snv under the
+    additive, dominant, recessive and het/hom models, what plink --logistic
+    with its model modifiers gives.
+
+    With `cutoff`, all snvs are score tested against the null model fitted
+    once, and only snvs of a score p-value below `cutoff`, or with missing
+    calls, are refitted. Statistics of the others are those of the score
+    test, with one-step estimates of OR and its confidence interval. All
+    snvs are refitted if the null model does not converge.
+
+    :param prefix: path of the bed fileset without extension.
+    :param covarfile: optional plink covar file.
+    :param memory: optional memory ceiling in MB for a block of snvs.
+    :param cutoff: optional p-value below which snvs are refitted.
+    """
+    def __init__(self, prefix, covarfile=None, memory=None, cutoff=None):
+        self.bed = BedReader(prefix)
+        self.memory = memory
+        self.cutoff = None if cutoff is None else float(cutoff)
+        pheno = self.bed.pheno()
+        self.y = (pheno == 2).astype(float)
+        self.valid = (pheno == 1) | (pheno == 2)
+        columns = [np.ones(len(pheno))]
+        self.covar_names = []
+        if covarfile is not None:
+            covar = read_covar(covarfile, self.bed.samples)
+            self.covar_names = list(covar.columns)
+            self.valid &= covar.notnull().all(axis=1).values
+            columns.extend(covar.fillna(0).values.T)
+        self.C = np.stack(columns, axis=1)
+        self.null = None
+        if cutoff is not None:
+            try:
+                self.null = NullLogistic(self.y, self.C, self.valid)
+            except Exception as e:
+                print('[NOTE] %s All snvs are fitted in full.' % e)
+
+    def block(self):
+        """Snvs fitted at a time, each taking a few float arrays of its
+        samples and genotype terms."""
+        nsamples = self.bed.shape[0]
+        return max(int(self.memory or 256) * 2 ** 20 // (8 * nsamples * 12), 1)
+
+    def run(self):
+        """Arrays keyed like 'ADD_P' or 'HOM_OR', with the joint 2 df test
+        of het/hom as 'HETHOM_P'."""
+        nsnps = self.bed.shape[1]
+        result = OrderedDict()
+        joint = {}
+        for model, terms in MODELS.items():
+            joint[model] = np.full(nsnps, np.nan)
+            for term in terms:
+                for field in FIELDS:
+                    result['%s_%s' % (term, field)] = np.full(nsnps, np.nan)
+
+        for snps, dosage in self.bed.iter_dosage(self.block()):
+            mask = (dosage.T >= 0) & self.valid
+            for model, terms in MODELS.items():
+                G = encode(dosage, model)
+                if self.null is None:
+                    beta, cov = logistic_irls(self.y, G, self.C, mask)
+                else:
+                    beta, cov = self.refit(G, mask, len(terms))
+                stats, joint[model][snps] = wald(beta, cov, len(terms))
+                for i, term in enumerate(terms):
+                    result['%s_NMISS' % term][snps] = mask.sum(axis=1)
+                    for field, values in stats.items():
+                        result['%s_%s' % (term, field)][snps] = values[:, i]
+
+        for model, terms in MODELS.items():
+            if len(terms) > 1:
+                result['%s_P' % model] = joint[model]
+        return result
+
+    def refit(self, G, mask, k):
+        """Score test snvs, and fit the full model of those below `cutoff`
+        and of those missing samples of the null model, which is not theirs,
+        returns coefficients and covariance matrices of genotype terms."""
+        beta, cov = self.null.score(G, mask)
+        _, p = wald(beta, cov, k)
+        partial = (mask != self.null.valid).any(axis=1)
+        with np.errstate(invalid='ignore'):
+            hit = np.flatnonzero((p < self.cutoff) | partial)
+        if hit.size:
+            full_beta, full_cov = logistic_irls(self.y, G[hit], self.C, mask[hit])
+            beta[hit] = full_beta[:, :k]
+            cov[hit] = full_cov[:, :k, :k]
+        return beta, cov
+
+    def save(self, filename):
+        """Save statistics into a npz file along with snv info of the bim."""
+        arrays = snv_arrays(self.bed)
+        arrays.update(self.run())
+        np.savez(filename, **arrays)
+        return filename
+
+
+class LinearScan:
+    """Linear regression of every quantitative phenotype of a plink pheno
+    file on every snv under the additive, dominant, recessive and het/hom
+    models, what plink --linear --all-pheno with its model modifiers gives.
+    Case/control phenotypes, coded 0/1/2, are left out as plink does.
+
+    Phenotypes missing the same samples are fitted together. Covariates of
+    their samples are projected out by one QR factorization, so the fits of
+    all of them on all snvs without missing calls are matrix products of the
+    projected terms and phenotypes. Snvs with missing calls have covariates
+    projected out over their own samples, by normal equations.
+
+    :param prefix: path of the bed fileset without extension.
+    :param phenofile: plink pheno file with a header of phenotype names.
+    :param covarfile: optional plink covar file.
+    :param memory: optional memory ceiling in MB for a block of snvs.
+    """
+    def __init__(self, prefix, phenofile, covarfile=None, memory=None):
+        self.bed = BedReader(prefix)
+        self.memory = memory
+        pheno = read_covar(phenofile, self.bed.samples)
+        self.phenos = [name for name in pheno.columns
+                       if not pheno[name].dropna().isin([0, 1, 2]).all()]
+        self.Y = pheno[self.phenos].values.astype(float)
+        valid = np.ones(len(self.bed.samples), dtype=bool)
+        columns = [np.ones(len(self.bed.samples))]
+        if covarfile is not None:
+            covar = read_covar(covarfile, self.bed.samples)
+            valid &= covar.notnull().all(axis=1).values
+            columns.extend(covar.fillna(0).values.T)
+        self.C = np.stack(columns, axis=1)
+        self.untested = []
+        self.groups = self.group(valid)
+
+    def group(self, valid):
+        """Phenotypes by samples they are fitted with, each group given as
+        (phenotypes, samples, Q) with Q the orthonormal basis of covariates
+        of the samples. Phenotypes explained by covariates are kept in
+        `untested`, their statistics are left NaN."""
+        samples = OrderedDict()
+        for j in range(len(self.phenos)):
+            mask = valid & ~np.isnan(self.Y[:, j])
+            samples.setdefault(mask.tobytes(), (mask, []))[1].append(j)
+        groups = []
+        for mask, phenos in samples.values():
+            Q, R = np.linalg.qr(self.C[mask])
+            diag = np.abs(np.diagonal(R))
+            if mask.sum() < self.C.shape[1] or diag.min() <= 1e-10 * max(diag.max(), 1e-300):
+                raise Exception('Covariates are collinear on samples of phenotype(s) <%s>.'
+                                % ','.join(self.phenos[j] for j in phenos))
+            # phenotypes given by covariates, e.g. also a covariate, leave no
+            # residual to test snvs on.
+            Y = self.Y[mask][:, phenos]
+            rss = ((Y - Q.dot(Q.T.dot(Y))) ** 2).sum(axis=0)
+            tss = ((Y - Y.mean(axis=0)) ** 2).sum(axis=0)
+            explained = rss <= 1e-10 * np.maximum(tss, 1e-300)
+            if explained.any():
+                names = [self.phenos[j] for j in np.array(phenos)[explained]]
+                print('[NOTE] Phenotype(s) %s explained by covariates, not tested.' % ','.join(names))
+                self.untested.extend(names)
+                phenos = [j for j, e in zip(phenos, explained) if not e]
+                if not phenos:
+                    continue
+            groups.append((np.array(phenos), mask, Q))
+        return groups
+
+    def block(self):
+        """Snvs fitted at a time, each taking a few float arrays of its
+        samples and genotype terms."""
+        nsamples = self.bed.shape[0]
+        return max(int(self.memory or 256) * 2 ** 20 // (8 * nsamples * 12), 1)
+
+    def run(self):
+        """Arrays shaped (phenotypes, snvs) keyed like 'ADD_P' or 'HOM_BETA',
+        with the joint 2 df test of het/hom as 'HETHOM_P'."""
+        shape = (len(self.phenos), self.bed.shape[1])
+        result = OrderedDict()
+        for model, terms in MODELS.items():
+            if len(terms) > 1:
+                result['%s_P' % model] = np.full(shape, np.nan)
+            for term in terms:
+                for field in LINEAR_FIELDS:
+                    result['%s_%s' % (term, field)] = np.full(shape, np.nan)
+
+        for snps, dosage in self.bed.iter_dosage(self.block()):
+            called = dosage.T >= 0
+            for model, terms in MODELS.items():
+                G = encode(dosage, model)
+                for phenos, samples, Q in self.groups:
+                    nmiss, df, beta, cov = self.fit(G[:, :, samples], called[:, samples],
+                                                    self.Y[samples][:, phenos], self.C[samples], Q)
+                    stats, joint = t_stats(beta, cov, df)
+                    rows = np.ix_(phenos, np.arange(snps.start, snps.stop))
+                    if len(terms) > 1:
+                        result['%s_P' % model][rows] = joint.T
+                    for i, term in enumerate(terms):
+                        result['%s_NMISS' % term][rows] = nmiss
+                        for field, values in stats.items():
+                            result['%s_%s' % (term, field)][rows] = values[:, :, i].T
+        return result
+
+    def fit(self, G, called, Y, C, Q):
+        """Fit a stack of snvs on phenotypes of the same samples.
+
+        :param G: genotype terms shaped (snps, k, samples).
+        :param called: called samples of each snv shaped (snps, samples).
+        :param Y: phenotypes shaped (samples, phenos).
+        :param C: intercept and covariates shaped (samples, c).
+        :param Q: orthonormal basis of `C`.
+        :returns: samples used and residual degrees of freedom of each snv,
+                  coefficients and covariance matrices of `least_squares`.
+        """
+        m, k, n = G.shape
+        c = C.shape[1]
+        nmiss = called.sum(axis=1)
+        df = nmiss - c - k
+        V = np.empty((m, k, k))
+        U = np.empty((m, k, Y.shape[1]))
+        rss = np.empty((m, Y.shape[1]))
+        scale = (G ** 2 * called[:, None, :]).sum(axis=2).max(axis=1)
+
+        complete = np.flatnonzero(nmiss == n)
+        if complete.size:
+            RY = Y - Q.dot(Q.T.dot(Y))
+            X = G[complete].reshape(-1, n)
+            RX = (X - X.dot(Q).dot(Q.T)).reshape(-1, k, n)
+            V[complete] = np.matmul(RX, RX.transpose(0, 2, 1))
+            U[complete] = RX.reshape(-1, n).dot(RY).reshape(-1, k, Y.shape[1])
+            rss[complete] = (RY ** 2).sum(axis=0)
+
+        partial = np.flatnonzero(nmiss < n)
+        if partial.size:
+            M = called[partial].astype(float)
+            Gp = G[partial] * M[:, None, :]
+            GG = np.matmul(Gp, Gp.transpose(0, 2, 1))
+            GC = Gp.reshape(-1, n).dot(C).reshape(-1, k, c)
+            CC = M.dot((C[:, :, None] * C[:, None, :]).reshape(n, c * c)).reshape(-1, c, c)
+            GY = Gp.reshape(-1, n).dot(Y).reshape(-1, k, Y.shape[1])
+            CY = M.dot((C[:, :, None] * Y[:, None, :]).reshape(n, -1)).reshape(-1, c, Y.shape[1])
+            eig = np.linalg.eigvalsh(CC)
+            bad = eig[:, 0] <= 1e-10 * np.maximum(eig[:, -1], 1e-300)
+            CC[bad] = np.eye(c)
+            df[partial[bad]] = 0
+            proj = np.linalg.solve(CC, GC.transpose(0, 2, 1)).transpose(0, 2, 1)
+            V[partial] = GG - np.matmul(proj, GC.transpose(0, 2, 1))
+            U[partial] = GY - np.matmul(proj, CY)
+            rss[partial] = M.dot(Y ** 2) - (CY * np.linalg.solve(CC, CY)).sum(axis=1)
+
+        beta, cov = least_squares(V, U, rss, df, scale)
+        return nmiss, df, beta, cov
+
+    def save(self, filename):
+        """Save statistics into a npz file along with snv info of the bim
+        and phenotype names, with those not tested as 'untested'."""
+        arrays = snv_arrays(self.bed)
+        arrays['phenos'] = np.array(self.phenos, dtype=str)
+        arrays['untested'] = np.array(self.untested, dtype=str)
+        arrays.update(self.run())
+        np.savez(filename, **arrays)
+        return filename
+
+
+def snv_arrays(bed):
+    """Snv names, chromosomes, positions and minor alleles of a bim."""
+    bim = bed.bim
+    return dict(snps=np.array(bed.snps), chrs=np.array([r[0] for r in bim]),
+                pos=np.array([r[3] for r in bim]), minor=np.array([r[4] for r in bim]))
+
+
+def load_scan(filename):
+    """Load a npz saved by `LogisticScan.save` or `LinearScan.save` into a
+    dict of arrays."""
+    with np.load(filename) as data:
+        return dict((key, data[key]) for key in data.files)
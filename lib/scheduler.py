@@ -0,0 +1,96 @@
+"""
+    scheduler module
+    ~~~~~~~~~~~~~~~~
+
+    Implements concurrent running of analysis stages.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class ProcessSlots:
+    """Budget of processes running at the same time, shared by all stages.
+    A slot is taken by `JobSet` only while an external process runs, by
+    stages computing in-process while they run, see `StageScheduler.add`,
+    and by the workers of `MaxTPermutation`. Stages waiting for each other
+    never hold one.
+
+    :param jobs: number of processes allowed at a time.
+    """
+    def __init__(self, jobs=1):
+        self.jobs = max(int(jobs or 1), 1)
+        self.semaphore = threading.BoundedSemaphore(self.jobs)
+
+
+class StageScheduler:
+    """Run stages as soon as the stages they depend on are done. Stages
+    run in threads, and their processes, or themselves if computing
+    in-process, are bounded by `ProcessSlots`.
+    Wall time of each stage is reported when all stages are done.
+
+    :param slots: a `ProcessSlots` instance.
+    """
+    def __init__(self, slots):
+        self.slots = slots
+        self.stages = OrderedDict()
+        self.timings = OrderedDict()
+
+    def add(self, name, func, after=(), inprocess=False):
+        """Declare a stage.
+
+        :param name: name of the stage.
+        :param func: a callable without arguments.
+        :param after: names of stages to be done before this one.
+        :param inprocess: whether the stage computes in this process rather
+                          than running external tools, it then holds a slot
+                          while it runs.
+        """
+        for dep in after:
+            if dep not in self.stages:
+                raise Exception('Unknown stage <%s> required by <%s>' % (dep, name))
+        if inprocess:
+            func = self.slotted(func)
+        self.stages[name] = (func, tuple(after))
+
+    def slotted(self, func):
+        def run():
+            with self.slots.semaphore:
+                return func()
+        return run
+
+    def timed(self, name, func):
+        start = time.time()
+        try:
+            return func()
+        finally:
+            self.timings[name] = time.time() - start
+
+    def run(self):
+        pending = OrderedDict(self.stages)
+        running = {}
+        done = set()
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as pool:
+            while pending or running:
+                for name in list(pending):
+                    func, after = pending[name]
+                    if set(after) <= done:
+                        del pending[name]
+                        running[pool.submit(self.timed, name, func)] = name
+                if not running:
+                    raise Exception('Stage dependencies can not be met: <%s>' % ','.join(pending))
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # errors of a stage are raised once running ones finish.
+                    future.result()
+                    done.add(name)
+        self.report(time.time() - start)
+
+    def report(self, total):
+        for name, seconds in self.timings.items():
+            print('[NOTE] stage %-12s %8.2fs' % (name, seconds))
+        print('[NOTE] %d stages in %.2fs with %d jobs' % (len(self.timings), total, self.slots.jobs))
@@ -0,0 +1,99 @@
+"""
+    snpindex module
+    ~~~~~~~~~~~~~~~
+
+    Implements the shared index of snv annotation.
+"""
+
+import re
+
+import numpy as np
+
+
+class SnpIndex:
+    """Snv annotation held in array backed columns, with a dict from snv id
+    to row for O(1) lookups. It is built once from SNPFILE, whose columns are
+    ['snp', 'chr', 'position', 'ref', 'alt', 'gene'] and gene is optional.
+    Columns beyond gene are kept as they are in `extras`.
+
+    :param records: a list of split lines of SNPFILE, header excluded.
+    :param has_gene: whether gene info is provided by SNPFILE.
+    :param nlines: number of lines of SNPFILE.
+    """
+    columns = ('snps', 'chrs', 'positions', 'refs', 'alts', 'genes')
+
+    def __init__(self, records, has_gene=False, nlines=0):
+        self.has_gene = has_gene
+        self.nlines = nlines
+        padded = [(r + [''] * 6)[:6] for r in records]
+        for n, name in enumerate(self.columns):
+            setattr(self, name, np.array([r[n] for r in padded], dtype=object))
+        self.extras = [r[6:] for r in records]
+        # indel regions like 180047739-180047741 span from start to end.
+        bounds = [self.parse_pos(p) for p in self.positions]
+        self.starts = np.array([b[0] for b in bounds], dtype=np.int64)
+        self.ends = np.array([b[1] for b in bounds], dtype=np.int64)
+        self.rows = dict((snp, n) for n, snp in enumerate(self.snps))
+
+    @classmethod
+    def from_file(cls, filename):
+        """Parse SNPFILE once."""
+        records = []
+        has_gene = False
+        nlines = 0
+        with open(filename, 'rt') as fh:
+            for line in fh:
+                nlines += 1
+                if re.match(r'^\s+$', line):
+                    continue
+                arr = line.split()
+                if nlines == 1:
+                    if not set(arr) & set(['Gene', 'Chr', 'Position', 'ref', 'alt']):
+                        raise Exception('Loss file header <%s>' % filename)
+                    if len(arr) > 5 or re.match(r'GENE', arr[-1], re.I):
+                        has_gene = True
+                    continue
+                records.append(arr)
+        return cls(records, has_gene, nlines)
+
+    @staticmethod
+    def parse_pos(pos):
+        """Start and end of a position, e.g. 180047739-180047741."""
+        arr = pos.split('-')
+        try:
+            return int(arr[0]), int(arr[-1])
+        except ValueError:
+            raise Exception('Malformed snv position <%s>' % pos)
+
+    def __len__(self):
+        return len(self.snps)
+
+    def __contains__(self, snp):
+        return snp in self.rows
+
+    def row(self, snp):
+        return self.rows.get(snp, None)
+
+    def get(self, snp, column, default=None):
+        """Value of a column for snv, e.g. index.get('rs6163', 'chrs')."""
+        n = self.rows.get(snp, None)
+        if n is None:
+            return default
+        return getattr(self, column)[n]
+
+    def gene_snps(self):
+        """Snvs of each gene, in the order of SNPFILE."""
+        genes = {}
+        for snp, gene in zip(self.snps, self.genes):
+            if gene.strip():
+                genes.setdefault(gene, []).append(snp)
+        return genes
+
+    def to_file(self, filename):
+        """Write the index in the format of SNPFILE."""
+        header = ['snp', 'Chr', 'Position', 'ref', 'alt'] + (['Gene'] if self.has_gene else [])
+        with open(filename, 'wt') as fh:
+            fh.write('\t'.join(header) + '\n')
+            for n in range(len(self)):
+                row = [getattr(self, name)[n] for name in self.columns[:len(header)]]
+                fh.write('\t'.join(row) + '\n')
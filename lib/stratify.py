@@ -6,11 +6,17 @@
 """
 
 import os
+import errno
+import shutil
+import tempfile
 from shutil import copyfile
 from itertools import combinations
 
+import numpy as np
 import pandas as pd
-from .utils import dir_check, parse_column
+from .utils import dir_check, parse_column, infer_dtypes
+from .genotype import GenoMatrix, CELL_BYTES
+from .vcf import VcfReader, is_vcf
 
 
 class Stratify:
@@ -23,6 +29,7 @@ class Stratify:
     :param assoc_inst: an instance of AssocStudy
     """
     def __init__(self, assoc_inst):
+        self.asinst = assoc_inst
         self.config = assoc_inst.config
         self.root_path = self.config.get('ROUTINE', '')
         self.geno_file = self.config.get('GENOFILE', '')
@@ -37,24 +44,14 @@ class Stratify:
         self.hapfile = self.config.get('HAPFILE', '')
         self.chi_test = self.config.get('CHI_TEST', '')
         self.ttest = self.config.get('TTEST', '')
+        self.memory = self.config.get('MEMORY_LIMIT', None)
 
     def load_table(self):
-        try:
-            self.geno_tab = pd.read_table(self.geno_file, header=0, index_col=0, sep='\t')
-            # geno_tab.replace('\/', ' ', regex=True, inplace=True)
-            # self.geno_tab = geno_tab.fillna('0 0')
-        except IOError as e:
-            if e.errno in (errno.ENOENT, errno.EISDIR):
-                e.strerror = 'Unable to load geno_file <%s>' % e.strerror
-                raise Exception()
-            raise Exception('Melformed geno_file <%s>' % e.strerror)
-
+        """Load phenotype file, genotypes are streamed later by `split_geno`."""
         try:
             info_tab = pd.read_table(self.info_file, header=0, index_col=0, sep='\t')
-
-            if self.gender_col:
-                info_tab.iloc[:, self.gender_col - 1].fillna('-9')
-            self.info_tab = info_tab
+            # missing values are kept blank in sample.info of sub-projects.
+            self.info_tab = infer_dtypes(info_tab)
             self.info_names = self.info_tab.columns
         except IOError as e:
             if e.errno in (errno.ENOENT, errno.EISDIR):
@@ -64,10 +61,53 @@ class Stratify:
 
     def go(self):
         self.load_table()
+        subsets = []
         for group in self.stratify:
             combinates, col, n = self.strati_groups(group)
             for combinate in combinates:
-                self.sample_by_combinate(combinate, col, n)
+                subsets.append(self.sample_by_combinate(combinate, col, n))
+        self.split_geno(subsets)
+
+    def split_geno(self, subsets):
+        """Write genotypes of all sub-projects, samples in the order of
+        sample.info. Lines of genotype file are copied as they are, found by
+        their offsets recorded in one pass, so only one line lives in memory
+        at a time. Vcf genotype file is encoded first and decoded chunk by
+        chunk.
+
+        :param subsets: a list of (samples, genofile) pairs.
+        """
+        if is_vcf(self.geno_file):
+            self.split_vcf(subsets)
+            return
+        try:
+            offsets = {}
+            with open(self.geno_file, 'rb') as fh:
+                header = fh.readline()
+                offset = fh.tell()
+                for line in iter(fh.readline, b''):
+                    if line.strip():
+                        offsets[line.split(b'\t', 1)[0].decode()] = offset
+                    offset = fh.tell()
+                for samples, genofile in subsets:
+                    names = [str(name) for name in samples]
+                    absent = [name for name in names if name not in offsets]
+                    if absent:
+                        print('[NOTE] %d samples of %s not in geno_file, skipped: %s' % (
+                            len(absent), genofile, ', '.join(absent[:10])))
+                    with open(genofile, 'wb') as out:
+                        out.write(header)
+                        for name in names:
+                            if name not in offsets:
+                                continue
+                            fh.seek(offsets[name])
+                            line = fh.readline()
+                            out.write(line if line.endswith(b'\n') else line + b'\n')
+        except IOError as e:
+            if e.errno in (errno.ENOENT, errno.EISDIR):
+                e.strerror = 'Unable to load geno_file <%s>' % e.strerror
+                raise Exception()
+            raise Exception('Melformed geno_file <%s>' % e.strerror)
 
     def strati_groups(self, group):
         """decide stratification groups by cols and n provided by user.
@@ -85,6 +125,40 @@ class Stratify:
                 raise Exception('%s variable contains values %s less than 2, not enough for grouping' %(col_name, col_values))
         return combinates, col, n
 
+    def split_vcf(self, subsets):
+        """Decode calls of samples of each sub-project from encoded vcf. The
+        vcf is encoded into a directory of its own under ROUTINE/tmp, apart
+        from the genotype matrix of the main project, and removed after."""
+        tmproot = os.path.join(self.root_path, 'tmp')
+        dir_check(tmproot)
+        tmpdir = tempfile.mkdtemp(prefix='stratify-', dir=tmproot)
+        try:
+            genotypes = VcfReader(self.geno_file, self.memory, tmpdir).encode()
+            position = dict((name, n) for n, name in enumerate(genotypes.samples))
+            if self.memory:
+                step = max(int(self.memory) * 2 ** 20 // (CELL_BYTES * max(genotypes.shape[1], 1)), 1)
+            else:
+                step = max(len(genotypes.samples), 1)
+            for samples, genofile in subsets:
+                names = [str(name) for name in samples]
+                absent = [name for name in names if name not in position]
+                if absent:
+                    print('[NOTE] %d samples of %s not in geno_file, skipped: %s' % (
+                        len(absent), genofile, ', '.join(absent[:10])))
+                    names = [name for name in names if name in position]
+                mode = 'w'
+                for start in range(0, max(len(names), 1), step):
+                    chunk = names[start: start + step]
+                    rows = np.array([position[name] for name in chunk], dtype=np.intp)
+                    part = GenoMatrix(chunk, genotypes.snps, genotypes.codes[rows], genotypes.alleles)
+                    calls = pd.DataFrame(part.calls(sep='/', missing=''),
+                                         index=pd.Index(chunk, name='sample'), columns=genotypes.snps)
+                    calls.to_csv(genofile, header=(mode == 'w'), index=True, sep='\t', mode=mode)
+                    mode = 'a'
+            del genotypes
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
     def sample_by_combinate(self, combinate, strati_col, n):
         """Extracting samples from sample.info according to combinate.
 
@@ -106,7 +180,10 @@ class Stratify:
         data_path = os.path.join(strati_root, 'data')
         dir_check(data_path)
         snpfile = os.path.join(data_path, 'anno.txt')
-        copyfile(self.snp_file, snpfile)
+        if self.snp_file:
+            copyfile(self.snp_file, snpfile)
+        else:
+            self.asinst.snp_index.to_file(snpfile)
         strati_infofile = os.path.join(data_path, 'sample.info')
         strati_genofile = os.path.join(data_path, 'sample.geno')
         if n == 1:
@@ -122,10 +199,9 @@ class Stratify:
             # tmp_info.iloc[:, 0][tmp_info.iloc[:, strati_col] == combinate[0]] = 'case'
             # tmp_info.iloc[:, 0][tmp_info.iloc[:, strati_col] == combinate[1]] = 'control'
         samples = tmp_info.index
-        tmp_geno = self.geno_tab.loc[samples]
-        tmp_info.apply(self.convert_dtype).to_csv(strati_infofile, header=True, index=True, sep='\t')
-        tmp_geno.to_csv(strati_genofile, header=True, index=True, sep='\t')
+        tmp_info.to_csv(strati_infofile, header=True, index=True, sep='\t')
         self.print_configfile(strati_genofile, strati_infofile, snpfile, strati_root)
+        return samples, strati_genofile
 
     def print_configfile(self, fgeno, finfo, fsnp, root_path):
         config_model ="""ROUTINE = '{rootpath}'
@@ -152,14 +228,3 @@ TTEST = {ttest}
         filename = os.path.join(root_path, 'config.ini')
         with open(filename, 'wt') as fh:
             fh.write(config_model.format_map(tmpdict))
-
-    @staticmethod
-    def convert_dtype(x):
-        try:
-            return x.astype(int)
-        except:
-            return x
-
-
-
-
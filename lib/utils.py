@@ -7,17 +7,63 @@
 
 import os
 import re
+import hashlib
+
+import numpy as np
+import pandas as pd
 
 
 
 def dir_check(dirname):
-    if os.path.exists(dirname):
-        return
-    os.makedirs(dirname)
+    # stages running concurrently may create the same directory.
+    os.makedirs(dirname, exist_ok=True)
 
 def file_check(filename):
     return os.path.isfile(filename)
 
+def file_digest(filename, blocksize=2 ** 20):
+    """sha1 hex digest of the content of a file."""
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as fh:
+        for block in iter(lambda: fh.read(blocksize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def infer_dtypes(table, na_value=None):
+    """Settle the dtype of each column of a table once when it is loaded,
+    so that writers can emit typed data directly.
+
+    Columns of numbers given as text are turned numeric, columns holding only
+    whole numbers within int64 become int64 and the others keep float. Missing values of
+    text columns, and of whole number columns which could not be int64 with
+    them, are filled with `na_value`; float columns keep NaN, which is left
+    to `na_rep` of `to_csv`.
+
+    :param table: a DataFrame.
+    :param na_value: value for missing data, e.g. -9, None to keep NaN.
+    """
+    typed = table.copy()
+    for col in typed.columns:
+        series = typed[col]
+        missing = series.isnull()
+        # text is of object dtype, or of the string dtype of later pandas.
+        text = series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+        if text:
+            numeric = pd.to_numeric(series, errors='coerce')
+            if numeric.notnull().sum() == (~missing).sum():
+                series = numeric
+        if series.dtype.kind == 'f':
+            called = series[~missing]
+            # inf and values beyond int64 are whole but kept as float.
+            fits = np.isfinite(called).all() and (np.abs(called) < 2 ** 63).all()
+            if fits and (called == np.floor(called)).all() and \
+                    (not missing.any() or na_value is not None):
+                series = series.fillna(na_value).astype(np.int64)
+        elif text and series.dtype.kind not in 'iuf' and na_value is not None:
+            series = series.fillna(str(na_value))
+        typed[col] = series
+    return typed
+
 def parse_column(val):
     cols = []
     val = str(val)
@@ -41,7 +87,15 @@ def formater_type(values, positions, formater):
             pass
     return fmt
 
+def to_float(value):
+    """Number of a report cell, NaN for 'NA' or blanks."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
 def print_readme(sheet, readmefile, formater):
+    """Write readme lines into a sheet, returns the next row."""
     sheet.set_column(0, 0, 30)
     sheet.set_column(1, 1, 60)
     row = 0
@@ -51,6 +105,7 @@ def print_readme(sheet, readmefile, formater):
             for i, j in enumerate(arr):
                 sheet.write(row, i, j, formater.normal)
             row += 1
+    return row
 
 
 
@@ -0,0 +1,175 @@
+"""
+    vcf module
+    ~~~~~~~~~~
+
+    Implements streaming reader of plain and bgzipped VCF genotype files.
+"""
+
+import re
+import gzip
+
+import numpy as np
+import pandas as pd
+
+from .genotype import GenoMatrix, GenoReader, MISSING, CELL_BYTES, check_alleles
+from .snpindex import SnpIndex
+
+
+def is_vcf(filename):
+    return re.search(r'\.vcf(\.b?gz)?$', str(filename), re.I) is not None
+
+def open_vcf(filename):
+    """Open a VCF as text, bgzip files are a series of gzip members and
+    decompressed on the fly by gzip module."""
+    if re.search(r'\.b?gz$', filename, re.I):
+        return gzip.open(filename, 'rt')
+    return open(filename, 'rt')
+
+
+class VcfReader(GenoReader):
+    """Stream a VCF record by record into a `GenoMatrix`.
+
+    Records are parsed in chunks bounded by `memory`, GT fields are turned into
+    allele index pairs, and alleles of each record are reordered by count so
+    that the major allele gets index 0, the same as tab separated genotypes.
+    Haploid calls are taken as homozygous.
+
+    :param filename: a .vcf or .vcf.gz file.
+    :param memory: optional memory ceiling in MB for a chunk of records.
+    :param tmpdir: directory for the disk backed matrix, required by `memory`.
+    """
+    def __init__(self, filename, memory=None, tmpdir=None):
+        self.filename = filename
+        self.memory = memory
+        self.tmpdir = tmpdir
+
+        samples = None
+        self.sites = []
+        with open_vcf(self.filename) as fh:
+            for line in fh:
+                if line.startswith('##'):
+                    continue
+                if line.startswith('#'):
+                    samples = line.rstrip('\r\n').split('\t')[9:]
+                    continue
+                if not line.strip():
+                    continue
+                self.sites.append(self.parse_site(line.split('\t', 5)))
+        if samples is None:
+            raise Exception('Malformed vcf file <%s>, loss #CHROM header' % self.filename)
+        self.samples = samples
+        self.nsamples = len(samples)
+        self.snps = [site[0] for site in self.sites]
+        seen = set()
+        for snp in self.snps:
+            if snp in seen:
+                raise Exception('Duplicate ID in vcf file <%s>' % snp)
+            seen.add(snp)
+
+    @staticmethod
+    def parse_site(arr):
+        """(snp, chr, position, ref, alt) of a record, snv named by ID or
+        chr:pos, deletions given as region like 180047739-180047741."""
+        chrs, pos, name, ref, alt = arr[:5]
+        snp = name if name != '.' else '%s:%s' % (chrs, pos)
+        if len(ref) > 1:
+            pos = '%s-%d' % (pos, int(pos) + len(ref) - 1)
+        return snp, chrs, pos, ref, alt
+
+    def snp_index(self):
+        """`SnpIndex` built from CHROM/POS/ID/REF/ALT, no gene info."""
+        return SnpIndex([list(site) for site in self.sites], False, len(self.sites) + 1)
+
+    def chunksize(self):
+        """Records of a chunk that fit into the memory ceiling."""
+        if not self.memory:
+            return max(len(self.snps), 1)
+        cells = int(self.memory) * 2 ** 20 // CELL_BYTES
+        return max(cells // max(self.nsamples, 1), 1)
+
+    def iter_chunks(self):
+        """Yield lists of consecutive records, each split into columns."""
+        step = self.chunksize()
+        chunk = []
+        with open_vcf(self.filename) as fh:
+            for line in fh:
+                if line.startswith('#') or not line.strip():
+                    continue
+                chunk.append(line.rstrip('\r\n').split('\t'))
+                if len(chunk) == step:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def gt_fields(self, record):
+        fmt = record[8].split(':') if len(record) > 8 else []
+        if 'GT' not in fmt:
+            return ['.'] * self.nsamples
+        n = fmt.index('GT')
+        return [(f.split(':')[n: n + 1] or ['.'])[0] for f in record[9:]]
+
+    @staticmethod
+    def parse_gt(gt):
+        """Split a GT field into allele indexes of the record."""
+        pair = re.split(r'[/|]', gt)
+        if len(pair) == 1:
+            pair = pair * 2
+        if len(pair) != 2:
+            raise Exception('Malformed genotype <%s>' % gt)
+        if '.' in pair or '' in pair:
+            return MISSING, MISSING
+        try:
+            return int(pair[0]), int(pair[1])
+        except ValueError:
+            raise Exception('Malformed genotype <%s>' % gt)
+
+    def encode_records(self, records):
+        """Encode a chunk of records into codes shaped (samples, records, 2)
+        and allele tuples of the records."""
+        gts = np.array([self.gt_fields(r) for r in records], dtype=object)
+        if gts.shape[1] != self.nsamples:
+            raise Exception('Malformed vcf file <%s>, samples not match' % self.filename)
+        # distinct GT strings are parsed only once.
+        keys, uniques = pd.factorize(gts.ravel())
+        pairs = np.array([self.parse_gt(u) for u in uniques] + [(MISSING, MISSING)],
+                         dtype=np.int32).reshape(-1, 2)
+        idx = pairs[keys].reshape(gts.shape + (2,))
+
+        names = [[r[3]] + [a for a in r[4].split(',') if a != '.'] for r in records]
+        check_alleles([self.parse_site(r)[0] for r in records], names)
+        nalleles = max(len(n) for n in names)
+        # checked by record, a chunk wide bound lets a record index alleles of another.
+        top = idx.reshape(len(records), -1).max(axis=1)
+        beyond = np.nonzero(top >= np.array([len(n) for n in names]))[0]
+        if len(beyond):
+            raise Exception('Malformed vcf file, allele index out of ALT of record <%s>' %
+                            self.parse_site(records[beyond[0]])[0])
+        rec_idx = np.broadcast_to(np.arange(len(records))[:, None, None], idx.shape)
+        called = idx != MISSING
+        counts = np.bincount(rec_idx[called] * nalleles + idx[called],
+                             minlength=len(records) * nalleles).reshape(len(records), nalleles)
+        # ties keep the VCF order, i.e. REF first.
+        order = np.argsort(-counts, axis=1, kind='mergesort')
+        rank = np.empty_like(order)
+        rank[np.arange(len(records))[:, None], order] = np.arange(nalleles)
+        present = (counts > 0).sum(axis=1)
+        alleles = [tuple(names[j][k] for k in order[j, :present[j]]) for j in range(len(records))]
+
+        codes = np.full(idx.shape, MISSING, dtype=np.int8)
+        codes[called] = rank[rec_idx[called], idx[called]]
+        return codes.transpose(1, 0, 2), alleles
+
+    def encode(self):
+        """Encode the whole file into a `GenoMatrix` chunk by chunk."""
+        codes = self.allocate('geno_codes.npy', np.int8)
+        alleles = []
+        start = 0
+        for records in self.iter_chunks():
+            block, names = self.encode_records(records)
+            codes[:, start: start + len(records)] = block
+            alleles.extend(names)
+            start += len(records)
+        if self.memory:
+            codes.flush()
+        return GenoMatrix(self.samples, self.snps, codes, alleles)
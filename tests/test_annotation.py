@@ -0,0 +1,69 @@
+"""
+    Gene region and frequency annotation of `annotation` on small tables of
+    the annovar formats.
+"""
+
+import numpy as np
+
+from lib.annotation import GeneIndex, SiteFrequency, SnvAnnotation
+from lib.snpindex import SnpIndex
+
+
+# bin, name, chrom, strand, txStart, txEnd, cdsStart, cdsEnd, exonCount,
+# exonStarts, exonEnds, score, name2 of UCSC refGene.
+REFGENE = [
+    ('0', 'NM_1', 'chr1', '+', 1000, 5000, 1200, 4500, 3, '1000,2000,4000,', '1500,2500,5000,', '0', 'G1'),
+    ('0', 'NR_2', 'chr1', '-', 30000, 32000, 32000, 32000, 2, '30000,31500,', '31000,32000,', '0', 'G2'),
+    ('0', 'NM_3', 'chr1', '+', 1200, 1400, 1200, 1400, 1, '1200,', '1400,', '0', 'G3'),
+    ]
+
+SITES = [
+    ('1', 1300, 'A', 'G', 0.25),
+    ('1', 1300, 'A', 'T', 0.01),
+    ('2', 100, 'C', 'T', 0.5),
+    ]
+
+# position and the region, genes and mRNAs annovar gives.
+EXPECTED = [
+    ('1', 1001, 'UTR5', 'G1', ''),
+    ('1', 1300, 'exonic', 'G1,G3', 'NM_1,NM_3'),
+    ('1', 1505, 'splicing', 'G1', ''),
+    ('1', 1800, 'intronic', 'G1', ''),
+    ('1', 4800, 'UTR3', 'G1', ''),
+    ('1', 500, 'upstream', 'G1,G3', ''),
+    ('1', 5500, 'downstream', 'G1', ''),
+    ('1', 20000, 'intergenic', 'G1(dist=15000),G2(dist=10001)', ''),
+    ('1', 30500, 'ncRNA_exonic', 'G2', ''),
+    ('1', 31200, 'ncRNA_intronic', 'G2', ''),
+    ('2', 100, 'intergenic', 'NONE(dist=NONE),NONE(dist=NONE)', ''),
+    ]
+
+
+def write_table(filename, rows):
+    with open(filename, 'wt') as fh:
+        for row in rows:
+            fh.write('\t'.join(str(v) for v in row) + '\n')
+    return filename
+
+def test_gene_regions(tmp_path):
+    genes = GeneIndex(GeneIndex.build(write_table(str(tmp_path / 'refGene.txt'), REFGENE)))
+    chroms, positions, regions, names, mrnas = zip(*EXPECTED)
+    assert genes.annotate(chroms, positions) == (list(regions), list(names), list(mrnas))
+
+def test_site_frequency_matches_alleles(tmp_path):
+    sites = SiteFrequency(SiteFrequency.build(write_table(str(tmp_path / 'sites.txt'), SITES)))
+    freqs = sites.lookup(['1', '1', '1', '2'], [1300, 1300, 1301, 100], ['A', 'A', 'A', 'C'],
+                         ['T', 'C', 'G', 'T'])
+    assert np.allclose(freqs, [0.01, np.nan, np.nan, 0.5], equal_nan=True)
+
+def test_snv_annotation(tmp_path):
+    genes = GeneIndex(GeneIndex.build(write_table(str(tmp_path / 'refGene.txt'), REFGENE)))
+    sites = SiteFrequency(SiteFrequency.build(write_table(str(tmp_path / 'sites.txt'), SITES)))
+    index = SnpIndex([['rs1', 'chr1', '1300', 'A', 'G'], ['rs2', '2', '100', 'C', 'T'],
+                      ['rs3', '1', '1800-1802', 'ACG', '-']])
+    result = SnvAnnotation(index, genes, sites).run()
+    assert list(result['REGION']) == ['exonic', 'intergenic', 'intronic']
+    assert list(result['GENE'])[0] == 'G1,G3'
+    assert np.allclose(result['G1000'], [0.25, 0.5, np.nan], equal_nan=True)
+    bare = SnvAnnotation(index).run()
+    assert list(bare['REGION']) == [''] * 3 and np.isnan(bare['G1000']).all()
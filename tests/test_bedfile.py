@@ -0,0 +1,72 @@
+"""
+    Plink binary files written and read by `bedfile`.
+"""
+
+import numpy as np
+import pytest
+
+from lib.bedfile import BED_MAGIC, BedReader, pack_dosage, write_bed, write_bim
+from lib.genotype import GenoMatrix
+
+
+def write_fileset(prefix, dosage, alleles):
+    write_bed(prefix + '.bed', [dosage])
+    write_bim(prefix + '.bim', [('1', 'rs%d' % n, n + 1, a1, a2) for n, (a2, a1) in enumerate(alleles)])
+    with open(prefix + '.fam', 'wt') as fh:
+        for n in range(dosage.shape[0]):
+            fh.write('f%d s%d 0 0 1 %d\n' % (n, n, n % 2 + 1))
+    return BedReader(prefix)
+
+
+def test_pack_dosage_bytes():
+    # hom A1 00, het 10, hom A2 11, missing 01, the first sample lowest,
+    # and the last byte padded with missing codes.
+    dosage = np.array([[2], [1], [0], [-1], [2]], dtype=np.int8)
+    assert pack_dosage(dosage).tolist() == [[0b01111000, 0b01010100]]
+
+def test_write_bed_by_blocks(tmp_path):
+    state = np.random.RandomState(0)
+    dosage = state.randint(-1, 3, size=(7, 10)).astype(np.int8)
+    filename = str(tmp_path / 'sample.bed')
+    write_bed(filename, [dosage[:, :4], dosage[:, 4:9], dosage[:, 9:]])
+    with open(filename, 'rb') as fh:
+        content = fh.read()
+    assert content[:3] == BED_MAGIC
+    assert content[3:] == pack_dosage(dosage).tobytes()
+
+def test_write_bim(tmp_path):
+    filename = str(tmp_path / 'sample.bim')
+    write_bim(filename, [('1', 'rs1', 100, 'A', 'G'), ('X', 'rs2', 5, '0', 'T')])
+    with open(filename, 'rt') as fh:
+        assert fh.read() == '1\trs1\t0\t100\tA\tG\nX\trs2\t0\t5\t0\tT\n'
+
+def test_reader_round_trip(tmp_path):
+    state = np.random.RandomState(1)
+    dosage = state.randint(-1, 3, size=(9, 6)).astype(np.int8)
+    bed = write_fileset(str(tmp_path / 'sample'), dosage, [('C', 'A')] * 6)
+    assert bed.shape == (9, 6)
+    assert (bed.dosage() == dosage).all()
+    assert (bed.dosage([4, 1]) == dosage[:, [4, 1]]).all()
+    assert (bed.dosage(slice(2, 5), [8, 0, 5]) == dosage[[8, 0, 5], 2:5]).all()
+    blocks = [block for block, _ in bed.iter_dosage(4)]
+    assert blocks == [slice(0, 4), slice(4, 6)]
+    assert (np.hstack([d for _, d in bed.iter_dosage(4)]) == dosage).all()
+    assert bed.pheno().tolist() == [1, 2] * 4 + [1]
+    assert (bed.index(['rs3', 'rs0']) == [3, 0]).all()
+
+def test_calls_match_genotype_matrix(tmp_path):
+    codes = np.array([[[0, 1], [0, 0]], [[1, 1], [-1, -1]], [[0, 0], [1, 0]]], dtype=np.int8)
+    alleles = [('C', 'A'), ('G', 'T')]
+    genotypes = GenoMatrix(['s0', 's1', 's2'], ['rs0', 'rs1'], codes, alleles)
+    bed = write_fileset(str(tmp_path / 'sample'), genotypes.dosage(), alleles)
+    assert bed.minor_major() == genotypes.minor_major()
+    # bed keeps dosages only, calls come back minor allele first.
+    assert bed.calls([0, 1], sep='/').tolist() == [['A/C', 'G/G'], ['A/A', '0 0'], ['C/C', 'T/G']]
+
+def test_reader_rejects_sample_major_bed(tmp_path):
+    bed = write_fileset(str(tmp_path / 'sample'), np.zeros((4, 2), dtype=np.int8), [('C', 'A')] * 2)
+    with open(bed.prefix + '.bed', 'r+b') as fh:
+        fh.seek(2)
+        fh.write(bytes([0x00]))
+    with pytest.raises(Exception, match='snv-major'):
+        BedReader(bed.prefix)
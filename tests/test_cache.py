@@ -0,0 +1,116 @@
+"""
+    Content addressed caches of `cache`.
+"""
+
+import os
+
+import numpy as np
+
+from lib import cache
+from lib.cache import TableCache, RunCache
+from lib.genotype import GenoMatrix
+
+
+def counting(table):
+    built = []
+
+    def build():
+        built.append(1)
+        return table
+    return build, built
+
+def test_table_fetched_once_per_content(tmp_path):
+    source = tmp_path / 'info.txt'
+    source.write_text('a\tb\n')
+    tables = TableCache(str(tmp_path / 'cache'))
+    build, built = counting({'rows': 1})
+    assert tables.fetch('info', str(source), build) == {'rows': 1}
+    assert tables.fetch('info', str(source), build) == {'rows': 1}
+    assert TableCache(str(tmp_path / 'cache')).fetch('info', str(source), build) == {'rows': 1}
+    assert len(built) == 1
+
+    old = tables.entry('info', str(source))
+    source.write_text('a\tb\nc\td\n')
+    build, built = counting({'rows': 2})
+    assert tables.fetch('info', str(source), build) == {'rows': 2}
+    assert len(built) == 1
+    # only the latest entry of a kind is kept.
+    assert not os.path.exists(old)
+
+def test_version_bump_misses(tmp_path, monkeypatch):
+    source = tmp_path / 'refGene.txt'
+    source.write_text('x\n')
+    tables = TableCache(str(tmp_path / 'cache'))
+    build, built = counting({'starts': np.arange(3)})
+    tables.fetch_arrays('refgene', str(source), build)
+    monkeypatch.setitem(cache.VERSIONS, 'refgene', cache.VERSIONS['refgene'] + 1)
+    arrays = tables.fetch_arrays('refgene', str(source), build)
+    assert len(built) == 2
+    assert (arrays['starts'] == np.arange(3)).all()
+
+def test_retired_kinds_purged(tmp_path):
+    os.makedirs(str(tmp_path / 'cache' / 'snp-v1-abc'))
+    TableCache(str(tmp_path / 'cache'))
+    assert not os.path.exists(str(tmp_path / 'cache' / 'snp-v1-abc'))
+
+def test_genotypes_memory_mapped(tmp_path):
+    source = tmp_path / 'sample.geno'
+    source.write_text('calls\n')
+    codes = np.array([[[0, 1], [0, 0]], [[1, 1], [-1, -1]]], dtype=np.int8)
+    genotypes = GenoMatrix(['s0', 's1'], ['rs0', 'rs1'], codes, [('C', 'A'), ('G',)])
+    tables = TableCache(str(tmp_path / 'cache'))
+    tables.fetch_genotypes(str(source), lambda: genotypes)
+    cached = TableCache(str(tmp_path / 'cache')).fetch_genotypes(str(source), None)
+    assert isinstance(cached.codes, np.memmap)
+    assert (cached.codes == codes).all()
+    assert cached.alleles == genotypes.alleles
+    assert list(cached.samples) == ['s0', 's1'] and list(cached.snps) == ['rs0', 'rs1']
+
+def test_run_outputs_restored(tmp_path):
+    source = tmp_path / 'sample.bed'
+    source.write_text('genotypes')
+    out = tmp_path / 'result.assoc'
+    commands = ['plink', '--bfile', 'sample', '--assoc']
+    patterns = [str(tmp_path / 'result.*')]
+    runs = RunCache(str(tmp_path / 'cache'))
+
+    pending = runs.prepare(commands, [str(source)], patterns)
+    assert pending is not None
+    out.write_text('first')
+    runs.keep(pending, patterns, 0)
+
+    out.unlink()
+    assert runs.prepare(commands, [str(source)], patterns) is None
+    assert out.read_text() == 'first'
+    # another command, or changed inputs, run again.
+    assert runs.prepare(commands + ['--ci', '0.95'], [str(source)], patterns) is not None
+    source.write_text('other genotypes')
+    assert runs.prepare(commands, [str(source)], patterns) is not None
+
+def test_failed_or_uncacheable_runs_not_kept(tmp_path):
+    source = tmp_path / 'sample.bed'
+    source.write_text('genotypes')
+    out = tmp_path / 'result.assoc'
+    patterns = [str(tmp_path / 'result.*')]
+    runs = RunCache(str(tmp_path / 'cache'))
+    pending = runs.prepare(['plink'], [str(source)], patterns)
+    out.write_text('partial')
+    runs.keep(pending, patterns, 1)
+    assert runs.prepare(['plink'], [str(source)], patterns) is not None
+    assert runs.key(['plink'], [str(tmp_path / 'absent.bed')]) is None
+
+def test_unchanged_files_not_stored(tmp_path):
+    source = tmp_path / 'sample.bed'
+    source.write_text('genotypes')
+    stale = tmp_path / 'result.log'
+    stale.write_text('earlier run')
+    patterns = [str(tmp_path / 'result.*')]
+    runs = RunCache(str(tmp_path / 'cache'))
+    pending = runs.prepare(['plink'], [str(source)], patterns)
+    (tmp_path / 'result.assoc').write_text('new')
+    runs.keep(pending, patterns, 0)
+    stale.unlink()
+    (tmp_path / 'result.assoc').unlink()
+    assert runs.prepare(['plink'], [str(source)], patterns) is None
+    assert (tmp_path / 'result.assoc').read_text() == 'new'
+    assert not stale.exists()
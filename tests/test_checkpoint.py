@@ -0,0 +1,86 @@
+"""
+    Resuming batch runs by the `StageManifest` of `checkpoint`.
+"""
+
+import os
+import types
+
+import pytest
+
+from lib.cache import TableCache
+from lib.checkpoint import StageManifest
+
+
+def study(root, **config):
+    os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+    config.setdefault('JOBS', '2')
+    config['ROUTINE'] = root
+    return types.SimpleNamespace(config=config, cache=TableCache(os.path.join(root, 'tmp/cache')))
+
+def writer(root, filename, content, runs):
+    def func():
+        runs.append(filename)
+        path = os.path.join(root, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wt') as fh:
+            fh.write(content)
+    return func
+
+def run_stages(inst, root, runs, resume=True, content='chi', bed='bed'):
+    # formatting runs before the stages, its outputs are part of every key.
+    writer(root, 'tmp/bsample.bed', bed, [])()
+    manifest = StageManifest(inst, resume)
+    manifest.run('assoc', writer(root, 'result/chi-test/chi.assoc', content, runs))
+    manifest.run('report', writer(root, 'report/Report.xlsx', 'report', runs), after=('assoc',))
+    return manifest
+
+def test_completed_stages_skipped_on_resume(tmp_path):
+    root = str(tmp_path)
+    runs = []
+    run_stages(study(root), root, runs, resume=False)
+    assert len(runs) == 2
+    manifest = run_stages(study(root), root, runs)
+    assert len(runs) == 2
+    assert manifest.records['report']['status'] == 'done'
+    # JOBS does not change results.
+    run_stages(study(root, JOBS='8'), root, runs)
+    assert len(runs) == 2
+    # nor is anything skipped without resume.
+    run_stages(study(root), root, runs, resume=False)
+    assert len(runs) == 4
+
+def test_changes_invalidate_stages(tmp_path):
+    root = str(tmp_path)
+    runs = []
+    run_stages(study(root), root, runs, resume=False)
+    del runs[:]
+    run_stages(study(root, NPERM='100'), root, runs)
+    assert len(runs) == 2
+
+    # so do new genotypes.
+    del runs[:]
+    run_stages(study(root, NPERM='100'), root, runs, bed='other bed')
+    assert len(runs) == 2
+
+    # a stage whose output changed runs again, and so does the one after it.
+    del runs[:]
+    with open(os.path.join(root, 'result/chi-test/chi.assoc'), 'wt') as fh:
+        fh.write('edited')
+    run_stages(study(root, NPERM='100'), root, runs, content='chi, again', bed='other bed')
+    assert runs == ['result/chi-test/chi.assoc', 'report/Report.xlsx']
+
+def test_failed_stage_recorded_and_rerun(tmp_path):
+    root = str(tmp_path)
+    inst = study(root)
+    runs = []
+
+    def broken():
+        raise ValueError('plink crashed')
+    writer(root, 'tmp/bsample.bed', 'bed', runs)()
+    manifest = StageManifest(inst, True)
+    with pytest.raises(ValueError):
+        manifest.run('assoc', broken)
+    record = StageManifest(inst, True).records['assoc']
+    assert record['status'] == 'failed' and 'plink crashed' in record['error']
+    run_stages(inst, root, runs)
+    assert runs == ['tmp/bsample.bed', 'result/chi-test/chi.assoc', 'report/Report.xlsx']
@@ -0,0 +1,50 @@
+"""
+    Plink outputs of snv chunks merged by `chunks`.
+"""
+
+import numpy as np
+
+from lib.chunks import SnvChunks
+from lib.multitest import Adjustment
+
+
+def test_chunks_split_and_merge(tmp_path):
+    bim = tmp_path / 'sample.bim'
+    bim.write_text(''.join('1\trs%d\t0\t%d\tA\tC\n' % (n, n + 1) for n in range(7)))
+    chunks = SnvChunks(str(bim), 3, str(tmp_path / 'lists'))
+    assert len(chunks) == 3
+    snps = [open(listfile).read().split() for listfile in chunks.lists]
+    assert snps == [['rs0', 'rs1', 'rs2'], ['rs3', 'rs4'], ['rs5', 'rs6']]
+    assert len(SnvChunks(str(bim), 20, str(tmp_path / 'lists'))) == 7
+
+    outname = str(tmp_path / 'result' / 'logistic')
+    p = [0.01, 0.2, 0.04, 0.5, 0.003, 0.9, 0.07]
+    for (listfile, prefix), part in zip(chunks.parts(outname), snps):
+        with open(prefix + '.assoc.logistic', 'wt') as fh:
+            fh.write(' CHR SNP P\n')
+            fh.writelines('   1 %s %s\n' % (snp, p[int(snp[2:])]) for snp in part)
+        with open(prefix + '.assoc.logistic.adjusted', 'wt') as fh:
+            fh.write(' CHR SNP UNADJ GC\n')
+            fh.writelines('   1 %s %s 1\n' % (snp, p[int(snp[2:])]) for snp in part)
+        with open(prefix + '.log', 'wt') as fh:
+            fh.write('chunk of %s\n' % listfile)
+    chunks.merge(outname)
+
+    with open(outname + '.assoc.logistic', 'rt') as fh:
+        lines = fh.read().splitlines()
+    assert lines[0].split() == ['CHR', 'SNP', 'P']
+    assert [line.split()[1] for line in lines[1:]] == ['rs%d' % n for n in range(7)]
+
+    with open(outname + '.assoc.logistic.adjusted', 'rt') as fh:
+        header = fh.readline().split()
+        rows = [line.split() for line in fh]
+    assert header[:3] == ['CHR', 'SNP', 'UNADJ']
+    order = np.argsort(p)
+    assert [row[1] for row in rows] == ['rs%d' % n for n in order]
+    expected = Adjustment(np.sort(p))
+    assert np.allclose([float(row[header.index('BONF')]) for row in rows], expected.bonferroni())
+    assert np.allclose([float(row[header.index('FDR_BH')]) for row in rows], expected.bh(), rtol=1e-3)
+
+    with open(outname + '.log', 'rt') as fh:
+        log = fh.read()
+    assert log.count('### ') == 3 and 'After merging 3 chunks' in log
@@ -0,0 +1,58 @@
+"""
+    Chi-square tests of `contingency` against scipy and per-sample
+    references.
+"""
+
+import numpy as np
+from scipy.stats import chi2_contingency
+
+from lib.bedfile import write_bed, write_bim
+from lib.contingency import GenoCounts, ChiSquareTest, pearson, armitage, odds_ratio
+
+
+def random_tables(state, m, k):
+    return state.randint(1, 60, size=(m, 2, k))
+
+def test_pearson_matches_scipy():
+    state = np.random.RandomState(0)
+    for k in (2, 3):
+        tables = random_tables(state, 50, k)
+        expected = [chi2_contingency(t, correction=False)[0] for t in tables]
+        assert np.allclose(pearson(tables), expected)
+
+def test_pearson_of_empty_column_is_nan():
+    assert np.isnan(pearson(np.array([[[3, 0], [4, 0]]])))[0]
+
+def test_armitage_is_n_times_squared_correlation():
+    state = np.random.RandomState(1)
+    geno = random_tables(state, 20, 3)
+    stat = armitage(geno)
+    for n, table in enumerate(geno):
+        score = np.concatenate([np.repeat([2, 1, 0], table[0]), np.repeat([2, 1, 0], table[1])])
+        case = np.concatenate([np.ones(table[0].sum()), np.zeros(table[1].sum())])
+        r = np.corrcoef(score, case)[0, 1]
+        assert np.isclose(stat[n], len(case) * r ** 2)
+
+def test_odds_ratio_and_woolf_interval():
+    OR, L95, U95 = odds_ratio(np.array([[[20, 10], [5, 15]]]))
+    se = np.sqrt(1 / 20. + 1 / 10. + 1 / 5. + 1 / 15.)
+    assert np.isclose(OR[0], 6.0)
+    assert np.isclose(L95[0], np.exp(np.log(6.0) - 1.959964 * se), rtol=1e-6)
+    assert np.isclose(U95[0], np.exp(np.log(6.0) + 1.959964 * se), rtol=1e-6)
+
+def test_counts_from_bed(tmp_path):
+    state = np.random.RandomState(2)
+    dosage = state.randint(-1, 3, size=(11, 7)).astype(np.int8)
+    pheno = np.array([1, 2] * 5 + [-9])
+    prefix = str(tmp_path / 'sample')
+    write_bed(prefix + '.bed', [dosage])
+    write_bim(prefix + '.bim', [('1', 'rs%d' % n, n + 1, 'A', 'C') for n in range(7)])
+    with open(prefix + '.fam', 'wt') as fh:
+        for n, p in enumerate(pheno):
+            fh.write('f%d s%d 0 0 1 %d\n' % (n, n, p))
+    counts = GenoCounts.from_bed(prefix, memory=1e-5)
+    for group, mask in (('ALL', pheno != 0), ('AFF', pheno == 2), ('UNAFF', pheno == 1)):
+        expected = np.stack([(dosage[mask] == d).sum(axis=0) for d in (2, 1, 0)], axis=1)
+        assert (counts.counts[group] == expected).all()
+    result = ChiSquareTest(counts).run()
+    assert np.allclose(result['ALLELIC_CHISQ'], pearson(counts.tables()['ALLELIC']), equal_nan=True)
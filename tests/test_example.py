@@ -0,0 +1,42 @@
+"""
+    End to end run of Example/config.ini through to the reports.
+"""
+
+import os
+import sys
+import shutil
+import zipfile
+import subprocess
+
+import numpy as np
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, 'Example')
+
+
+def example_project(tmp_path):
+    shutil.copytree(os.path.join(EXAMPLE, 'data'), str(tmp_path / 'data'))
+    with open(os.path.join(EXAMPLE, 'config.ini'), 'rt') as fh:
+        config = fh.read().replace('/home/wuj/project/association_analysis/17B0307B', str(tmp_path))
+    cfg = tmp_path / 'config.ini'
+    cfg.write_text(config)
+    return cfg
+
+def test_plink_command_writes_reports(tmp_path):
+    cfg = example_project(tmp_path)
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, 'ASkit.py'), 'plink', '-cfg', str(cfg)],
+                          cwd=str(tmp_path), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    assert proc.returncode == 0, proc.stdout.decode()
+    for name in ('ChiSquare.xlsx', 'HWE.xlsx', 'Logistic.xlsx', 'Logistic_CORRECT.xlsx',
+                 'PhenoLogistic.xlsx', 'PhenoLogistic_CORRECT.xlsx', 'Report.xlsx'):
+        assert os.path.isfile(str(tmp_path / 'report' / name)), name
+
+    # age and BMI are both PHENO and CORRECTION columns.
+    with np.load(str(tmp_path / 'result/logistic-test/phenoassoc_covar/linear.npz')) as data:
+        assert sorted(data['untested']) == ['BMI', 'age']
+        untested = list(data['phenos']).index('age')
+        assert np.isnan(data['ADD_P'][untested]).all()
+    with zipfile.ZipFile(str(tmp_path / 'report/PhenoLogistic_CORRECT.xlsx')) as book:
+        strings = book.read('xl/sharedStrings.xml').decode('utf-8')
+    assert 'age,BMI' in strings
@@ -0,0 +1,58 @@
+"""
+    Fisher exact tests of `contingency` against scipy and enumeration.
+"""
+
+import itertools
+
+import numpy as np
+from scipy.stats import fisher_exact as scipy_fisher, hypergeom
+
+from lib.contingency import fisher_exact
+
+
+def reference_2x3(table):
+    """Two-sided p-value of a (2, 3) table by enumerating all tables of its
+    margins."""
+    row = table[0].sum()
+    cols = table.sum(axis=0)
+    n = cols.sum()
+
+    def prob(x):
+        p = 1.0
+        left, rest = row, n
+        for x_j, c_j in zip(x, cols):
+            p *= hypergeom.pmf(x_j, rest, c_j, left)
+            left -= x_j
+            rest -= c_j
+        return p
+    observed = prob(table[0])
+    total = 0.0
+    for x1, x2 in itertools.product(range(cols[0] + 1), range(cols[1] + 1)):
+        x3 = row - x1 - x2
+        if 0 <= x3 <= cols[2]:
+            p = prob((x1, x2, x3))
+            if p <= observed * (1 + 1e-7):
+                total += p
+    return min(total, 1.0)
+
+def test_2x2_matches_scipy():
+    state = np.random.RandomState(0)
+    tables = state.randint(0, 40, size=(100, 2, 2))
+    tables[0] = [[0, 0], [3, 4]]
+    expected = [scipy_fisher(t)[1] if t.sum() else np.nan for t in tables]
+    assert np.allclose(fisher_exact(tables), expected, rtol=1e-6, equal_nan=True)
+
+def test_2x2_small_blocks():
+    state = np.random.RandomState(1)
+    tables = state.randint(0, 200, size=(30, 2, 2))
+    assert np.allclose(fisher_exact(tables, cells=16), fisher_exact(tables), rtol=1e-12)
+
+def test_2x3_matches_enumeration():
+    state = np.random.RandomState(2)
+    tables = state.randint(0, 15, size=(40, 2, 3))
+    tables[0] = [[12, 0, 0], [0, 3, 11]]
+    expected = [reference_2x3(t) for t in tables]
+    assert np.allclose(fisher_exact(tables), expected, rtol=1e-6)
+
+def test_empty_tables_are_nan():
+    assert np.isnan(fisher_exact(np.zeros((1, 2, 3), dtype=int)))[0]
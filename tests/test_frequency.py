@@ -0,0 +1,44 @@
+"""
+    Allele frequencies of `frequency` against per-sample counts.
+"""
+
+import numpy as np
+
+from lib.bedfile import write_bed, write_bim
+from lib.contingency import GenoCounts
+from lib.frequency import AlleleFrequency
+
+
+def test_frequencies_from_bed(tmp_path):
+    state = np.random.RandomState(0)
+    dosage = state.randint(-1, 3, size=(13, 5)).astype(np.int8)
+    dosage[:, 4] = -1
+    pheno = np.array([1, 2] * 6 + [-9])
+    prefix = str(tmp_path / 'sample')
+    write_bed(prefix + '.bed', [dosage])
+    write_bim(prefix + '.bim', [('1', 'rs%d' % n, n + 1, 'A', 'C') for n in range(5)])
+    with open(prefix + '.fam', 'wt') as fh:
+        for n, p in enumerate(pheno):
+            fh.write('f%d s%d 0 0 1 %d\n' % (n, n, p))
+
+    freq = AlleleFrequency(GenoCounts.from_bed(prefix))
+    for group, mask in (('ALL', pheno != 0), ('AFF', pheno == 2), ('UNAFF', pheno == 1)):
+        d = dosage[mask]
+        called = (d >= 0).sum(axis=0)
+        a1 = np.where(d >= 0, d, 0).sum(axis=0)
+        assert (freq.result[group + '_A1'] == a1).all()
+        assert (freq.result[group + '_A2'] == 2 * called - a1).all()
+        assert (freq.result[group + '_NCHROBS'] == 2 * called).all()
+        with np.errstate(invalid='ignore'):
+            assert np.allclose(freq.result[group + '_MAF'], a1 / (2.0 * called), equal_nan=True)
+        assert np.allclose(freq.result[group + '_MISS'], 1 - called / float(mask.sum()))
+    assert np.isnan(freq.get('rs4', 'ALL_MAF'))
+    assert freq.get('rs0', 'AFF_A1') == freq.result['AFF_A1'][0]
+    assert freq.get('rs9', 'AFF_A1') is None
+
+def test_missingness_unknown_without_sizes():
+    counts = GenoCounts(['rs0'], ['1'], ['A'], ['C'],
+                        dict((g, np.array([[1, 2, 3]])) for g in ('ALL', 'AFF', 'UNAFF')))
+    freq = AlleleFrequency(counts)
+    assert np.isclose(freq.result['ALL_MAF'][0], 4 / 12.)
+    assert np.isnan(freq.result['ALL_MISS'][0])
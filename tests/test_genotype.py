@@ -0,0 +1,36 @@
+"""
+    Encoding of genotype calls by `GenoEncoder` and `GenoReader`.
+"""
+
+import numpy as np
+import pytest
+
+from lib.genotype import GenoEncoder, GenoReader, MISSING, MAX_ALLELES, check_alleles
+
+
+def test_reader_round_trip(tmp_path):
+    geno = tmp_path / 'sample.geno'
+    geno.write_text('Samples\trs1\trs2\ns1\tA/C\tG/G\ns2\tC/C\t\ns3\tC/A\tG/T\n')
+    genotypes = GenoReader(str(geno), memory=1, tmpdir=str(tmp_path)).encode()
+    assert genotypes.alleles == [('C', 'A'), ('G', 'T')]
+    assert genotypes.dosage().tolist() == [[1, 0], [0, MISSING], [1, 1]]
+    assert genotypes.calls(sep='/', missing='').tolist() == [['A/C', 'G/G'], ['C/C', ''], ['C/A', 'G/T']]
+
+def test_calls_of_one_allele_are_missing():
+    encoder = GenoEncoder(3)
+    ids = encoder.feed([['A/C', 'C/', 'C'], ['0/0', '/', 'A/A']])
+    assert (ids[0, 1:] == MISSING).all() and (ids[1, :2] == MISSING).all()
+    assert encoder.incomplete == set(['C/', 'C'])
+    with pytest.raises(Exception):
+        encoder.parse_call('A/C/G')
+
+def test_too_many_distinct_alleles_raise():
+    encoder = GenoEncoder(1)
+    calls = [['A%d/C%d' % (n, n)] for n in range(16400)]
+    with pytest.raises(Exception, match='Too many distinct alleles'):
+        encoder.feed(calls)
+
+def test_too_many_alleles_of_a_snv_raise():
+    check_alleles(['rs1'], [tuple(str(n) for n in range(MAX_ALLELES))])
+    with pytest.raises(Exception, match='rs1'):
+        check_alleles(['rs1'], [tuple(str(n) for n in range(MAX_ALLELES + 1))])
@@ -0,0 +1,55 @@
+"""
+    Exact HWE test against the recurrence of Wigginton et al. (2005).
+"""
+
+import time
+
+import numpy as np
+
+from lib.hwe import exact_hwe
+
+
+def reference_hwe(obs_het, obs_hom1, obs_hom2):
+    """SNPHWE of Wigginton, Cutler and Abecasis (2005), one snv at a time."""
+    rare = 2 * min(obs_hom1, obs_hom2) + obs_het
+    n = obs_het + obs_hom1 + obs_hom2
+    probs = np.zeros(rare + 1)
+    mid = rare * (2 * n - rare) // (2 * n)
+    if mid % 2 != rare % 2:
+        mid += 1
+    probs[mid] = 1.0
+    homr, homc = (rare - mid) // 2, n - mid - (rare - mid) // 2
+    for het in range(mid, 1, -2):
+        probs[het - 2] = probs[het] * het * (het - 1) / (4.0 * (homr + 1) * (homc + 1))
+        homr, homc = homr + 1, homc + 1
+    homr, homc = (rare - mid) // 2, n - mid - (rare - mid) // 2
+    for het in range(mid, rare - 1, 2):
+        probs[het + 2] = probs[het] * 4.0 * homr * homc / ((het + 2.0) * (het + 1.0))
+        homr, homc = homr - 1, homc - 1
+    probs /= probs.sum()
+    return min(probs[probs <= probs[obs_het] * (1 + 1e-8)].sum(), 1.0)
+
+def test_matches_reference():
+    state = np.random.RandomState(0)
+    counts = np.concatenate([state.multinomial(n, [0.5, 0.3, 0.2], size=50)
+                             for n in (1, 2, 5, 30, 200, 1000)] +
+                            [np.array([[10, 0, 0], [0, 0, 7], [0, 5, 0], [3, 0, 3], [50, 0, 50]])])
+    p = exact_hwe(counts)
+    expected = np.array([reference_hwe(c[1], c[0], c[2]) for c in counts])
+    assert np.allclose(p, expected, rtol=1e-7, atol=0)
+
+def test_empty_snvs_are_nan():
+    p = exact_hwe(np.array([[0, 0, 0], [1, 2, 1]]))
+    assert np.isnan(p[0]) and p[1] == 1.0
+
+def test_large_cohort_timing():
+    state = np.random.RandomState(1)
+    n, m = 30000, 5000
+    q = state.uniform(0.01, 0.5, m)
+    hom = state.binomial(n, (1 - q) ** 2)
+    het = state.binomial(n - hom, 2 * q * (1 - q) / (1 - (1 - q) ** 2))
+    counts = np.stack([hom, het, n - hom - het], axis=1)
+    start = time.time()
+    p = exact_hwe(counts)
+    assert time.time() - start < 5
+    assert np.allclose(p[:20], [reference_hwe(c[1], c[0], c[2]) for c in counts[:20]], rtol=1e-7)
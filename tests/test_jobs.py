@@ -0,0 +1,61 @@
+"""
+    External commands run by the `JobSet` of `jobs`.
+"""
+
+import sys
+import time
+
+import pytest
+
+from lib.cache import RunCache
+from lib.jobs import ToolRunner, Timeline
+from lib.scheduler import ProcessSlots
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+def timeline_rows(timeline):
+    with open(timeline.filename, 'rt') as fh:
+        return [line.rstrip('\n').split('\t') for line in fh][1:]
+
+def test_jobs_run_concurrently_with_logs(tmp_path):
+    timeline = Timeline(str(tmp_path / 'timeline.tsv'))
+    jobs = ToolRunner(ProcessSlots(3), timeline=timeline).jobs()
+    for n in range(3):
+        jobs.add('job%d' % n, python('import time; time.sleep(0.5); print(%d)' % n),
+                 str(tmp_path / ('job%d.log' % n)))
+    start = time.time()
+    assert jobs.run() == [0, 0, 0]
+    assert time.time() - start < 1.4
+    assert (tmp_path / 'job2.log').read_text() == '2\n'
+    rows = timeline_rows(timeline)
+    assert sorted(row[0] for row in rows) == ['job0', 'job1', 'job2']
+    assert all(row[-1] == '0' for row in rows)
+
+def test_failed_and_timed_out_jobs_raise(tmp_path):
+    timeline = Timeline(str(tmp_path / 'timeline.tsv'))
+    jobs = ToolRunner(ProcessSlots(2), timeline=timeline, timeout=0.5).jobs()
+    jobs.add('broken', python('import sys; sys.exit(3)'), str(tmp_path / 'broken.log'))
+    jobs.add('stuck', python('import time; time.sleep(30)'), str(tmp_path / 'stuck.log'))
+    jobs.add('absent', [str(tmp_path / 'no-such-tool')], str(tmp_path / 'absent.log'))
+    with pytest.raises(Exception) as error:
+        jobs.run()
+    assert 'broken (exit 3' in str(error.value)
+    assert 'stuck (timed out' in str(error.value)
+    assert 'absent (exit 127' in str(error.value)
+    assert dict((row[0], row[-1]) for row in timeline_rows(timeline))['stuck'] == 'timeout'
+
+def test_cached_jobs_restored(tmp_path):
+    source = tmp_path / 'sample.bed'
+    source.write_text('genotypes')
+    out = tmp_path / 'result.txt'
+    timeline = Timeline(str(tmp_path / 'timeline.tsv'))
+    runner = ToolRunner(ProcessSlots(1), RunCache(str(tmp_path / 'cache')), timeline)
+    commands = python('open(%r, "w").write("done")' % str(out))
+    patterns = [str(tmp_path / 'result.*')]
+    runner.run('write', commands, str(tmp_path / 'result.log'), [str(source)], patterns)
+    out.unlink()
+    runner.run('write', commands, str(tmp_path / 'result.log'), [str(source)], patterns)
+    assert out.read_text() == 'done'
+    assert [row[-1] for row in timeline_rows(timeline)] == ['0', 'cached']
@@ -0,0 +1,53 @@
+"""
+    Multiple testing corrections of `multitest` against scipy and
+    hand-computed values.
+"""
+
+import numpy as np
+from scipy.stats import chi2, false_discovery_control
+
+from lib.multitest import Adjustment, adjust, genomic_control
+
+
+P = np.array([0.01, 0.04, 0.03, 0.005, 0.2, np.nan, 0.8])
+
+def test_fdr_matches_scipy():
+    state = np.random.RandomState(0)
+    p = state.uniform(size=200) ** 3
+    assert np.allclose(adjust(p, 'BH'), false_discovery_control(p, method='bh'))
+    assert np.allclose(adjust(p, 'BY'), false_discovery_control(p, method='by'))
+
+def test_family_wise_corrections_by_hand():
+    valid = ~np.isnan(P)
+    assert np.allclose(adjust(P, 'BONFERRONI')[valid], [0.06, 0.24, 0.18, 0.03, 1, 1])
+    # sorted 0.005 0.01 0.03 0.04 0.2 0.8 times 6..1, then running max.
+    assert np.allclose(adjust(P, 'HOLM')[valid], [0.05, 0.12, 0.12, 0.03, 0.4, 0.8])
+    sidak = Adjustment(P)
+    assert np.isclose(sidak.sidak_ss()[3], 1 - 0.995 ** 6)
+    assert np.isclose(sidak.sidak_sd()[0], max(1 - 0.995 ** 6, 1 - 0.99 ** 5))
+
+def test_nan_and_shape_kept():
+    p = P.reshape(7, 1)
+    adjusted = adjust(p, 'BH')
+    assert adjusted.shape == (7, 1)
+    assert np.isnan(adjusted[5, 0])
+    assert np.isnan(adjust([np.nan], 'HOLM')).all()
+
+def test_qvalue_pi0():
+    state = np.random.RandomState(1)
+    p = np.concatenate([state.uniform(size=800), state.uniform(size=200) ** 4])
+    family = Adjustment(p)
+    assert np.isclose(family.pi0(), (p > 0.5).sum() / 500.)
+    assert family.pi0() < 1
+    assert np.allclose(family.qvalue(), np.minimum(family.pi0() * family.bh(), 1))
+    # no p-value above lambda, pi0 falls back to 1 and q-values are BH.
+    small = Adjustment([0.01, 0.02, 0.3])
+    assert small.pi0() == 1.0
+    assert np.allclose(small.qvalue(), small.bh())
+
+def test_genomic_control():
+    stat = np.array([0.2, 0.9, 1.5, 3.0, 4.0])
+    lambda_, p = genomic_control(chi2.sf(stat, 1))
+    assert np.isclose(lambda_, 1.5 / 0.456)
+    assert np.allclose(p, chi2.sf(stat / lambda_, 1))
+    assert genomic_control(chi2.sf([0.1, 0.2, 0.3], 1))[0] == 1.0
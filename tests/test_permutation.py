@@ -0,0 +1,55 @@
+"""
+    Max(T) permutation of `permutation` on a small bed fileset.
+"""
+
+import numpy as np
+
+from lib.bedfile import write_bed, write_bim
+from lib.contingency import GenoCounts, ChiSquareTest
+from lib.permutation import MaxTPermutation
+from lib.scheduler import ProcessSlots
+
+
+def write_fileset(prefix, seed=0, nsamples=80, nsnps=9):
+    state = np.random.RandomState(seed)
+    pheno = np.array([1, 2] * (nsamples // 2))
+    dosage = state.randint(0, 3, size=(nsamples, nsnps)).astype(np.int8)
+    # a snv of strong association, and one with missing calls.
+    dosage[:, 0] = np.where(pheno == 2, 2, state.randint(0, 2, nsamples))
+    dosage[:5, 1] = -1
+    write_bed(prefix + '.bed', [dosage])
+    write_bim(prefix + '.bim', [('1', 'rs%d' % n, n + 1, 'A', 'C') for n in range(nsnps)])
+    with open(prefix + '.fam', 'wt') as fh:
+        for n, p in enumerate(pheno):
+            fh.write('f%d s%d 0 0 1 %d\n' % (n, n, p))
+    return prefix
+
+def test_observed_statistics_are_those_of_chisquare(tmp_path):
+    prefix = write_fileset(str(tmp_path / 'sample'))
+    perm = MaxTPermutation(prefix, 10)
+    perm.run()
+    expected = ChiSquareTest(GenoCounts.from_bed(prefix)).run()
+    assert np.allclose(perm.observed['ALLELIC'], expected['ALLELIC_CHISQ'], rtol=1e-5)
+    assert np.allclose(perm.observed['TREND'], expected['TREND_CHISQ'], rtol=1e-5)
+
+def test_exact_number_of_permutations(tmp_path):
+    prefix = write_fileset(str(tmp_path / 'sample'))
+    result = MaxTPermutation(prefix, 250, batch=100).run()
+    assert (result['NPERM'] == 250).all()
+    assert np.isclose(result['ALLELIC_EMP1'][0], 1 / 251.)
+    assert np.isclose(result['ALLELIC_EMP2'][0], 1 / 251.)
+    assert (result['ALLELIC_EMP2'] >= result['ALLELIC_EMP1'] - 1e-12).all()
+
+def test_adaptive_permutations_up_to_maxperm(tmp_path):
+    prefix = write_fileset(str(tmp_path / 'sample'))
+    result = MaxTPermutation(prefix, 100, maxperm=900, batch=50).run()
+    assert result['NPERM'].min() >= 100 and result['NPERM'].max() <= 900
+    assert result['NPERM'][0] == 900
+
+def test_same_result_with_worker_processes(tmp_path):
+    prefix = write_fileset(str(tmp_path / 'sample'))
+    single = MaxTPermutation(prefix, 120, maxperm=400, batch=40, seed=7).run()
+    pooled = MaxTPermutation(prefix, 120, maxperm=400, batch=40, seed=7,
+                             slots=ProcessSlots(2)).run()
+    for key, values in single.items():
+        assert np.array_equal(values, pooled[key], equal_nan=True)
@@ -0,0 +1,142 @@
+"""
+    Logistic and linear scans of `regression` against per-snv reference fits.
+"""
+
+import numpy as np
+from scipy.stats import norm, t as student_t
+
+from lib.bedfile import write_bed, write_bim
+from lib.regression import encode, logistic_irls, NullLogistic, LogisticScan, LinearScan
+
+
+def reference_logistic(y, X):
+    """Newton fit of one logistic model, returns coefficients and their
+    standard errors."""
+    beta = np.zeros(X.shape[1])
+    for _ in range(50):
+        mu = 1 / (1 + np.exp(-X.dot(beta)))
+        info = (X.T * (mu * (1 - mu))).dot(X)
+        delta = np.linalg.solve(info, X.T.dot(y - mu))
+        beta += delta
+        if np.abs(delta).max() < 1e-10:
+            break
+    mu = 1 / (1 + np.exp(-X.dot(beta)))
+    cov = np.linalg.inv((X.T * (mu * (1 - mu))).dot(X))
+    return beta, np.sqrt(np.diagonal(cov))
+
+def write_fileset(prefix, dosage, pheno, covar=None):
+    write_bed(prefix + '.bed', [dosage])
+    write_bim(prefix + '.bim', [('1', 'rs%d' % n, n + 1, 'A', 'C') for n in range(dosage.shape[1])])
+    with open(prefix + '.fam', 'wt') as fh:
+        for n, p in enumerate(pheno):
+            fh.write('f%d s%d 0 0 1 %d\n' % (n, n, p))
+    if covar is not None:
+        with open(prefix + '.covar', 'wt') as fh:
+            fh.write('FID\tIID\t%s\n' % '\t'.join('c%d' % i for i in range(covar.shape[1])))
+            for n, row in enumerate(covar):
+                fh.write('f%d\ts%d\t%s\n' % (n, n, '\t'.join(str(v) for v in row)))
+        return prefix + '.covar'
+
+def simulate(state, nsamples=300, nsnps=12):
+    dosage = state.binomial(2, state.uniform(0.1, 0.5, nsnps), size=(nsamples, nsnps)).astype(np.int8)
+    dosage[state.uniform(size=dosage.shape) < 0.03] = -1
+    covar = np.round(state.normal(size=(nsamples, 2)), 3)
+    eta = 0.3 * np.where(dosage[:, 0] >= 0, dosage[:, 0], 0) + covar.dot([0.5, -0.4])
+    pheno = np.where(state.uniform(size=nsamples) < 1 / (1 + np.exp(-eta)), 2, 1)
+    return dosage, pheno, covar
+
+def test_irls_matches_per_snv_fits():
+    state = np.random.RandomState(0)
+    dosage, pheno, covar = simulate(state)
+    y = (pheno == 2).astype(float)
+    C = np.column_stack([np.ones(len(y)), covar])
+    for model in ('ADD', 'HETHOM'):
+        G = encode(dosage, model)
+        mask = dosage.T >= 0
+        beta, cov = logistic_irls(y, G, C, mask)
+        k = G.shape[1]
+        for m in range(dosage.shape[1]):
+            X = np.column_stack([G[m].T, C])[mask[m]]
+            ref, se = reference_logistic(y[mask[m]], X)
+            assert np.allclose(beta[m], ref, rtol=1e-5, atol=1e-8)
+            assert np.allclose(np.sqrt(np.diagonal(cov[m]))[:k], se[:k], rtol=1e-5)
+
+def test_irls_separation_is_nan():
+    y = np.array([0., 0., 0., 1., 1., 1.])
+    G = np.array([[[0., 0., 0., 2., 2., 2.]]])
+    C = np.ones((6, 1))
+    beta, cov = logistic_irls(y, G, C, np.ones((1, 6), dtype=bool))
+    assert np.isnan(beta).all() and np.isnan(cov).all()
+
+def test_scan_wald_statistics(tmp_path):
+    state = np.random.RandomState(1)
+    dosage, pheno, covar = simulate(state)
+    prefix = str(tmp_path / 'sample')
+    covarfile = write_fileset(prefix, dosage, pheno, covar)
+    result = LogisticScan(prefix, covarfile, memory=1e-4).run()
+    y = (pheno == 2).astype(float)
+    for m in range(dosage.shape[1]):
+        called = dosage[:, m] >= 0
+        X = np.column_stack([dosage[called, m], np.ones(called.sum()), covar[called]])
+        ref, se = reference_logistic(y[called], X)
+        assert result['ADD_NMISS'][m] == called.sum()
+        assert np.isclose(result['ADD_OR'][m], np.exp(ref[0]), rtol=1e-5)
+        assert np.isclose(result['ADD_P'][m], 2 * norm.sf(abs(ref[0] / se[0])), rtol=1e-4)
+
+def test_score_statistic_of_null_model():
+    state = np.random.RandomState(2)
+    dosage, pheno, covar = simulate(state)
+    dosage[dosage < 0] = 0
+    y = (pheno == 2).astype(float)
+    C = np.column_stack([np.ones(len(y)), covar])
+    null = NullLogistic(y, C)
+    G = encode(dosage, 'ADD')
+    beta, cov = null.score(G, np.ones((dosage.shape[1], len(y)), dtype=bool))
+    ref, _ = reference_logistic(y, C)
+    mu = 1 / (1 + np.exp(-C.dot(ref)))
+    for m in range(dosage.shape[1]):
+        X = np.column_stack([dosage[:, m], C])
+        info = (X.T * (mu * (1 - mu))).dot(X)
+        U = X[:, 0].dot(y - mu)
+        V = info[0, 0] - info[0, 1:].dot(np.linalg.solve(info[1:, 1:], info[1:, 0]))
+        assert np.isclose(beta[m, 0] ** 2 / cov[m, 0, 0], U ** 2 / V, rtol=1e-6)
+
+def test_score_mode_refits_hits_and_partial_snvs(tmp_path):
+    state = np.random.RandomState(3)
+    dosage, pheno, covar = simulate(state)
+    dosage[:, :6][dosage[:, :6] < 0] = 0
+    prefix = str(tmp_path / 'sample')
+    covarfile = write_fileset(prefix, dosage, pheno, covar)
+    full = LogisticScan(prefix, covarfile).run()
+    scored = LogisticScan(prefix, covarfile, cutoff=0.2).run()
+    refit = (full['ADD_P'] < 0.2) | (dosage < 0).any(axis=0)
+    assert refit.any() and not refit.all()
+    assert np.allclose(scored['ADD_BETA'][refit], full['ADD_BETA'][refit])
+    assert np.allclose(scored['ADD_P'][~refit], full['ADD_P'][~refit], rtol=0.2)
+    assert np.allclose(LogisticScan(prefix, covarfile, cutoff=1.1).run()['ADD_P'], full['ADD_P'])
+
+def test_linear_scan_matches_least_squares(tmp_path):
+    state = np.random.RandomState(4)
+    dosage, pheno, covar = simulate(state, nsamples=120, nsnps=6)
+    prefix = str(tmp_path / 'sample')
+    covarfile = write_fileset(prefix, dosage, pheno, covar)
+    Y = np.column_stack([state.normal(size=120), state.normal(size=120), state.randint(1, 3, 120)])
+    Y[:5, 1] = np.nan
+    with open(prefix + '.pheno', 'wt') as fh:
+        fh.write('FID\tIID\tp0\tp1\tcase\n')
+        for n, row in enumerate(Y):
+            fh.write('f%d\ts%d\t%s\n' % (n, n, '\t'.join('-9' if np.isnan(v) else str(v) for v in row)))
+    scan = LinearScan(prefix, prefix + '.pheno', covarfile, memory=1e-4)
+    assert scan.phenos == ['p0', 'p1']
+    result = scan.run()
+    for j in range(2):
+        for m in range(dosage.shape[1]):
+            used = (dosage[:, m] >= 0) & ~np.isnan(Y[:, j])
+            X = np.column_stack([dosage[used, m], np.ones(used.sum()), covar[used]])
+            beta, rss = np.linalg.lstsq(X, Y[used, j], rcond=None)[:2]
+            df = used.sum() - X.shape[1]
+            se = np.sqrt(rss[0] / df * np.linalg.inv(X.T.dot(X))[0, 0])
+            assert result['ADD_NMISS'][j, m] == used.sum()
+            assert np.isclose(result['ADD_BETA'][j, m], beta[0])
+            assert np.isclose(result['ADD_SE'][j, m], se)
+            assert np.isclose(result['ADD_P'][j, m], 2 * student_t.sf(abs(beta[0] / se), df))
@@ -0,0 +1,35 @@
+"""
+    Stages of `StageScheduler` within the budget of `ProcessSlots`.
+"""
+
+import time
+import threading
+
+from lib.scheduler import ProcessSlots, StageScheduler
+
+
+def test_inprocess_stages_are_bounded_by_slots():
+    lock = threading.Lock()
+    state = dict(running=0, most=0)
+
+    def stage():
+        with lock:
+            state['running'] += 1
+            state['most'] = max(state['most'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+
+    scheduler = StageScheduler(ProcessSlots(2))
+    for n in range(6):
+        scheduler.add('stage%d' % n, stage, inprocess=True)
+    scheduler.run()
+    assert state['most'] == 2
+
+def test_dependencies_run_in_order():
+    order = []
+    scheduler = StageScheduler(ProcessSlots(4))
+    scheduler.add('a', lambda: order.append('a'), inprocess=True)
+    scheduler.add('b', lambda: order.append('b'), after=['a'], inprocess=True)
+    scheduler.run()
+    assert order == ['a', 'b']
@@ -0,0 +1,37 @@
+"""
+    Genotype files of sub-projects written by `Stratify`.
+"""
+
+import os
+
+from lib.stratify import Stratify
+
+
+def stratify(tmp_path, geno_file, memory=None):
+    inst = Stratify.__new__(Stratify)
+    inst.geno_file = str(geno_file)
+    inst.root_path = str(tmp_path)
+    inst.memory = memory
+    return inst
+
+def test_text_genotypes_follow_info_order(tmp_path):
+    geno = tmp_path / 'sample.geno'
+    geno.write_text('Samples\trs1\trs2\ns1\tA/C\tNA\ns2\tC/C\tG/T\ns3\tA/A\tT/T')
+    target = tmp_path / 'sub.geno'
+    stratify(tmp_path, geno).split_geno([(['s3', 's1', 's9'], str(target))])
+    assert target.read_text() == 'Samples\trs1\trs2\ns3\tA/A\tT/T\ns1\tA/C\tNA\n'
+
+def test_vcf_is_encoded_apart_from_main_project(tmp_path):
+    vcf = tmp_path / 'sample.vcf'
+    vcf.write_text('##fileformat=VCFv4.2\n'
+                   '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\tB\n'
+                   '1\t10\trs1\tA\tC\t.\t.\t.\tGT\t0/1\t1/1\n'
+                   '1\t20\trs2\tG\tT,C\t.\t.\t.\tGT\t0/2\t1/1\n')
+    main = tmp_path / 'tmp' / 'geno_codes.npy'
+    main.parent.mkdir()
+    main.write_text('main project')
+    target = tmp_path / 'sub.geno'
+    stratify(tmp_path, vcf, memory=1).split_geno([(['B', 'A'], str(target))])
+    assert target.read_text() == 'sample\trs1\trs2\nB\tC/C\tT/T\nA\tA/C\tG/C\n'
+    assert main.read_text() == 'main project'
+    assert os.listdir(str(main.parent)) == ['geno_codes.npy']
@@ -0,0 +1,23 @@
+"""
+    Dtypes settled by `infer_dtypes`.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lib.utils import infer_dtypes
+
+
+def test_whole_numbers_become_int64():
+    table = infer_dtypes(pd.DataFrame({'a': ['1', '2', '3'], 'b': [1.5, 2.0, np.nan]}))
+    assert table['a'].dtype == np.int64
+    assert table['b'].dtype.kind == 'f'
+
+def test_missing_whole_numbers_filled_with_na_value():
+    table = infer_dtypes(pd.DataFrame({'a': [1.0, np.nan, 3.0]}), na_value=-9)
+    assert table['a'].tolist() == [1, -9, 3]
+
+def test_inf_and_huge_values_keep_float():
+    table = infer_dtypes(pd.DataFrame({'inf': [1.0, np.inf, 2.0], 'big': [1.0, 2.0 ** 64, 3.0]}))
+    assert table['inf'].dtype.kind == 'f' and np.isinf(table['inf'][1])
+    assert table['big'].dtype.kind == 'f' and table['big'][1] == 2.0 ** 64